@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+
+from logger_setup import setup_logger
+
+logger = setup_logger()
+
+# Statuses worth retrying: the API (or nginx in front of it) was briefly unavailable
+RETRY_STATUSES = {502, 503, 504}
+
+
+class BotApiClient:
+    """
+    Shared async client for the bot's calls to the Flask API (/api/bot).
+
+    One httpx.AsyncClient is reused for every handler, so connections are pooled and kept
+    alive, and awaiting the API never blocks the event loop for other participants.
+    Requests that fail to connect are retried for every method (they never reached the API);
+    timeouts and 502/503/504 are retried only for GET, since a PUT/POST may have been applied.
+    """
+
+    def __init__(self, base_url, secret_key, timeout=10.0, max_retries=2, max_connections=20):
+        self.max_retries = max_retries
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"X-Bot-Secret-Key": secret_key},
+            timeout=httpx.Timeout(timeout, connect=3.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.FLASK_APP_BOT_BASE_URL,
+            config.BOT_SECRET_KEY,
+            timeout=config.API_TIMEOUT_SECONDS,
+            max_retries=config.API_MAX_RETRIES,
+            max_connections=config.API_MAX_CONNECTIONS,
+        )
+
+    async def request(self, method, path, **kwargs) -> httpx.Response:
+        """
+        Send a request to the API, retrying transient failures with backoff.
+        Raises httpx.HTTPError once the retries are used up.
+        """
+        idempotent = method == "GET"
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                resp = await self._client.request(method, path, **kwargs)
+            except httpx.ConnectError as e:
+                if last_attempt:
+                    raise
+                logger.warning(f"{method} {path} could not connect, retrying: {e}")
+            except httpx.TimeoutException as e:
+                if last_attempt or not idempotent:
+                    raise
+                logger.warning(f"{method} {path} timed out, retrying: {e}")
+            else:
+                if resp.status_code not in RETRY_STATUSES or last_attempt or not idempotent:
+                    return resp
+                logger.warning(f"{method} {path} returned {resp.status_code}, retrying.")
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def get(self, path, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path, **kwargs) -> httpx.Response:
+        return await self.request("PUT", path, **kwargs)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
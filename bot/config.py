@@ -10,20 +10,42 @@ class Config:
     BOT_SECRET_KEY=os.getenv('BOT_SECRET_KEY')
     TELEGRAM_SECRET_KEY=os.getenv('TELEGRAM_SECRET_KEY')
     
+    # Bot -> Flask API client
+    API_TIMEOUT_SECONDS=10.0
+    API_MAX_RETRIES=2
+    API_MAX_CONNECTIONS=20
+    CONCURRENT_UPDATES=64  # updates handled at once; python-telegram-bot handles them one by one by default
+    
+    # Telegram (TELEGRAM_BASE_URL points the bot at a fake Telegram server in load tests)
+    TELEGRAM_BASE_URL=os.getenv('TELEGRAM_BASE_URL')
+    WEBHOOK_URL=os.getenv('WEBHOOK_URL')
+    WEBHOOK_SECRET_TOKEN=os.getenv('WEBHOOK_SECRET_TOKEN')  # required by webhook_ingest.py
+    
+    # Webhook updates are sharded by user across Redis streams; worker i of n consumes shards s with s % n == i.
+    # Change BOT_WORKER_COUNT only with every worker stopped, so no shard has two owners.
+    BOT_UPDATE_SHARDS=16
+    BOT_UPDATE_STREAM_MAXLEN=100000
+    BOT_WORKER_INDEX=int(os.getenv('BOT_WORKER_INDEX', 0))
+    BOT_WORKER_COUNT=int(os.getenv('BOT_WORKER_COUNT', 1))
+    BOT_WORKER_BATCH_SIZE=100
+    
     
 
 class DevelopmentConfig(Config):
     
     DEBUG = True
     FRONTEND_BASE_URL="http://localhost:3000"
-    FLASK_APP_BOT_BASE_URL="http://localhost:8000/api/bot"
+    REDIS_URL=os.getenv('REDIS_URL', "redis://localhost:6379/0")
+    FLASK_APP_BOT_BASE_URL=os.getenv('FLASK_APP_BOT_BASE_URL', "http://localhost:8000/api/bot")
     
     
 class ProductionConfig(Config):
         
     DEBUG = False
     FRONTEND_BASE_URL="https://emapingbot.com"
-    FLASK_APP_BOT_BASE_URL="https://emapingbot.com/api/bot"
+    REDIS_URL=f"redis://:{os.getenv('REDIS_PASSWORD')}@redis:6379/0"
+    # Set to the internal address (e.g. http://flask-backend:8000/api/bot) to skip nginx and TLS
+    FLASK_APP_BOT_BASE_URL=os.getenv('FLASK_APP_BOT_BASE_URL', "https://emapingbot.com/api/bot")
         
     
     
@@ -0,0 +1,75 @@
+"""
+Local stand-ins for the Telegram Bot API and the Flask bot API, used by the load tests.
+API endpoints answer after `api_delay` seconds; replies sent through sendMessage are recorded.
+"""
+import asyncio
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+TOKEN = "123456:load-test"
+
+
+class FakeServices:
+
+    def __init__(self, api_delay: float, expected_replies: int):
+        self.api_delay = api_delay
+        self.expected_replies = expected_replies
+        self.replies = defaultdict(list)  # chat_id -> reply texts
+        self.n_replies = 0
+        self.all_replied = asyncio.Event()
+        self._runner = None
+
+    async def get_me(self, request):
+        return web.json_response({"ok": True, "result": {
+            "id": 1, "is_bot": True, "first_name": "Load test", "username": "load_test_bot",
+        }})
+
+    async def send_message(self, request):
+        form = await request.post() if request.content_type != "application/json" else await request.json()
+        chat_id = int(form["chat_id"])
+        self.replies[chat_id].append(form.get("text", ""))
+        self.n_replies += 1
+        if self.n_replies >= self.expected_replies:
+            self.all_replied.set()
+        return web.json_response({"ok": True, "result": {
+            "message_id": self.n_replies, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "text": form.get("text", ""),
+        }})
+
+    async def get_contact_msgs(self, request):
+        await asyncio.sleep(self.api_delay)
+        return web.json_response([{"public_name": "Load test study", "contact_message": "test@example.com"}])
+
+    async def link_telegram_id(self, request):
+        await asyncio.sleep(self.api_delay)
+        return web.json_response({"message": "Telegram ID linked successfully"})
+
+    async def start(self, port: int) -> None:
+        app = web.Application()
+        app.router.add_post(f"/bot{TOKEN}/getMe", self.get_me)
+        app.router.add_post(f"/bot{TOKEN}/sendMessage", self.send_message)
+        app.router.add_get("/api/bot/get_contact_msgs", self.get_contact_msgs)
+        app.router.add_put("/api/bot/link_telegram_id", self.link_telegram_id)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", port).start()
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+
+def command_update(update_id: int, user_id: int, text: str) -> dict:
+    """A Telegram update for a private message; commands get a bot_command entity."""
+    user = {"id": user_id, "is_bot": False, "first_name": f"Participant {user_id}"}
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
@@ -0,0 +1,56 @@
+"""
+Load test: feed the bot a burst of fake /contact updates and time how long it takes to answer them all.
+
+A local aiohttp server (fake_services.py) stands in for both Telegram and the Flask API, whose
+/api/bot/get_contact_msgs answers after --api-delay seconds. If handlers block the event loop
+the burst takes about updates x api-delay; handled concurrently it takes about one api-delay.
+
+Usage:
+    python load_test.py [--updates 200] [--api-delay 0.5] [--port 9100]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from fake_services import TOKEN, FakeServices, command_update
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--updates", type=int, default=200)
+parser.add_argument("--api-delay", type=float, default=0.5)
+parser.add_argument("--port", type=int, default=9100)
+args = parser.parse_args()
+
+os.environ["TELEGRAM_SECRET_KEY"] = TOKEN
+os.environ["BOT_SECRET_KEY"] = "load-test"
+os.environ["FLASK_APP_BOT_BASE_URL"] = f"http://127.0.0.1:{args.port}/api/bot"
+os.environ["TELEGRAM_BASE_URL"] = f"http://127.0.0.1:{args.port}/bot"
+
+from telegram import Update  # noqa: E402
+import telegram_bot  # noqa: E402  (reads the environment above)
+
+
+async def main():
+    services = FakeServices(args.api_delay, expected_replies=args.updates)
+    await services.start(args.port)
+
+    application = telegram_bot.build_application()
+    async with application:
+        await application.start()
+        start = time.perf_counter()
+        for i in range(args.updates):
+            update = command_update(i, 1000 + i, "/contact")
+            await application.update_queue.put(Update.de_json(update, application.bot))
+        await asyncio.wait_for(services.all_replied.wait(), timeout=args.updates * args.api_delay + 30)
+        elapsed = time.perf_counter() - start
+        await application.stop()
+    await telegram_bot.api.aclose()  # post_shutdown only runs under run_webhook/run_polling
+    await services.stop()
+
+    print(f"{args.updates} updates answered in {elapsed:.2f}s "
+          f"(one at a time would take at least {args.updates * args.api_delay:.1f}s)")
+    print(f"{args.updates / elapsed:.0f} updates/s with CONCURRENT_UPDATES={telegram_bot.config.CONCURRENT_UPDATES}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""
+Load test for the stream-based bot: a fake update source pushes updates onto the Redis
+shard streams (as webhook_ingest.py would) and N update_worker.py processes handle them.
+
+Half of the fake participants send /contact; the other half send /enroll followed by a
+signup code, which only succeeds if their conversation state is kept in order across the
+stream and persistence. The test is repeated for each worker count in --workers.
+
+Needs a local Redis; the given database is flushed. Usage:
+    python load_test_workers.py [--workers 1,2,4] [--participants 500] [--api-delay 0.05] \
+        [--redis-url redis://localhost:6379/15] [--port 9100]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import redis.asyncio as aioredis
+
+from config import Config
+from fake_services import TOKEN, FakeServices, command_update
+from update_stream import enqueue_update
+
+ENROLLED_REPLY = "You have been successfully enrolled in the study."
+
+
+async def run(n_workers: int, args) -> None:
+    redis = aioredis.from_url(args.redis_url)
+    await redis.flushdb()
+
+    n_enroll = args.participants // 2
+    n_contact = args.participants - n_enroll
+    # /contact: one reply; /enroll + code: two replies
+    services = FakeServices(args.api_delay, expected_replies=n_contact + 2 * n_enroll)
+    await services.start(args.port)
+
+    env = {
+        **os.environ,
+        "ENV_TYPE": "development",
+        "TELEGRAM_SECRET_KEY": TOKEN,
+        "BOT_SECRET_KEY": "load-test",
+        "REDIS_URL": args.redis_url,
+        "TELEGRAM_BASE_URL": f"http://127.0.0.1:{args.port}/bot",
+        "FLASK_APP_BOT_BASE_URL": f"http://127.0.0.1:{args.port}/api/bot",
+        "BOT_WORKER_COUNT": str(n_workers),
+    }
+    workers = [
+        subprocess.Popen([sys.executable, "update_worker.py"], env={**env, "BOT_WORKER_INDEX": str(i)})
+        for i in range(n_workers)
+    ]
+    await asyncio.sleep(3)  # let the workers connect and create their consumer groups
+
+    start = time.perf_counter()
+    update_id = 0
+    for user_id in range(1, args.participants + 1):
+        texts = ["/enroll", f"CODE{user_id}"] if user_id <= n_enroll else ["/contact"]
+        for text in texts:
+            update_id += 1
+            await enqueue_update(
+                redis, command_update(update_id, user_id, text),
+                Config.BOT_UPDATE_SHARDS, Config.BOT_UPDATE_STREAM_MAXLEN,
+            )
+    try:
+        await asyncio.wait_for(services.all_replied.wait(), timeout=120)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.wait()
+    await services.stop()
+    await redis.aclose()
+
+    enrolled = sum(1 for user_id in range(1, n_enroll + 1) if ENROLLED_REPLY in services.replies[user_id])
+    print(f"{n_workers} worker(s): {services.n_replies}/{services.expected_replies} replies in {elapsed:.2f}s "
+          f"({services.n_replies / elapsed:.0f} replies/s), {enrolled}/{n_enroll} enroll conversations completed")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--participants", type=int, default=500)
+    parser.add_argument("--api-delay", type=float, default=0.05)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    for n_workers in (int(n) for n in args.workers.split(",")):
+        await run(n_workers, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+import json
+from copy import deepcopy
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+
+class RedisPersistence(BasePersistence):
+    """
+    python-telegram-bot persistence backed by Redis, so ConversationHandler state (and
+    user/chat/bot data) survives restarts and is shared by every bot worker.
+
+    Values are stored as JSON in hashes under `prefix`. Callback data is not stored.
+    The Application loads everything once at startup and writes changes back in
+    update_persistence(); update_worker.py calls that after each batch, before acknowledging it.
+    """
+
+    def __init__(self, redis, prefix: str = "bot:persistence", update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(callback_data=False),
+            update_interval=update_interval,
+        )
+        self.redis = redis
+        self.prefix = prefix
+
+    def _key(self, *parts) -> str:
+        return ":".join([self.prefix, *parts])
+
+    async def _load_hash(self, key: str) -> dict:
+        raw = await self.redis.hgetall(key)
+        return {int(k): json.loads(v) for k, v in raw.items()}
+
+    # --- Conversations ---
+    async def get_conversations(self, name: str) -> dict:
+        raw = await self.redis.hgetall(self._key("conversations", name))
+        return {tuple(json.loads(k)): json.loads(v) for k, v in raw.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        field = json.dumps(list(key))
+        if new_state is None:
+            await self.redis.hdel(self._key("conversations", name), field)
+        else:
+            await self.redis.hset(self._key("conversations", name), field, json.dumps(new_state))
+
+    # --- User / chat data ---
+    async def get_user_data(self) -> dict:
+        return await self._load_hash(self._key("user_data"))
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self.redis.hset(self._key("user_data"), str(user_id), json.dumps(data))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self.redis.hdel(self._key("user_data"), str(user_id))
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def get_chat_data(self) -> dict:
+        return await self._load_hash(self._key("chat_data"))
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await self.redis.hset(self._key("chat_data"), str(chat_id), json.dumps(data))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self.redis.hdel(self._key("chat_data"), str(chat_id))
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    # --- Bot data ---
+    async def get_bot_data(self) -> dict:
+        raw = await self.redis.get(self._key("bot_data"))
+        return json.loads(raw) if raw else {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        await self.redis.set(self._key("bot_data"), json.dumps(deepcopy(data)))
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # --- Callback data (not stored) ---
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # Every update is written straight to Redis
+        pass
@@ -8,10 +8,11 @@ from telegram.ext import (
     filters,
 )
 import os
-import requests
+import httpx
 from dotenv import load_dotenv
 from logger_setup import setup_logger
 from config import CurrentConfig
+from api_client import BotApiClient
 
 # Setup logging
 logger = setup_logger()
@@ -24,8 +25,12 @@ load_dotenv()
 # Load configuration
 config = CurrentConfig()
 
+# Shared client for all calls to the Flask API
+api = BotApiClient.from_config(config)
+
 # Define conversation states
 ENTERING_LINK_CODE = 1
+ENTERING_TIMEZONE = 2
 
 # Define command descriptions
 COMMAND_DESCRIPTIONS = {
@@ -34,7 +39,7 @@ COMMAND_DESCRIPTIONS = {
     'contact': 'View instructions for contacting the study team',
     'dashboard': 'View the online dashboard',
     # 'unenroll': 'Unenroll from a study',
-    # 'timezone': 'Set your time zone',
+    'timezone': 'Change your time zone',
 }
 
 # --- Handlers ---
@@ -56,18 +61,16 @@ async def enroll(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def entering_link_code(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the input of a study signup code."""
     linking_code = update.message.text.strip()
-    header = {
-        "X-Bot-Secret-Key": config.BOT_SECRET_KEY,
-    }
     payload = {
         "telegram_id": update.message.from_user.id,
         "telegram_link_code": linking_code,
     }
-    resp = requests.put(
-        f"{config.FLASK_APP_BOT_BASE_URL}/link_telegram_id",
-        json=payload,
-        headers=header
-    )
+    try:
+        resp = await api.put("/link_telegram_id", json=payload)
+    except httpx.HTTPError as e:
+        logger.error(f"Error linking Telegram ID to enrollment: {e!r}")
+        await update.message.reply_text("An error occurred. Please try again or type /cancel to cancel.")
+        return ENTERING_LINK_CODE
     logger.debug(f"Status code from link_telegram_id: {resp.status_code}")
 
     if resp.status_code == 409:
@@ -91,19 +94,69 @@ async def entering_link_code(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return ConversationHandler.END
 
 
+async def change_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handles the /timezone command and prompts for a time zone name."""
+    msg = (
+        "Please enter your new time zone, e.g. America/New_York or Europe/London. "
+        "Your upcoming pings will keep the same local times in the new time zone."
+    )
+    await update.message.reply_text(msg)
+    return ENTERING_TIMEZONE
+
+
+async def entering_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handles the input of a new time zone."""
+    tz = update.message.text.strip()
+    payload = {
+        "telegram_id": update.message.from_user.id,
+        "tz": tz,
+    }
+    try:
+        resp = await api.put("/timezone", json=payload)
+    except httpx.HTTPError as e:
+        logger.error(f"Error changing time zone: {e!r}")
+        await update.message.reply_text("An error occurred. Please try again or type /cancel to cancel.")
+        return ENTERING_TIMEZONE
+    logger.debug(f"Status code from timezone: {resp.status_code}")
+
+    if resp.status_code == 400:
+        msg = (
+            f"'{tz}' is not a recognized time zone. Please enter a name like America/New_York, "
+            "or type /cancel to cancel."
+        )
+        await update.message.reply_text(msg)
+        return ENTERING_TIMEZONE
+
+    if resp.status_code == 404:
+        msg = "You are not enrolled in any studies. Use /enroll to join a study."
+        await update.message.reply_text(msg)
+        return ConversationHandler.END
+
+    if resp.status_code != 200:
+        msg = "An error occurred. Please try again or type /cancel to cancel."
+        logger.error(f"Error changing time zone: {resp.status_code}")
+        await update.message.reply_text(msg)
+        return ENTERING_TIMEZONE
+
+    msg = f"Your time zone has been changed to {tz}."
+    await update.message.reply_text(msg)
+    return ConversationHandler.END
+
+
 async def dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the /dashboard command."""
-    header = {
-        "X-Bot-Secret-Key": config.BOT_SECRET_KEY,
-    }
     payload = {
         "telegram_id": update.message.from_user.id,
     }
-    url = f"{config.FLASK_APP_BOT_BASE_URL}/participant_login"
     logger.debug(
-        f"Sending dashboard login request to {url} with telegramID={update.message.from_user.id}"
+        f"Sending dashboard login request with telegramID={update.message.from_user.id}"
     )
-    resp = requests.post(url=url, json=payload, headers=header)
+    try:
+        resp = await api.post("/participant_login", json=payload)
+    except httpx.HTTPError as e:
+        logger.error(f"Error with participant_login endpoint: {e!r}")
+        await update.message.reply_text("An error occurred. Please try again later.")
+        return
 
     if resp.status_code != 200:
         msg = "An error occurred. Please try again later."
@@ -116,18 +169,19 @@ async def dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the /contact command."""
-    header = {
-        "X-Bot-Secret-Key": config.BOT_SECRET_KEY,
-    }
     payload = {
         "telegram_id": update.message.from_user.id,
     }
 
-    url = f"{config.FLASK_APP_BOT_BASE_URL}/get_contact_msgs"
     logger.debug(
-        f"Sending contact message GET request to {url} with telegramID={update.message.from_user.id}"
+        f"Sending contact message GET request with telegramID={update.message.from_user.id}"
     )
-    resp = requests.get(url=url, params=payload, headers=header)
+    try:
+        resp = await api.get("/get_contact_msgs", params=payload)
+    except httpx.HTTPError as e:
+        logger.error(f"Error with participant_contact endpoint: {e!r}")
+        await update.message.reply_text("An error occurred. Please try again later.")
+        return
 
     if resp.status_code != 200:
         msg = "An error occurred. Please try again later."
@@ -137,9 +191,12 @@ async def contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text(msg)
         return
 
-    for study in resp.json():
-        msg = f"Study: {study['public_name']}\nContact: {study['contact_message']}"
-        await update.message.reply_text(msg)
+    # One message for all studies, so repeated /contact presses cost a single Telegram send
+    msg = "\n\n".join(
+        f"Study: {study['public_name']}\nContact: {study['contact_message']}"
+        for study in resp.json()
+    )
+    await update.message.reply_text(msg)
 
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -155,10 +212,28 @@ async def fallback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await start(update, context)
 
 
-def main() -> None:
-    """Main function to start the bot in webhook mode."""
-    # Build the Application with your bot token
-    application = Application.builder().token(config.TELEGRAM_SECRET_KEY).build()
+async def close_api_client(application: Application) -> None:
+    await api.aclose()
+
+
+def build_application(telegram_base_url=None, persistence=None) -> Application:
+    """
+    Build the Application and register the handlers.
+    `telegram_base_url` points the bot at a fake Telegram server (defaults to TELEGRAM_BASE_URL).
+    With a `persistence`, conversation state is stored there (see update_worker.py).
+    """
+    builder = (
+        Application.builder()
+        .token(config.TELEGRAM_SECRET_KEY)
+        .concurrent_updates(config.CONCURRENT_UPDATES)
+        .post_shutdown(close_api_client)
+    )
+    telegram_base_url = telegram_base_url or config.TELEGRAM_BASE_URL
+    if telegram_base_url:
+        builder = builder.base_url(telegram_base_url)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
 
     # Conversation handler
     conv_handler = ConversationHandler(
@@ -166,20 +241,35 @@ def main() -> None:
             CommandHandler('enroll', enroll),
             CommandHandler('contact', contact),
             CommandHandler('dashboard', dashboard),
+            CommandHandler('timezone', change_timezone),
             # CommandHandler('unenroll', some_handler),
         ],
         states={
             ENTERING_LINK_CODE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, entering_link_code)
             ],
+            ENTERING_TIMEZONE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, entering_timezone)
+            ],
         },
         fallbacks=[CommandHandler('cancel', cancel)],
+        name="participant_conversation",
+        persistent=persistence is not None,
     )
 
     # Add handlers
     application.add_handler(CommandHandler('start', start))
     application.add_handler(conv_handler)
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, fallback))
+    return application
+
+
+def main() -> None:
+    """
+    Start the bot as a single webhook process, with conversation state in memory.
+    In production webhooks go through webhook_ingest.py and update_worker.py instead.
+    """
+    application = build_application()
 
     # ---------------------------------------------------------------------------------
     # RUN WEBHOOK INSTEAD OF POLLING
@@ -0,0 +1,12 @@
+"""
+Shared setup for the pytest checks in this directory. They run against fakeredis, so neither
+Redis nor Telegram is needed.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# config.py reads the environment at import time
+os.environ.setdefault("BOT_SECRET_KEY", "test-bot-secret")
+os.environ.setdefault("WEBHOOK_SECRET_TOKEN", "test-webhook-secret")
@@ -0,0 +1,159 @@
+"""
+Checks for the webhook -> Redis stream -> worker path: shard routing, the webhook's secret
+token check, recovery of pending updates at startup and RedisPersistence round-trips.
+
+Usage:
+    cd bot && python -m pytest -q tests
+"""
+import asyncio
+import json
+
+import fakeredis.aioredis
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import webhook_ingest
+from redis_persistence import RedisPersistence
+from update_stream import UPDATE_GROUP, enqueue_update, ensure_update_group, shard_for, stream_key
+from update_worker import recover_pending
+
+N_SHARDS = 16
+
+
+def message_update(update_id, user_id, text="hi"):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "P"},
+            "text": text,
+        },
+    }
+
+
+def callback_update(update_id, user_id):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": "c",
+            "from": {"id": user_id, "is_bot": False, "first_name": "P"},
+            "data": "tz",
+        },
+    }
+
+
+class FakeApplication:
+    """
+    Records the updates handed to it in place of a python-telegram-bot Application.
+    """
+
+    bot = None
+
+    def __init__(self):
+        self.processed = []
+        self.persisted = 0
+
+    async def process_update(self, update):
+        self.processed.append(update.update_id)
+
+    async def update_persistence(self):
+        self.persisted += 1
+
+
+def test_same_chat_always_goes_to_the_same_shard():
+    for user_id in (1, 17, 123456789, 987654321):
+        shards = {
+            shard_for(message_update(1, user_id), N_SHARDS),
+            shard_for(message_update(2, user_id, text="/start"), N_SHARDS),
+            shard_for(callback_update(3, user_id), N_SHARDS),
+        }
+        assert len(shards) == 1
+
+    async def run():
+        redis = fakeredis.aioredis.FakeRedis()
+        for update_id in range(5):
+            await enqueue_update(redis, message_update(update_id, 42), N_SHARDS, maxlen=1000)
+        assert await redis.xlen(stream_key(shard_for(message_update(0, 42), N_SHARDS))) == 5
+
+    asyncio.run(run())
+
+
+def test_pending_updates_are_claimed_and_handled_at_startup():
+    async def run():
+        redis = fakeredis.aioredis.FakeRedis()
+        key = stream_key(shard_for(message_update(1, 7), N_SHARDS))
+        await ensure_update_group(redis, key)
+        for update_id in (1, 2, 3):
+            await enqueue_update(redis, message_update(update_id, 7), N_SHARDS, maxlen=1000)
+
+        # A previous worker read the updates and died before acknowledging them
+        await redis.xreadgroup(UPDATE_GROUP, "worker-old", {key: ">"}, count=10)
+        assert (await redis.xpending(key, UPDATE_GROUP))["pending"] == 3
+
+        application = FakeApplication()
+        n_handled = await recover_pending(application, redis, [key], "worker-0", batch_size=2)
+
+        assert n_handled == 3
+        assert application.processed == [1, 2, 3]
+        assert application.persisted >= 1
+        assert (await redis.xpending(key, UPDATE_GROUP))["pending"] == 0
+
+    asyncio.run(run())
+
+
+def test_webhook_checks_the_secret_token():
+    async def run():
+        redis = fakeredis.aioredis.FakeRedis()
+        app = web.Application()
+        app["redis"] = redis
+        app.router.add_post("/webhook", webhook_ingest.handle_webhook)
+        update = message_update(1, 99)
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(
+                "/webhook", json=update, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+            )
+            assert response.status == 401
+            response = await client.post("/webhook", json=update)
+            assert response.status == 401
+            assert await redis.xlen(stream_key(shard_for(update, N_SHARDS))) == 0
+
+            response = await client.post(
+                "/webhook",
+                json=update,
+                headers={"X-Telegram-Bot-Api-Secret-Token": webhook_ingest.config.WEBHOOK_SECRET_TOKEN},
+            )
+            assert response.status == 200
+
+        shard = shard_for(update, webhook_ingest.config.BOT_UPDATE_SHARDS)
+        entries = await redis.xrange(stream_key(shard))
+        assert [json.loads(fields[b"update"]) for _, fields in entries] == [update]
+
+    asyncio.run(run())
+
+
+def test_redis_persistence_round_trip():
+    async def run():
+        redis = fakeredis.aioredis.FakeRedis()
+        persistence = RedisPersistence(redis, prefix="test:persistence")
+        await persistence.update_conversation("signup", (5, 5), 1)
+        await persistence.update_conversation("signup", (6, 6), 2)
+        await persistence.update_conversation("signup", (6, 6), None)
+        await persistence.update_user_data(5, {"link_code": "abc"})
+        await persistence.update_chat_data(5, {"tz": "Europe/Paris"})
+        await persistence.update_bot_data({"version": 2})
+
+        # A fresh instance, as after a restart or on another worker
+        reloaded = RedisPersistence(redis, prefix="test:persistence")
+        assert await reloaded.get_conversations("signup") == {(5, 5): 1}
+        assert await reloaded.get_user_data() == {5: {"link_code": "abc"}}
+        assert await reloaded.get_chat_data() == {5: {"tz": "Europe/Paris"}}
+        assert await reloaded.get_bot_data() == {"version": 2}
+
+        await reloaded.drop_user_data(5)
+        assert await persistence.get_user_data() == {}
+
+    asyncio.run(run())
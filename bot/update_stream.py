@@ -0,0 +1,52 @@
+import json
+
+from redis.exceptions import ResponseError
+
+UPDATE_STREAM_PREFIX = "bot:updates"
+UPDATE_GROUP = "bot-workers"
+
+
+def stream_key(shard: int) -> str:
+    return f"{UPDATE_STREAM_PREFIX}:{shard}"
+
+
+def update_user_key(update: dict) -> int:
+    """
+    The id used to keep one participant's updates in order: the sender's user id,
+    else the chat id, else the update id.
+    """
+    for value in update.values():
+        if isinstance(value, dict):
+            if "from" in value:
+                return value["from"]["id"]
+            if "chat" in value:
+                return value["chat"]["id"]
+    return update.get("update_id", 0)
+
+
+def shard_for(update: dict, n_shards: int) -> int:
+    return update_user_key(update) % n_shards
+
+
+def owned_shards(worker_index: int, worker_count: int, n_shards: int) -> list:
+    return [shard for shard in range(n_shards) if shard % worker_count == worker_index]
+
+
+async def enqueue_update(redis, update: dict, n_shards: int, maxlen: int) -> bytes:
+    """
+    Append a raw Telegram update to its user's shard stream.
+    """
+    return await redis.xadd(
+        stream_key(shard_for(update, n_shards)),
+        {"update": json.dumps(update)},
+        maxlen=maxlen,
+        approximate=True,
+    )
+
+
+async def ensure_update_group(redis, key: str) -> None:
+    try:
+        await redis.xgroup_create(key, UPDATE_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
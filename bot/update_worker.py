@@ -0,0 +1,138 @@
+"""
+Bot worker: consumes the Telegram updates queued by webhook_ingest.py and runs them through
+the bot's handlers, with conversation state in Redis (RedisPersistence).
+
+Worker BOT_WORKER_INDEX of BOT_WORKER_COUNT owns the shards s with s % count == index, so each
+participant is always handled by one worker and their updates stay in order. Different
+participants are handled concurrently. A batch is acknowledged only after its conversation
+state has been written to Redis. On startup a worker claims every entry left pending on its
+shards, by any consumer, so updates held by a crashed worker, or by a previous owner after
+BOT_WORKER_COUNT changed, are handled again.
+"""
+import asyncio
+import json
+from collections import defaultdict
+
+import redis.asyncio as aioredis
+from telegram import Update
+
+import telegram_bot
+from config import CurrentConfig
+from logger_setup import setup_logger
+from redis_persistence import RedisPersistence
+from update_stream import (
+    UPDATE_GROUP,
+    ensure_update_group,
+    owned_shards,
+    stream_key,
+    update_user_key,
+)
+
+logger = setup_logger()
+config = CurrentConfig()
+
+
+async def process_in_order(application, updates) -> None:
+    for update in updates:
+        await application.process_update(update)
+
+
+async def process_batch(application, redis, entries) -> int:
+    """
+    Handle one XREADGROUP result: each user's updates in order, users concurrently,
+    then save conversation state and acknowledge the entries.
+    """
+    by_user = defaultdict(list)
+    acks = defaultdict(list)
+    for key, messages in entries:
+        for entry_id, fields in messages:
+            acks[key].append(entry_id)
+            try:
+                data = json.loads(fields[b"update"])
+                by_user[update_user_key(data)].append(Update.de_json(data, application.bot))
+            except Exception as e:
+                logger.error(f"Dropping malformed update {entry_id} from {key}: {e!r}")
+
+    results = await asyncio.gather(
+        *(process_in_order(application, updates) for updates in by_user.values()),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error processing updates: {result!r}")
+
+    await application.update_persistence()
+    for key, ids in acks.items():
+        await redis.xack(key, UPDATE_GROUP, *ids)
+    return sum(len(ids) for ids in acks.values())
+
+
+async def claim_pending(redis, key, consumer, batch_size) -> int:
+    """
+    Move every pending entry of a shard to `consumer`, whichever consumer it was delivered to.
+    Shards have a single owner, so there is no need to wait for entries to go idle.
+    """
+    n_claimed = 0
+    cursor = "0-0"
+    while True:
+        # Not justid: redis-py then returns only the ids and drops the cursor
+        result = await redis.xautoclaim(
+            key, UPDATE_GROUP, consumer, min_idle_time=0, start_id=cursor, count=batch_size
+        )
+        cursor, claimed = result[0], result[1]
+        n_claimed += len(claimed)
+        if cursor in (b"0-0", "0-0"):
+            return n_claimed
+
+
+async def recover_pending(application, redis, keys, consumer, batch_size) -> int:
+    """
+    Handle every update left unacknowledged on the given shards before consuming new ones.
+    Returns the number of updates handled.
+    """
+    for key in keys:
+        await ensure_update_group(redis, key)
+        n_claimed = await claim_pending(redis, key, consumer, batch_size)
+        if n_claimed:
+            logger.info(f"Worker {consumer} claimed {n_claimed} pending updates on {key}.")
+
+    # Then re-read the updates now pending for this consumer (delivered but never acknowledged)
+    n_handled = 0
+    pending = {key: "0" for key in keys}
+    while pending:
+        entries = await redis.xreadgroup(UPDATE_GROUP, consumer, pending, count=batch_size)
+        entries = [(key, messages) for key, messages in entries if messages]
+        pending = {key.decode(): "0" for key, _ in entries}
+        if entries:
+            n_handled += await process_batch(application, redis, entries)
+    return n_handled
+
+
+async def run_worker(application, redis, shards, consumer, batch_size) -> None:
+    keys = [stream_key(shard) for shard in shards]
+    await recover_pending(application, redis, keys, consumer, batch_size)
+    logger.info(f"Worker {consumer} consuming shards {shards}.")
+
+    while True:
+        entries = await redis.xreadgroup(
+            UPDATE_GROUP, consumer, {key: ">" for key in keys}, count=batch_size, block=1000
+        )
+        if entries:
+            await process_batch(application, redis, entries)
+
+
+async def main() -> None:
+    redis = aioredis.from_url(config.REDIS_URL)
+    application = telegram_bot.build_application(persistence=RedisPersistence(redis))
+    shards = owned_shards(config.BOT_WORKER_INDEX, config.BOT_WORKER_COUNT, config.BOT_UPDATE_SHARDS)
+    consumer = f"worker-{config.BOT_WORKER_INDEX}"
+    try:
+        async with application:
+            await run_worker(application, redis, shards, consumer, config.BOT_WORKER_BATCH_SIZE)
+    finally:
+        await telegram_bot.api.aclose()
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Receives Telegram webhooks and appends each update to its user's Redis stream shard, to be
+handled by the update workers (update_worker.py). Answering right away keeps Telegram's
+delivery fast however long the handlers take; if Redis is down the webhook returns 503 and
+Telegram redelivers the update later.
+"""
+import hmac
+
+from aiohttp import web
+import redis.asyncio as aioredis
+from telegram import Bot, Update
+
+from config import CurrentConfig
+from logger_setup import setup_logger
+from update_stream import enqueue_update
+
+logger = setup_logger()
+config = CurrentConfig()
+
+
+async def handle_webhook(request: web.Request) -> web.Response:
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(token.encode(), config.WEBHOOK_SECRET_TOKEN.encode()):
+        return web.Response(status=401)
+    try:
+        update = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+
+    try:
+        await enqueue_update(
+            request.app["redis"], update, config.BOT_UPDATE_SHARDS, config.BOT_UPDATE_STREAM_MAXLEN
+        )
+    except Exception as e:
+        logger.error(f"Could not queue update {update.get('update_id')}: {e!r}")
+        return web.Response(status=503)
+    return web.Response()
+
+
+async def on_startup(app: web.Application) -> None:
+    app["redis"] = aioredis.from_url(config.REDIS_URL)
+    if config.WEBHOOK_URL:
+        bot_kwargs = {"base_url": config.TELEGRAM_BASE_URL} if config.TELEGRAM_BASE_URL else {}
+        async with Bot(config.TELEGRAM_SECRET_KEY, **bot_kwargs) as bot:
+            await bot.set_webhook(
+                url=config.WEBHOOK_URL,
+                secret_token=config.WEBHOOK_SECRET_TOKEN,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        logger.info(f"Webhook set to {config.WEBHOOK_URL}")
+
+
+async def on_cleanup(app: web.Application) -> None:
+    await app["redis"].aclose()
+
+
+def create_ingest_app() -> web.Application:
+    # Without the token anyone who finds the URL could inject updates as any participant
+    if not config.WEBHOOK_SECRET_TOKEN:
+        raise RuntimeError("WEBHOOK_SECRET_TOKEN must be set to run the webhook receiver.")
+    app = web.Application()
+    app.router.add_post("/webhook", handle_webhook)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_ingest_app(), host="0.0.0.0", port=8443)
@@ -18,7 +18,7 @@ def create_app(config=CurrentConfig):
     # Create and configure the Flask app
     app = Flask(__name__)
     app.config.from_object(config)
-    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
     # Initialize logger
     logger = setup_logger()
@@ -33,7 +33,7 @@ def create_app(config=CurrentConfig):
     app.celery = celery # Add celery to app context    
 
     # Import models AFTER db is set up
-    from models import User, Study, PingTemplate, UserStudy, Ping, Enrollment, Support
+    from models import User, Study, PingTemplate, UserStudy, Ping, Enrollment, Support, StudyStat, StudyStatSweep
 
     # Register Blueprints
     # from blueprints.admin import admin_bp
@@ -45,6 +45,7 @@ def create_app(config=CurrentConfig):
     from blueprints.enrollments import enrollments_bp
     from blueprints.pings import pings_bp
     from blueprints.participant_facing import particpant_facing_bp
+    from blueprints.forwarder import forwarder_bp
 
     # app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(bot_bp, url_prefix='/api/bot')
@@ -55,11 +56,30 @@ def create_app(config=CurrentConfig):
     app.register_blueprint(enrollments_bp, url_prefix='/api')
     app.register_blueprint(pings_bp, url_prefix='/api')
     app.register_blueprint(particpant_facing_bp, url_prefix='/api')
+    app.register_blueprint(forwarder_bp, url_prefix='/api')
+
+    # Request counts and latency per endpoint, plus /metrics; registered first so requests
+    # rejected by the rate limiter are counted too
+    from metrics import init_metrics
+    init_metrics(app)
+
+    # Per-request query counts and N+1 warnings when SQL_PROFILER_ENABLED is set
+    from sql_profiler import init_sql_profiler
+    init_sql_profiler(app)
+
+    # Rate limit unauthenticated endpoints before any view (and DB) code runs
+    from rate_limit import init_rate_limiting, get_rate_limit_counters
+    init_rate_limiting(app)
 
     # Health Check
     @app.route('/health', methods=['GET'])
     def health():
         return {'status': 'healthy'}, 200
+
+    # Rate limiter counters (not proxied by nginx, like /health)
+    @app.route('/rate_limits', methods=['GET'])
+    def rate_limits():
+        return get_rate_limit_counters(), 200
     
     # Log all requests
     # @app.before_request
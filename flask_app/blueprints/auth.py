@@ -5,7 +5,7 @@ from flask import (
     Response, 
     jsonify
 )
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_jwt_extended import (
     create_access_token, 
     create_refresh_token, 
@@ -20,6 +20,9 @@ import redis
 from config import CurrentConfig
 from models import User
 from extensions import db, jwt, redis_client
+from token_blocklist import get_blocklist_cache
+from password_hashing import HashingBusy, needs_rehash
+from login_limiter import login_retry_after, record_login_failure, clear_login_failures
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -28,9 +31,7 @@ def check_if_token_is_blacklisted(jwt_header, jwt_payload):
     """
     Check if the given JWT is blacklisted (logged out).
     """
-    jti = jwt_payload["jti"]
-    entry = redis_client.get(f"blacklisted_{jti}")
-    return entry is not None
+    return get_blocklist_cache().is_revoked(jwt_payload["jti"])
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -58,6 +59,10 @@ def register():
         db.session.commit()
         current_app.logger.info(f"User registered successfully: {email}")
         return jsonify({'message': 'User registered successfully'}), 201
+    except HashingBusy:
+        db.session.rollback()
+        current_app.logger.warning(f"Password hashing pool saturated while registering: {email}")
+        return jsonify({'message': 'Server busy, please try again shortly'}), 503
     except Exception as e:
         current_app.logger.error(f"Error registering user: {email}, error: {e}")
         return jsonify({'message': 'Registration failed'}), 500
@@ -74,19 +79,43 @@ def login():
         current_app.logger.warning("Missing email or password in login request")
         return jsonify({'message': 'Missing email or password'}), 400
 
+    # Refuse before hashing anything if this IP, or this account from this IP, has too many recent failures
+    ip = request.remote_addr or "unknown"
+    retry_after = login_retry_after(ip, email)
+    if retry_after:
+        current_app.logger.warning(f"Login blocked for email={email} from ip={ip} for {retry_after}s")
+        response = jsonify({'message': 'Too many failed login attempts. Please try again later.'})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+
     user = User.query.filter_by(email=email).first()
-    if user and user.check_password(password):
+    try:
+        valid_password = user is not None and user.check_password(password)
+    except HashingBusy:
+        current_app.logger.warning(f"Password hashing pool saturated during login for email: {email}")
+        return jsonify({'message': 'Server busy, please try again shortly'}), 503
+
+    if valid_password:
+        # Re-hash with the current parameters if they changed since this password was set
+        if needs_rehash(user.password):
+            try:
+                user.set_password(password)
+                current_app.logger.info(f"Upgraded password hash for user: {email}")
+            except HashingBusy:
+                pass  # upgrade on a later login
         access_token = create_access_token(identity=str(user.id))
         refresh_token = create_refresh_token(identity=str(user.id))
         # Update last_login timestamp in user table
         user.last_login = datetime.now()
         db.session.commit()
+        clear_login_failures(ip, email)
         current_app.logger.info(f"User logged in successfully: {email}")
         return jsonify({
             'access_token': access_token,
             'refresh_token': refresh_token
         }), 200
 
+    record_login_failure(ip, email)
     current_app.logger.warning(f"Invalid login attempt for email: {email}")
     return jsonify({'message': 'Invalid credentials'}), 401
 
@@ -121,7 +150,7 @@ def logout():
     else:
         expires = timedelta(hours=1)  # Default to 1 hour if type is unknown
 
-    # Add to Redis with an expiration time. 
-    current_app.redis.setex(f"blacklisted_{jti}", expires, "true")
+    # Add to Redis with an expiration time and evict it from every worker's cache
+    get_blocklist_cache().revoke(jti, expires)
 
     return jsonify({"message": "Successfully logged out"}), 200
\ No newline at end of file
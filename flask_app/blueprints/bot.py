@@ -1,7 +1,7 @@
 from flask import Blueprint, request, g, Response, jsonify, current_app
 from flask_jwt_extended import jwt_required
 import urllib.parse
-from utils import generate_non_confusable_code
+from utils import generate_non_confusable_code, is_valid_timezone
 from models import Study, Enrollment, Ping, PingTemplate, User
 from extensions import db
 from random import randint
@@ -9,10 +9,20 @@ from datetime import timedelta, datetime, timezone
 from zoneinfo import ZoneInfo
 import secrets
 from functools import wraps
+from sqlalchemy.exc import IntegrityError
 from telegram_messenger import TelegramMessenger
-from message_constructor import MessageConstructor
+from message_constructor import MessageConstructor, cache_survey_urls
 from blueprints.enrollments import make_pings
-from crud import get_enrollments_by_telegram_id, get_enrollment_by_telegram_link_code, get_study_by_id
+from crud import (
+    get_enrollments_by_telegram_id, 
+    get_enrollment_by_telegram_link_code, 
+    get_study_by_id,
+    increment_study_stats_for_pings,
+    change_enrollment_timezone,
+    get_contact_msgs_for_telegram_id,
+)
+from cache import get_cached_json, invalidate_after_commit, contact_msgs_cache_key, participant_dashboard_cache_key
+from query_budget import query_budget
 
 bot_bp = Blueprint('bot', __name__)
 
@@ -34,11 +44,17 @@ def bot_auth_required(f):
 def assign_telegram_id_to_enrollment(telegram_id: int, enrollment: Enrollment):
     # Link Telegram ID to enrollment and mark link code as used
     try:
+        invalidate_after_commit(db.session, contact_msgs_cache_key(telegram_id))
         enrollment.telegram_id = telegram_id
         enrollment.telegram_link_code_used = True
         enrollment.enrolled = True
         db.session.commit()
         current_app.logger.info(f"Successfully linked Telegram ID {telegram_id} to enrollment ID {enrollment.id}.")
+    except IntegrityError:
+        # uq_enrollments_study_telegram_id: a concurrent request linked this account to the study first
+        db.session.rollback()
+        current_app.logger.warning(f"Telegram ID={telegram_id} already linked to study={enrollment.study_id}.")
+        return jsonify({"error": "Telegram ID already linked to this study."}), 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error linking Telegram ID {telegram_id} to enrollment with link code {enrollment.telegram_link_code}.")
@@ -46,6 +62,7 @@ def assign_telegram_id_to_enrollment(telegram_id: int, enrollment: Enrollment):
         return jsonify({"error": "Internal server error."}), 500
 
 @bot_bp.route('/link_telegram_id', methods=['PUT'])
+@query_budget(10)  # 8, plus room for make_pings inserting a large schedule in several batches
 @bot_auth_required
 def link_telegram_id():
     """
@@ -106,8 +123,10 @@ def link_telegram_id():
         return jsonify({"error": "Invalid telegram_link_code."}), 400
     
     # Link telegram ID and add to enrollment database
-    assign_telegram_id_to_enrollment(telegram_id=telegram_id, 
-                                     enrollment=enrollment)
+    error_response = assign_telegram_id_to_enrollment(telegram_id=telegram_id, 
+                                                      enrollment=enrollment)
+    if error_response:
+        return error_response
     
     # Make pings for the enrollment
     make_pings(enrollment_id=enrollment.id, study_id=enrollment.study_id)
@@ -157,6 +176,49 @@ def unenroll():
 
     return jsonify({"message": "Participant unenrolled successfully."}), 200
 
+@bot_bp.route('/timezone', methods=['PUT'])
+@bot_auth_required
+def update_timezone():
+    """
+    Change the time zone of all of a participant's enrollments.
+    Upcoming pings keep their local wall-clock time in the new zone.
+    """
+    current_app.logger.info("Received request to change participant time zone.")
+
+    data = request.get_json()
+    telegram_id = data.get('telegram_id')
+    tz = (data.get('tz') or '').strip()
+
+    if not telegram_id:
+        current_app.logger.error("Missing telegram_id parameter.")
+        return jsonify({"error": "Missing telegram_id parameter."}), 400
+
+    if not is_valid_timezone(tz):
+        current_app.logger.warning(f"Invalid time zone={tz} from telegram_id={telegram_id}.")
+        return jsonify({"error": "Invalid time zone."}), 400
+
+    try:
+        enrollments = get_enrollments_by_telegram_id(db.session, str(telegram_id))
+        if not enrollments:
+            return jsonify({"error": "Participant not found"}), 404
+
+        n_pings = 0
+        for enrollment in enrollments:
+            n_pings += change_enrollment_timezone(db.session, enrollment, tz)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error changing time zone to {tz} for telegram_id={telegram_id}.")
+        current_app.logger.exception(e)
+        return jsonify({"error": "Internal server error."}), 500
+
+    current_app.logger.info(
+        f"Changed time zone to {tz} for telegram_id={telegram_id}: "
+        f"{len(enrollments)} enrollments, {n_pings} upcoming pings shifted."
+    )
+    return jsonify({"message": "Time zone updated.", "tz": tz, "pings_updated": n_pings}), 200
+
+
 @bot_bp.route('/get_pings_in_time_interval', methods=['GET'])
 @bot_auth_required
 def get_pings_in_time_interval():
@@ -214,6 +276,9 @@ def participant_login():
         if not enrollments:
             return jsonify({"error": "Participant not found"}), 404
         
+        # The dashboard is cached per OTP, so drop the replaced OTPs' entries or they keep answering until the TTL
+        old_otps = {enrollment.dashboard_otp for enrollment in enrollments if enrollment.dashboard_otp}
+        invalidate_after_commit(db.session, *(participant_dashboard_cache_key(telegram_id, old) for old in old_otps))
         for enrollment in enrollments:
             enrollment.dashboard_otp = otp
             enrollment.dashboard_otp_expire_ts = expiry
@@ -280,6 +345,14 @@ def send_ping():
         current_app.logger.exception(e)
         return jsonify({"error": "Internal server error."}), 500
     
+    # Cron entries are built once a day; skip ones made stale by a time zone change or reschedule
+    if ping.sent_ts is not None or ping.deleted_at is not None:
+        current_app.logger.warning(f"Ping {ping_id} already sent or deleted. Skipping ping sending.")
+        return jsonify({"error": "Ping already sent or deleted."}), 409
+    if ping.scheduled_ts > datetime.now(timezone.utc) + timedelta(minutes=1):
+        current_app.logger.warning(f"Ping {ping_id} is now scheduled for {ping.scheduled_ts}. Skipping ping sending.")
+        return jsonify({"error": "Ping has been rescheduled."}), 409
+
     # Check if participant is enrolled
     if not enrollment.enrolled:
         current_app.logger.warning(f"Participant {enrollment.telegram_id} is not enrolled. Skipping ping sending.")
@@ -301,7 +374,9 @@ def send_ping():
     else:
         ping.sent_ts = datetime.now(timezone.utc)
         ping.sent_text = message
+        increment_study_stats_for_pings(db.session, [ping], "sent")
         db.session.commit()
+        cache_survey_urls([ping])
         
         # Log the end of the request
         current_app.logger.info(f"Successfully sent ping={ping_id}.")
@@ -318,29 +393,15 @@ def get_contact_msgs():
     '''
     current_app.logger.debug("Entered get_contact_msgs endpoint.")
     
+    telegram_id = request.args.get('telegram_id')
     
-    # Get the enrollments
-    enrollments = get_enrollments_by_telegram_id(db.session, request.args.get('telegram_id'))
-    if not enrollments:
+    # One joined query, cached until the participant's enrollments or their studies change
+    msgs = get_cached_json(
+        contact_msgs_cache_key(telegram_id),
+        lambda: get_contact_msgs_for_telegram_id(db.session, telegram_id),
+        current_app.config["CONTACT_MSGS_CACHE_TTL_SECONDS"],
+    )
+    if not msgs:
         return jsonify({"error": "Participant not found"}), 404
     
-    # Get the studies
-    study_ids = [enrollment.study_id for enrollment in enrollments]
-    
-    if not study_ids:
-        return jsonify({"error": "Participant not enrolled in any studies"}), 404
-    
-    # Get the contact messages
-    msgs = []
-    for study_id in study_ids:
-        study = get_study_by_id(db.session, study_id)
-        if not study:
-            current_app.logger.error(f"Study {study_id} not found.")
-            continue
-        msgs.append({
-            "study_id": study_id,
-            "public_name": study.public_name,
-            "contact_message": study.contact_message
-        })
-    
     return jsonify(msgs), 200
@@ -1,7 +1,8 @@
-
-from flask import Blueprint, request, jsonify, current_app
+import csv
+import io
+from flask import Blueprint, request, jsonify, current_app, Response
 from flask_jwt_extended import jwt_required
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 
 from extensions import db
 from crud import (
@@ -12,10 +13,21 @@ from crud import (
     soft_delete_enrollment,
     get_user_study,
     soft_delete_all_pings_for_enrollment,
-    get_ping_templates_by_study_id
+    get_ping_templates_by_study_id,
+    bulk_create_enrollments,
+    enrollment_has_pings,
 )
 from permissions import get_current_user, user_has_study_permission
+from query_budget import query_budget
 from utils import paginate_statement, random_time, convert_dt_to_local
+from exports import (
+    ENROLLMENT_EXPORT_COLUMNS,
+    enrollment_export_statement,
+    format_enrollment_row,
+    iter_csv,
+    csv_response,
+    get_zoneinfo,
+)
 
 from models import Enrollment, Study, Ping
 from sqlalchemy import select
@@ -42,6 +54,13 @@ def make_pings(enrollment_id, study_id):
             )
             return
         
+        # Pings are made once per enrollment; a repeated call must not schedule a second set
+        if enrollment_has_pings(db.session, enrollment_id):
+            current_app.logger.warning(
+                f"Enrollment={enrollment_id} already has pings. Skipping ping creation for study={study_id}."
+            )
+            return []
+        
         # Get ping templates
         ping_templates = get_ping_templates_by_study_id(db.session, study_id)
         if not ping_templates:
@@ -100,6 +119,7 @@ enrollments_bp = Blueprint('enrollments', __name__)
 
 
 @enrollments_bp.route('/studies/<int:study_id>/enrollments', methods=['GET'])
+@query_budget(5)
 @jwt_required()
 def get_enrollments(study_id):
     """
@@ -209,6 +229,151 @@ def get_enrollments(study_id):
         return jsonify({"error": "Internal server error"}), 500
 
 
+@enrollments_bp.route('/studies/<int:study_id>/enrollments/export', methods=['GET'])
+@jwt_required()
+def export_enrollments(study_id):
+    """
+    Stream all enrollments of a study as CSV, with signup time localised to each participant's time zone.
+    """
+    current_app.logger.debug(f"Entered export_enrollments route for study={study_id}.")
+
+    user = get_current_user()
+    if not user:
+        current_app.logger.warning("User not found while exporting enrollments.")
+        return jsonify({"error": "User not found"}), 404
+
+    study = user_has_study_permission(user_id=user.id, study_id=study_id, minimum_role="viewer")
+    if not study:
+        current_app.logger.warning(f"User={user.id} does not have access to study={study_id}.")
+        return jsonify({"error": f"Study={study_id} not found or no access"}), 403
+
+    current_app.logger.info(f"User={user.email} started enrollment export for study={study_id}.")
+    chunks = iter_csv(
+        db.session,
+        enrollment_export_statement(study.id),
+        header=ENROLLMENT_EXPORT_COLUMNS,
+        format_row=format_enrollment_row
+    )
+    return csv_response(chunks, filename=f"study_{study.id}_enrollments.csv")
+
+
+def parse_enrollment_import(file_storage, max_rows):
+    """
+    Parse an uploaded CSV with study_pid and tz columns.
+    Returns (participants, errors); errors lists human-readable problems by line number.
+    """
+    text = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    fieldnames = [f.strip() for f in (reader.fieldnames or [])]
+    if 'study_pid' not in fieldnames or 'tz' not in fieldnames:
+        return [], ["CSV must have a header row with 'study_pid' and 'tz' columns."]
+    reader.fieldnames = fieldnames
+
+    participants = []
+    errors = []
+    for line_num, row in enumerate(reader, start=2):
+        if len(participants) >= max_rows:
+            errors.append(f"CSV has more than the maximum of {max_rows} rows.")
+            break
+        study_pid = (row.get('study_pid') or '').strip()
+        tz = (row.get('tz') or '').strip()
+        if not study_pid:
+            errors.append(f"Line {line_num}: missing study_pid.")
+            continue
+        try:
+            get_zoneinfo(tz)
+        except Exception:
+            errors.append(f"Line {line_num}: invalid time zone '{tz}'.")
+            continue
+        participants.append({'study_pid': study_pid, 'tz': tz})
+
+    return participants, errors
+
+
+@enrollments_bp.route('/studies/<int:study_id>/enrollments/import', methods=['POST'])
+@jwt_required()
+def import_enrollments(study_id):
+    """
+    Bulk-enroll participants from an uploaded CSV of study_pid / tz rows.
+
+    Form Data:
+        file: The CSV file.
+        link_code_expiry_days (int): Days until the generated link codes expire
+            (default: TELEGRAM_LINK_CODE_EXPIRY_DAYS).
+
+    Returns:
+        A CSV download of study_pid, tz, telegram_link_code, link code expiry and status for each
+        participant; study_pids already enrolled keep their existing enrollment (status "existing"),
+        and those that already linked Telegram get no code (status "linked").
+    """
+    current_app.logger.debug(f"Entered import_enrollments route for study={study_id}.")
+
+    user = get_current_user()
+    if not user:
+        current_app.logger.warning("User not found while importing enrollments.")
+        return jsonify({"error": "User not found"}), 404
+
+    study = user_has_study_permission(user_id=user.id, study_id=study_id, minimum_role="editor")
+    if not study:
+        current_app.logger.warning(f"User={user.id} attempted to import enrollments into study={study_id} without permissions.")
+        return jsonify({"error": f"Study {study_id} not found or no access"}), 403
+
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({"error": "Missing CSV file in 'file' field"}), 400
+
+    expiry_days = request.form.get('link_code_expiry_days', str(current_app.config["TELEGRAM_LINK_CODE_EXPIRY_DAYS"]))
+    max_expiry_days = current_app.config["ENROLLMENT_IMPORT_MAX_LINK_CODE_EXPIRY_DAYS"]
+    try:
+        expiry_days = int(expiry_days)
+    except ValueError:
+        expiry_days = None
+    if expiry_days is None or not 1 <= expiry_days <= max_expiry_days:
+        return jsonify({"error": f"link_code_expiry_days must be a whole number from 1 to {max_expiry_days}"}), 400
+
+    participants, errors = parse_enrollment_import(upload, current_app.config["ENROLLMENT_IMPORT_MAX_ROWS"])
+    if errors:
+        current_app.logger.warning(f"User={user.email} uploaded an invalid enrollment CSV for study={study_id}: {errors[:5]}")
+        return jsonify({"error": "Invalid CSV", "details": errors[:50]}), 400
+    if not participants:
+        return jsonify({"error": "CSV contains no participants"}), 400
+
+    try:
+        expire_ts = datetime.now(timezone.utc) + timedelta(days=expiry_days)
+        rows = bulk_create_enrollments(db.session, study.id, participants, expire_ts)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error importing {len(participants)} enrollments into study={study_id}.")
+        current_app.logger.exception(e)
+        return jsonify({"error": "Internal server error"}), 500
+
+    n_created = sum(1 for row in rows if row['status'] == 'created')
+    current_app.logger.info(
+        f"User={user.email} imported {n_created} new enrollments into study={study_id} "
+        f"({len(rows) - n_created} study_pids were already enrolled)."
+    )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['study_pid', 'tz', 'telegram_link_code', 'telegram_link_code_expire_ts', 'status'])
+    for row in rows:
+        writer.writerow([
+            row['study_pid'],
+            row['tz'],
+            row['telegram_link_code'] or '',
+            row['telegram_link_code_expire_ts'].isoformat() if row['telegram_link_code_expire_ts'] else '',
+            row['status'],
+        ])
+
+    return Response(
+        buffer.getvalue(),
+        status=201,
+        mimetype='text/csv',
+        headers={"Content-Disposition": f"attachment; filename=study_{study.id}_link_codes.csv"}
+    )
+
+
 @enrollments_bp.route('/studies/<int:study_id>/enrollments/<int:enrollment_id>', methods=['GET'])
 @jwt_required()
 def get_single_enrollment_route(study_id, enrollment_id):
@@ -0,0 +1,96 @@
+# flask_app/blueprints/forwarder.py
+#
+# The ping click redirect lives in its own blueprint with no JWT, CORS or Celery dependencies
+# so it can be served both by the main app and by the standalone redirect_app.
+
+from flask import Blueprint, request, jsonify, current_app, redirect
+from sqlalchemy.orm import joinedload
+from extensions import db
+from datetime import datetime, timezone
+from models import Ping
+from message_constructor import MessageConstructor, cache_survey_urls, get_cached_survey_url
+from click_recorder import record_click
+from metrics import CLICKS
+from query_budget import query_budget
+
+forwarder_bp = Blueprint('forwarder', __name__)
+
+
+@forwarder_bp.route('/ping/<ping_id>', methods=['GET'])
+@query_budget(1)  # cache hits run none; the synchronous click fallback (Redis down) has its own budget
+def ping_forwarder(ping_id):
+    """
+    Forward a ping to the appropriate URL.
+    :param ping_id: The ID of the ping to forward.
+    """
+    # Log the start of the request
+    current_app.logger.info(f"Received request to forward ping, ping_id={ping_id}.")
+
+    # Link preview bots (BOT_USER_AGENTS) and per-IP request rates are rejected by
+    # rate_limit.enforce_rate_limits before this runs
+
+    # Get query variable: code
+    code = request.args.get('code')
+
+    # Fast path: the survey URL was rendered and cached when the ping was sent. Entries
+    # expire with the ping, so an expired ping always takes the database path below
+    survey_url = get_cached_survey_url(ping_id, code) if code else None
+    if survey_url:
+        try:
+            record_click(int(ping_id))
+        except Exception as e:
+            current_app.logger.error(f"Failed to record click for ping {ping_id}.")
+            current_app.logger.exception(e)
+            return jsonify({"error": "Internal server error."}), 500
+        CLICKS.labels("cache").inc()
+        current_app.logger.debug(f"Redirecting ping_id={ping_id} to cached survey URL: {survey_url}")
+        return redirect(survey_url, code=307)
+
+    # Get the ping, with what the survey URL is built from
+    ping = db.session.get(
+        Ping, ping_id,
+        options=[joinedload(Ping.enrollment), joinedload(Ping.study), joinedload(Ping.ping_template)],
+    )
+
+    # Check if the ping exists (session.get does not filter soft-deleted rows)
+    if not ping or ping.deleted_at is not None:
+        CLICKS.labels("not_found").inc()
+        current_app.logger.error(f"Failed to find ping with ID {ping_id}.")
+        return jsonify({"error": "Ping not found."}), 404
+
+    # Check if code is present and matches the ping's code
+    if not code or code != ping.forwarding_code:
+        CLICKS.labels("invalid_code").inc()
+        current_app.logger.error(f"Invalid forwarding code: {code}.")
+        return jsonify({"error": "Invalid code."}), 400
+
+    # Read everything needed from the ping before recording the click: the synchronous
+    # fallback commits, which expires the ping and would reload it within the query budget
+    ping_id = ping.id
+    expired = ping.expire_ts is not None and ping.expire_ts < datetime.now(timezone.utc)
+    if not expired:
+        # Cache the URL for later clicks
+        survey_url = cache_survey_urls([ping]).get(ping_id)
+        if survey_url is None:
+            survey_url = MessageConstructor(ping).construct_survey_url()
+
+    # Queue the click; flush_click_stream_task writes click timestamps, study stats
+    # and pr_completed to the database in batches
+    try:
+        record_click(ping_id)
+    except Exception as e:
+        current_app.logger.error(f"Failed to record click for ping {ping_id}.")
+        current_app.logger.exception(e)
+        return jsonify({"error": "Internal server error."}), 500
+
+    # Return the expiry message if expired
+    if expired:
+        CLICKS.labels("expired").inc()
+        current_app.logger.info(f"Ping {ping_id} has expired.")
+        return current_app.config["PING_EXPIRED_MESSAGE"], 200
+
+    # Redirect to survey
+    CLICKS.labels("database").inc()
+    current_app.logger.debug(f"Redirecting ping_id={ping_id} to survey URL: {survey_url}")
+
+    return redirect(survey_url, code=307)
@@ -6,98 +6,22 @@ from permissions import user_has_study_permission, get_current_user
 from random import randint
 from datetime import timedelta, datetime, timezone
 from zoneinfo import ZoneInfo
-from utils import generate_non_confusable_code
+from utils import generate_non_confusable_code, is_valid_timezone
 from message_constructor import MessageConstructor
-from crud import get_enrollments_by_telegram_id, get_study_by_id, get_pings_by_enrollment_id
+from crud import (
+    get_enrollments_by_telegram_id, 
+    get_study_by_id, 
+    get_pings_by_enrollment_id,
+    change_enrollment_timezone,
+    get_participant_dashboard,
+    upsert_enrollment_with_link_code,
+)
+from cache import get_cached_json, invalidate_after_commit, participant_dashboard_cache_key
 from telegram_messenger import TelegramMessenger
 
 particpant_facing_bp = Blueprint('particpant_facing', __name__)
 
 
-@particpant_facing_bp.route('/ping/<ping_id>', methods=['GET'])
-def ping_forwarder(ping_id):
-    """
-    Forward a ping to the appropriate URL.
-    :param ping_id: The ID of the ping to forward.
-    """
-    # Log the start of the request
-    current_app.logger.info(f"Received request to forward ping, ping_id={ping_id}.")
-
-    # Check if the user agent is a bot
-    # (removing this for now because i disabled previews and i'm not sure if this will break filling out surveys in within app telegram browser)
-    # user_agent = request.headers.get('User-Agent')
-    # if user_agent and any(bot_string in user_agent for bot_string in current_app.config["BOT_USER_AGENTS"]):
-    #     return 
-
-    # Get the ping
-    ping = Ping.query.get(ping_id)
-
-    # Check if the ping exists
-    if not ping:
-        current_app.logger.error(f"Failed to find ping with ID {ping_id}.")
-        return jsonify({"error": "Ping not found."}), 404
-
-    # Get query variable: code
-    code = request.args.get('code')
-
-    # Check if code is present and matches the ping's code
-    if not code or code != ping.forwarding_code:
-        current_app.logger.error(f"Invalid forwarding code: {code}.")
-        return jsonify({"error": "Invalid code."}), 400
-
-    # Update the ping with click timestamps
-    ping_already_clicked = False
-    try:
-        # First clicked timestamp
-        if not hasattr(ping, 'first_clicked_ts') or not ping.first_clicked_ts:
-            ping.first_clicked_ts = datetime.now(timezone.utc)
-        else:
-            ping_already_clicked = True
-
-        # Last clicked timestamp
-        ping.last_clicked_ts = datetime.now(timezone.utc)
-
-        # Commit changes
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"Failed to update ping {ping.id} with click timestamps.")
-        current_app.logger.exception(e)
-        return jsonify({"error": "Internal server error."}), 500
-
-    # If ping is already clicked, return message
-    # if ping_already_clicked:
-    #     current_app.logger.info(f"Ping {ping.id} has already been clicked.")
-    #     return current_app.config["PING_ALREADY_CLICKED_MESSAGE"], 200
-    
-    # Check if expired and return message if so
-    if hasattr(ping, 'expiry_ts') and ping.expiry_ts < datetime.now(timezone.utc):
-        current_app.logger.info(f"Ping {ping.id} has expired.")
-        return current_app.config["PING_EXPIRED_MESSAGE"], 200
-    
-    # Recompute probability completed
-    try:
-        all_pings = get_pings_by_enrollment_id(db.session, ping.enrollment_id)
-        already_sent_pings = [p for p in all_pings if p.sent_ts is not None]
-        completed_sent_pings = [p for p in already_sent_pings if p.first_clicked_ts is not None]
-        pr_completed = len(completed_sent_pings) / len(already_sent_pings) if len(already_sent_pings) > 0 else 0.0
-        ping.enrollment.pr_completed = pr_completed
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"Failed to update enrollment {ping.enrollment_id} with pr_completed.")
-        current_app.logger.exception(e)
-        return jsonify({"error": "Internal server error."}), 500
-    
-
-    # Redirect to survey
-    message_constructor = MessageConstructor(ping)
-    survey_url = message_constructor.construct_survey_url()
-    current_app.logger.debug(f"Redirecting ping_id={ping_id} to survey URL: {survey_url}")
-
-    return redirect(survey_url, code=307)
-
-
 @particpant_facing_bp.route('/signup', methods=['POST'])
 def study_signup():
     '''
@@ -122,27 +46,18 @@ def study_signup():
     if not study:
         return jsonify({"error": "Invalid signup code"}), 404
 
-    # Generate a unique code for the participant to link their telegram ID
-    telegram_link_code = None
-    while True:
-        telegram_link_code = generate_non_confusable_code(length=6, lowercase=True, uppercase=False, digits=True)
-        if not Enrollment.query.filter_by(telegram_link_code=telegram_link_code).first():
-            break
-
-    # Create a new enrollment
+    # Enroll with a unique code for the participant to link their telegram ID;
+    # a retried signup for the same study_pid gets its existing enrollment back
     try:
         utc_now = datetime.now(timezone.utc)
-        enrollment = Enrollment(
+        enrollment = upsert_enrollment_with_link_code(
+            db.session,
             study_id=study.id,
             tz=tz,
-            enrolled=False,  # This will be set to True once the telegram ID is linked
             study_pid=study_pid,
             signup_ts=utc_now,
-            pr_completed=0.0,
-            telegram_link_code=telegram_link_code,
-            telegram_link_code_expire_ts=utc_now + timedelta(days=current_app.config["TELEGRAM_LINK_CODE_EXPIRY_DAYS"])
+            link_code_expire_ts=utc_now + timedelta(days=current_app.config["TELEGRAM_LINK_CODE_EXPIRY_DAYS"]),
         )
-        db.session.add(enrollment)
         db.session.commit()
 
     except Exception as e:
@@ -153,9 +68,15 @@ def study_signup():
         current_app.logger.exception(e)
         return jsonify({"error": "Internal server error"}), 500
 
+    if not enrollment.inserted:
+        if enrollment.telegram_link_code_used:
+            current_app.logger.warning(f"study_pid={study_pid} is already enrolled and linked in study={study.id}.")
+            return jsonify({"error": "This participant ID is already enrolled in the study"}), 409
+        current_app.logger.info(f"Returning existing enrollment={enrollment.id} for study_pid={study_pid} in study={study.id}.")
+
     return jsonify({
         "message": "Participant enrolled successfully",
-        "telegram_link_code": telegram_link_code,
+        "telegram_link_code": enrollment.telegram_link_code,
         "participant_id": enrollment.id,
         "study_id": study.id,
         "study_pid": study_pid,
@@ -166,47 +87,90 @@ def study_signup():
 @particpant_facing_bp.route('/participant_dashboard', methods=['GET'])
 def api_participant_dashboard():
     '''
-    This endpoint is used to provide data to render the participant dashboard.
+    This endpoint is used to provide data to render the participant dashboard:
+    each enrollment unlocked by the OTP with its study, compliance and recent pings.
+    Built by one query and cached briefly per OTP.
     '''
 
     current_app.logger.debug("Entered participant_dashboard endpoint.")
-    study_keys_to_return = ['public_name', 'contact_message']
-    enrollment_keys_to_return = ['study_pid', 'tz', 'study_id', 'enrolled', 'signup_ts']
 
     telegram_id = request.args.get('t')
     otp = request.args.get('otp')
+    if not all([telegram_id, otp]):
+        return jsonify({"error": "Missing required fields: t, otp"}), 400
+
+    def load_dashboard():
+        enrollments = get_participant_dashboard(
+            db.session,
+            telegram_id,
+            otp,
+            n_recent_pings=current_app.config["PARTICIPANT_DASHBOARD_RECENT_PINGS"],
+        )
+        if not enrollments:
+            return None  # invalid OTP: not cached
+        otp_expires_at = min(en.pop('dashboard_otp_expire_ts') for en in enrollments)
+        for en in enrollments:
+            en['compliance'] = round(en['n_completed'] / en['n_sent'], 3) if en['n_sent'] else None
+        return {"otp_expires_at": otp_expires_at.timestamp(), "enrollments": enrollments}
+
+    dashboard = get_cached_json(
+        participant_dashboard_cache_key(telegram_id, otp),
+        load_dashboard,
+        current_app.config["PARTICIPANT_DASHBOARD_CACHE_TTL_SECONDS"],
+    )
+    if not dashboard or dashboard["otp_expires_at"] <= datetime.now(timezone.utc).timestamp():
+        current_app.logger.warning(f"Invalid or expired dashboard OTP for telegram_id={telegram_id}.")
+        return jsonify({"error": "Invalid OTP"}), 400
+
+    return jsonify(dashboard["enrollments"]), 200
+
+
+@particpant_facing_bp.route('/participant_timezone', methods=['PUT'])
+def api_participant_timezone():
+    '''
+    This endpoint lets a participant change their time zone from the dashboard.
+    Authenticated with the same one-time login link as the dashboard (t and otp).
+    Upcoming pings keep their local wall-clock time in the new zone.
+    '''
+    current_app.logger.debug("Entered participant_timezone endpoint.")
+
+    data = request.get_json()
+    telegram_id = data.get('t')
+    otp = data.get('otp')
+    tz = (data.get('tz') or '').strip()
+
+    if not all([telegram_id, otp]):
+        return jsonify({"error": "Missing required fields: t, otp"}), 400
+
+    if not is_valid_timezone(tz):
+        return jsonify({"error": "Invalid time zone"}), 400
 
-    # Check if OTP is valid and get the enrollment objects
     enrollments = get_enrollments_by_telegram_id(db.session, telegram_id)
-    current_app.logger.debug(f"{len(enrollments)} enrollments found for telegram_id={telegram_id} with OTP={otp}")
     if not enrollments:
-        current_app.logger.error(
-            f"Participant not found for telegram_id={telegram_id} with OTP={otp}"
-        )
+        current_app.logger.error(f"Participant not found for telegram_id={telegram_id} when changing time zone.")
         return jsonify({"error": "Participant not found"}), 404
 
-    valid_enrollments = []
-    for enrollment in enrollments:
-        if enrollment.dashboard_otp == otp and enrollment.dashboard_otp_expire_ts > datetime.now(timezone.utc):
-            en = {k: v for k, v in enrollment.to_dict().items() if k in enrollment_keys_to_return}
-            current_app.logger.debug(f"Valid enrollment found: {en}")
-            study_object = get_study_by_id(db.session, en['study_id'])
-            if not study_object:  # can probably be removed after having implemented cascading deletes
-                current_app.logger.warning(f"Study not found for study_id={en['study_id']}")
-                continue
-            study = study_object.to_dict()
-            for k, v in study.items():
-                if k in study_keys_to_return:
-                    en[k] = v
-            signup_date = datetime.fromisoformat(en['signup_ts'])
-            signup_date = signup_date.astimezone(ZoneInfo(en['tz']))
-            en['signup_ts'] = signup_date.strftime("%Y-%m-%d")
-            valid_enrollments.append(en)
-
+    now = datetime.now(timezone.utc)
+    valid_enrollments = [
+        e for e in enrollments
+        if e.dashboard_otp == otp and e.dashboard_otp_expire_ts and e.dashboard_otp_expire_ts > now
+    ]
     if not valid_enrollments:
         return jsonify({"error": "Invalid OTP"}), 400
 
-    return jsonify(valid_enrollments), 200
-
+    try:
+        n_pings = 0
+        for enrollment in valid_enrollments:
+            n_pings += change_enrollment_timezone(db.session, enrollment, tz, now=now)
+        invalidate_after_commit(db.session, participant_dashboard_cache_key(telegram_id, otp))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error changing time zone to {tz} for telegram_id={telegram_id}.")
+        current_app.logger.exception(e)
+        return jsonify({"error": "Internal server error"}), 500
 
-    
\ No newline at end of file
+    current_app.logger.info(
+        f"Participant telegram_id={telegram_id} changed time zone to {tz}; {n_pings} upcoming pings shifted."
+    )
+    return jsonify({"message": "Time zone updated", "tz": tz, "pings_updated": n_pings}), 200
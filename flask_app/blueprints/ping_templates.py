@@ -8,7 +8,8 @@ from crud import (
     create_ping_template,
     get_ping_template_by_id,
     update_ping_template,
-    soft_delete_ping_template
+    soft_delete_ping_template,
+    preview_ping_reschedule,
 )
 from utils import paginate_statement
 from models import PingTemplate
@@ -218,6 +219,8 @@ def update_ping_template_route(study_id, template_id):
         return jsonify({"error": f"No access to study={study_id}"}), 403
 
     data = request.get_json()
+    reschedule = bool(data.pop('reschedule', False))
+    dry_run = bool(data.pop('dry_run', False))
 
     try:
         updated_ping_template = update_ping_template(db.session, template_id, **data)
@@ -227,14 +230,28 @@ def update_ping_template_route(study_id, template_id):
             )
             return jsonify({"error": f"Ping template={template_id} not found"}), 404
 
+        if dry_run:
+            # Preview how the proposed edit would move upcoming pings, then discard it
+            db.session.flush()
+            preview = preview_ping_reschedule(db.session, template_id)
+            db.session.rollback()
+            return jsonify({"dry_run": True, "reschedule": preview}), 200
+
         db.session.commit()
         current_app.logger.info(
             f"User={user.id} updated ping template={template_id} for study={study_id}."
         )
-        return jsonify({
+        response = {
             "message": "Ping Template updated successfully",
             "ping_template": updated_ping_template.to_dict()
-        }), 200
+        }
+        if reschedule:
+            task = enqueue_reschedule(template_id)
+            response["reschedule_task_id"] = task.id
+            current_app.logger.info(
+                f"User={user.id} queued reschedule task={task.id} for ping template={template_id}."
+            )
+        return jsonify(response), 200
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error updating ping template ID={template_id} for study_id={study_id}.")
@@ -242,6 +259,67 @@ def update_ping_template_route(study_id, template_id):
         return jsonify({"error": "Internal server error"}), 500
 
 
+def enqueue_reschedule(template_id):
+    """
+    Queue tasks.reschedule_ping_template_task by name (importing tasks here would be circular).
+    """
+    return current_app.celery.send_task(
+        "tasks.reschedule_ping_template_task",
+        args=[template_id]
+    )
+
+
+@ping_templates_bp.route('/studies/<int:study_id>/ping_templates/<int:template_id>/reschedule', methods=['POST'])
+@jwt_required()
+def reschedule_ping_template_route(study_id, template_id):
+    """
+    Move the unsent, upcoming pings of a ping template onto its saved schedule and latencies.
+
+    JSON Body:
+        dry_run (bool): If true (default), return the counts and a sample diff without changing anything.
+
+    Returns:
+        200 with the dry-run diff, or 202 with the ID of the background reschedule task.
+    """
+    current_app.logger.debug(
+        f"Entered reschedule_ping_template route for study_id={study_id}, template_id={template_id}."
+    )
+
+    user = get_current_user()
+    if not user:
+        current_app.logger.warning("User not found while attempting to reschedule ping template.")
+        return jsonify({"error": "User not found"}), 404
+
+    study = user_has_study_permission(user.id, study_id, minimum_role="editor")
+    if not study:
+        current_app.logger.warning(
+            f"User={user.id} lacks 'editor' permission for study_id={study_id}."
+        )
+        return jsonify({"error": f"No access to study={study_id}"}), 403
+
+    ping_template = get_ping_template_by_id(db.session, template_id)
+    if not ping_template or ping_template.study_id != study_id:
+        return jsonify({"error": f"Ping template={template_id} not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    dry_run = bool(data.get('dry_run', True))
+
+    try:
+        if dry_run:
+            preview = preview_ping_reschedule(db.session, template_id)
+            return jsonify({"dry_run": True, "reschedule": preview}), 200
+
+        task = enqueue_reschedule(template_id)
+        current_app.logger.info(
+            f"User={user.id} queued reschedule task={task.id} for ping template={template_id}."
+        )
+        return jsonify({"message": "Reschedule queued", "task_id": task.id}), 202
+    except Exception as e:
+        current_app.logger.error(f"Error rescheduling ping template ID={template_id} for study_id={study_id}.")
+        current_app.logger.exception(e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
 @ping_templates_bp.route('/studies/<int:study_id>/ping_templates/<int:template_id>', methods=['DELETE'])
 @jwt_required()
 def delete_ping_template_route(study_id, template_id):
@@ -1,8 +1,11 @@
-from flask import Blueprint, request, jsonify, current_app
+import os
+import uuid
+from flask import Blueprint, request, jsonify, current_app, send_from_directory, url_for
 from flask_jwt_extended import jwt_required
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from sqlalchemy import select
+from sqlalchemy.orm import contains_eager
 
 from extensions import db
 from crud import (
@@ -10,10 +13,19 @@ from crud import (
     create_ping,
     update_ping,
     soft_delete_ping,
-    get_enrollment_by_id,
 )
+from query_budget import query_budget
 from permissions import get_current_user, user_has_study_permission
 from utils import convert_dt_to_local, paginate_statement
+from exports import (
+    PING_EXPORT_COLUMNS,
+    ping_export_statement,
+    format_ping_row,
+    iter_csv,
+    csv_response,
+    COLUMNAR_EXPORT_FORMATS,
+    export_dir_for_study,
+)
 from models import Ping, PingTemplate, Enrollment
 
 pings_bp = Blueprint('pings', __name__)
@@ -25,9 +37,10 @@ def prepare_requested_ping(ping):
     """
     ping_dict = ping.to_dict()
 
-    enrollment = get_enrollment_by_id(db.session, ping.enrollment_id)
+    # Enrollment and template are loaded with the ping by get_pings
+    enrollment = ping.enrollment
 
-    if enrollment:
+    if enrollment and enrollment.deleted_at is None:
         # Add the participant's time zone
         participant_tz = enrollment.tz
         local_ts = convert_dt_to_local(ping.scheduled_ts, participant_tz).strftime("%Y-%m-%d %H:%M:%S %Z")
@@ -47,6 +60,7 @@ def prepare_requested_ping(ping):
     return ping_dict
 
 @pings_bp.route('/studies/<int:study_id>/pings', methods=['GET'])
+@query_budget(5)
 @jwt_required()
 def get_pings(study_id):
     current_app.logger.debug(f"Entered get_pings route for study={study_id}.")
@@ -76,6 +90,7 @@ def get_pings(study_id):
         stmt = (select(Ping)
                 .join(Enrollment, Ping.enrollment_id == Enrollment.id)
                 .join(PingTemplate, Ping.ping_template_id == PingTemplate.id)
+                .options(contains_eager(Ping.enrollment), contains_eager(Ping.ping_template))
                 .where(
                     Ping.study_id == study.id,
                     Ping.deleted_at.is_(None)
@@ -120,6 +135,156 @@ def get_pings(study_id):
         return jsonify({"error": "Internal server error"}), 500
 
 
+@pings_bp.route('/studies/<int:study_id>/pings/export', methods=['GET'])
+@jwt_required()
+def export_pings(study_id):
+    """
+    Stream all pings of a study as CSV, with timestamps localised to each participant's time zone.
+    Columnar exports are written to the export store, so they are created with POST instead.
+    """
+    current_app.logger.debug(f"Entered export_pings route for study={study_id}.")
+    user = get_current_user()
+    if not user:
+        current_app.logger.warning("User not found while exporting pings.")
+        return jsonify({"error": "User not found"}), 404
+
+    study = user_has_study_permission(user_id=user.id, study_id=study_id, minimum_role="viewer")
+    if not study:
+        return jsonify({"error": f"No access to study {study_id}"}), 403
+
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format in COLUMNAR_EXPORT_FORMATS:
+        return jsonify({"error": f"Create {export_format} exports with POST to this URL."}), 405
+    if export_format != 'csv':
+        return jsonify({"error": f"Unsupported export format: {export_format}"}), 400
+
+    current_app.logger.info(f"User={user.email} started csv ping export for study={study_id}.")
+    chunks = iter_csv(
+        db.session,
+        ping_export_statement(study.id),
+        header=PING_EXPORT_COLUMNS,
+        format_row=format_ping_row
+    )
+    return csv_response(chunks, filename=f"study_{study.id}_pings.csv")
+
+
+def enqueue_ping_export(study_id, export_format, export_id):
+    """
+    Queue tasks.write_ping_export_task by name (importing tasks here would be circular).
+    The export ID doubles as the task ID, so its status can be looked up from the result backend.
+    """
+    return current_app.celery.send_task(
+        "tasks.write_ping_export_task",
+        args=[study_id, export_format, export_id],
+        task_id=export_id,
+    )
+
+
+@pings_bp.route('/studies/<int:study_id>/pings/export', methods=['POST'])
+@jwt_required()
+def create_ping_export(study_id):
+    """
+    Queue a columnar export of all pings of a study to the export store.
+    Files are removed by prune_exports_task after EXPORT_RETENTION_HOURS.
+
+    Query Parameters:
+        format (str): 'parquet' (default) or 'arrow'.
+
+    Returns:
+        202 with the export ID and the URL to poll for its status and download URL.
+    """
+    current_app.logger.debug(f"Entered create_ping_export route for study={study_id}.")
+    user = get_current_user()
+    if not user:
+        current_app.logger.warning("User not found while exporting pings.")
+        return jsonify({"error": "User not found"}), 404
+
+    study = user_has_study_permission(user_id=user.id, study_id=study_id, minimum_role="viewer")
+    if not study:
+        return jsonify({"error": f"No access to study {study_id}"}), 403
+
+    export_format = request.args.get('format', 'parquet').lower()
+    if export_format not in COLUMNAR_EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported export format: {export_format}"}), 400
+
+    export_id = uuid.uuid4().hex
+    try:
+        enqueue_ping_export(study.id, export_format, export_id)
+    except Exception as e:
+        current_app.logger.error(f"Error queueing {export_format} export for study={study_id}.")
+        current_app.logger.exception(e)
+        return jsonify({"error": "Internal server error"}), 500
+
+    current_app.logger.info(
+        f"User={user.email} queued {export_format} ping export={export_id} for study={study_id}."
+    )
+    status_url = url_for('pings.get_ping_export', study_id=study.id, export_id=export_id)
+    response = jsonify({"export_id": export_id, "status": "pending", "status_url": status_url})
+    response.headers["Location"] = status_url
+    return response, 202
+
+
+@pings_bp.route('/studies/<int:study_id>/pings/export/<export_id>', methods=['GET'])
+@jwt_required()
+def get_ping_export(study_id, export_id):
+    """
+    Status of a queued columnar export: 'pending', 'failed', or 'ready' with its download URL.
+    """
+    current_app.logger.debug(f"Entered get_ping_export route for study={study_id}, export={export_id}.")
+    user = get_current_user()
+    if not user:
+        current_app.logger.warning("User not found while checking a ping export.")
+        return jsonify({"error": "User not found"}), 404
+
+    study = user_has_study_permission(user_id=user.id, study_id=study_id, minimum_role="viewer")
+    if not study:
+        return jsonify({"error": f"No access to study {study_id}"}), 403
+
+    result = current_app.celery.AsyncResult(export_id)
+    if result.state == "FAILURE":
+        return jsonify({"export_id": export_id, "status": "failed"}), 200
+    if result.state != "SUCCESS":
+        # Unknown IDs are also PENDING in Celery, and reveal nothing about other studies
+        return jsonify({"export_id": export_id, "status": "pending"}), 200
+
+    export = result.result
+    if export["study_id"] != study.id:
+        return jsonify({"error": f"Export {export_id} not found"}), 404
+
+    download_url = url_for('pings.download_export', study_id=study.id, filename=export["filename"])
+    response = jsonify({
+        "export_id": export_id,
+        "status": "ready",
+        "filename": export["filename"],
+        "n_rows": export["n_rows"],
+        "size_bytes": export["size_bytes"],
+        "download_url": download_url,
+    })
+    response.headers["Location"] = download_url
+    return response, 200
+
+
+@pings_bp.route('/studies/<int:study_id>/exports/<path:filename>', methods=['GET'])
+@jwt_required()
+def download_export(study_id, filename):
+    """
+    Download a previously written export file of a study.
+    """
+    current_app.logger.debug(f"Entered download_export route for study={study_id}, file={filename}.")
+    user = get_current_user()
+    if not user:
+        current_app.logger.warning("User not found while downloading an export.")
+        return jsonify({"error": "User not found"}), 404
+
+    study = user_has_study_permission(user_id=user.id, study_id=study_id, minimum_role="viewer")
+    if not study:
+        return jsonify({"error": f"No access to study {study_id}"}), 403
+
+    # send_from_directory rejects paths that escape the study's export directory
+    directory = os.path.abspath(export_dir_for_study(study.id))
+    return send_from_directory(directory, filename, as_attachment=True)
+
+
 @pings_bp.route('/studies/<int:study_id>/pings', methods=['POST'])
 @jwt_required()
 def create_ping_route(study_id):
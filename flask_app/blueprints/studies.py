@@ -3,7 +3,7 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import db
-from datetime import datetime, timezone
+from datetime import datetime, timezone, date
 
 from models import Study, UserStudy
 from utils import paginate_statement
@@ -26,8 +26,8 @@ from crud import (
     update_user_study_role,
     soft_delete_user_study,
     get_user_studies_for_study,
-    
-    
+    # stats
+    get_study_stats,
 )
 from permissions import get_current_user, user_has_study_permission
 from utils import generate_non_confusable_code  # custom code generator
@@ -232,7 +232,102 @@ def get_single_study_route(study_id):
         "internal_name": study.internal_name,
         "contact_message": study.contact_message,
         "code": study.code,
-        "role": user_role  
+        "role": user_role
+    }), 200
+
+
+def summarize_study_stats(sent, clicked, expired):
+    """
+    Build the counts dict returned by the stats endpoint.
+    """
+    return {
+        "sent": sent,
+        "clicked": clicked,
+        "expired": expired,
+        "compliance": clicked / sent if sent else None,
+    }
+
+
+@studies_bp.route('/studies/<int:study_id>/stats', methods=['GET'])
+@jwt_required()
+def get_study_stats_route(study_id):
+    """
+    Get sent / clicked / expired counts and compliance for a study, per ping template and per day.
+    Answered from the study_stats rollup, so the cost does not grow with the number of pings.
+
+    Query Parameters:
+        ping_template_id (int): Restrict to a single ping template.
+        start_day (str): First day to include (YYYY-MM-DD, UTC).
+        end_day (str): Last day to include (YYYY-MM-DD, UTC).
+
+    Returns:
+        JSON response with totals, per-template and per-day counts.
+    """
+    current_app.logger.debug(f"Entered get_study_stats route for study={study_id}.")
+
+    user = get_current_user()
+    if not user:
+        current_app.logger.warning("User not found while accessing study stats.")
+        return jsonify({"error": "User not found"}), 404
+
+    study = user_has_study_permission(user_id=user.id, study_id=study_id, minimum_role="viewer")
+    if not study:
+        current_app.logger.warning(
+            f"User {user.id} tried accessing stats for study {study_id} without permissions."
+        )
+        return jsonify({"error": f"Study {study_id} not found or no access"}), 404
+
+    ping_template_id = request.args.get('ping_template_id', None, type=int)
+    try:
+        start_day = request.args.get('start_day', None)
+        start_day = date.fromisoformat(start_day) if start_day else None
+        end_day = request.args.get('end_day', None)
+        end_day = date.fromisoformat(end_day) if end_day else None
+    except ValueError:
+        return jsonify({"error": "start_day and end_day must be formatted as YYYY-MM-DD"}), 400
+
+    try:
+        rows = get_study_stats(
+            db.session,
+            study_id=study.id,
+            ping_template_id=ping_template_id,
+            start_day=start_day,
+            end_day=end_day
+        )
+    except Exception as e:
+        current_app.logger.error(f"Error fetching stats for study={study_id}")
+        current_app.logger.exception(e)
+        return jsonify({"error": "Internal server error"}), 500
+
+    by_day = []
+    by_template = {}
+    totals = [0, 0, 0]
+    for stat, template_name in rows:
+        counts = (stat.sent_count, stat.clicked_count, stat.expired_count)
+        by_day.append({
+            "day": stat.day.isoformat(),
+            "ping_template_id": stat.ping_template_id,
+            "ping_template_name": template_name,
+            **summarize_study_stats(*counts)
+        })
+        template_totals = by_template.setdefault(stat.ping_template_id, [template_name, 0, 0, 0])
+        for i, count in enumerate(counts):
+            template_totals[i + 1] += count
+            totals[i] += count
+
+    current_app.logger.info(f"User={user.email} fetched stats for study {study_id}.")
+    return jsonify({
+        "study_id": study.id,
+        "totals": summarize_study_stats(*totals),
+        "by_template": [
+            {
+                "ping_template_id": template_id,
+                "ping_template_name": name,
+                **summarize_study_stats(sent, clicked, expired)
+            }
+            for template_id, (name, sent, clicked, expired) in by_template.items()
+        ],
+        "by_day": by_day,
     }), 200
 
 
@@ -368,7 +463,7 @@ def add_user_to_study_route(study_id):
         user_study_rel = get_user_study(session, user_to_add.id, study_id, include_deleted=True)
         if user_study_rel:
             # If the relation exists (even if soft-deleted), update the role and un-delete
-            user_study_rel.role = role
+            update_user_study_role(session, user_to_add.id, study_id, role)
             user_study_rel.deleted_at = None  # un-delete if it was soft-deleted
         else:
             # Create a new user_study link
@@ -5,8 +5,8 @@ from extensions import db, mail
 from datetime import datetime
 from crud import create_support_query
 from flask_mail import Message
-import requests
-import mailtrap as mt
+from recaptcha import verify_recaptcha
+from support_mailer import queue_support_email
 
 support_bp = Blueprint('support', __name__)
 
@@ -26,18 +26,7 @@ def submit_feedback():
         return jsonify({'error': 'reCAPTCHA token is required.'}), 400
 
     try:
-        # Verify reCAPTCHA with Google's API
-        recaptcha_response = requests.post(
-            'https://www.google.com/recaptcha/api/siteverify',
-            data={
-                'secret': current_app.config['RECAPTCHA_SECRET_KEY'],  # Your reCAPTCHA secret key
-                'response': recaptcha_token
-            }
-        )
-        recaptcha_result = recaptcha_response.json()
-
-        if not recaptcha_result.get('success') or recaptcha_result.get('score', 0) < 0.5:
-            current_app.logger.warning(f"reCAPTCHA failed: {recaptcha_result}")
+        if not verify_recaptcha(recaptcha_token):
             return jsonify({'error': 'reCAPTCHA verification failed. Please try again.'}), 400
     except Exception as e:
         current_app.logger.error("Error verifying reCAPTCHA.")
@@ -63,40 +52,6 @@ def submit_feedback():
         'message': message,
     }]
     
-    # Send email to the support team
-    try:
-        subject = f"New '{query_type}' query from {email}"
-        body = f"From: {email}"
-        body += f"\n\n"
-        body += f"Query Type: {query_type}"
-        body += f"\n\n"
-        body += f"Is urgent: {is_urgent}"
-        body += f"\n\n"
-        body += f"Message: {message}"
-        if is_urgent:
-            subject = f"URGENT: {subject}"
-        # msg = Message(subject=subject, body=body, recipients=[current_app.config['MAIL_SUPPORT_RECIPIENT']])
-        # mail.send(msg)
-
-        mail = mt.Mail(
-            sender=mt.Address(email="support@emapingbot.com", name="Support request"),
-            to=[mt.Address(email=current_app.config['MAIL_SUPPORT_RECIPIENT'])],
-            subject=subject,
-            text=body,
-            category=query_type,
-        )
-
-        client = mt.MailtrapClient(token=current_app.config['MAILTRAP_API_TOKEN'])
-        response = client.send(mail)
-        current_app.logger.debug(f"Mailtrap response: {response}")
-    except Exception as e:
-        current_app.logger.error(f'Error sending email for user {user_id} - {email}.')
-        current_app.logger.exception(e)
-        # return jsonify({'error': 'An error occurred while sending the email.'}), 500
-    else:
-        current_app.logger.info(f"Email sent for user {user_id} - {email}.")
-        # return jsonify({'success': 'Email sent successfully.'}), 200
-
     # Save the feedback to the database
     try:
         support_query = create_support_query(
@@ -115,4 +70,7 @@ def submit_feedback():
         return jsonify({'error': 'An error occurred while saving feedback.'}), 500
     else:
         current_app.logger.info(f"Saved support request from user_id={user_id} - {email}.")
-        return jsonify({'message': 'Feedback submitted successfully.'}), 201
\ No newline at end of file
+
+    # Email the support team from Celery so a slow mail provider doesn't hold this worker
+    queue_support_email(support_query.id)
+    return jsonify({'message': 'Feedback submitted successfully.'}), 201
\ No newline at end of file
@@ -0,0 +1,96 @@
+# cache.py
+
+import hashlib
+import json
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import redis_client
+
+PENDING_INVALIDATIONS = "cache_invalidations"
+
+
+def study_roles_cache_key(user_id) -> str:
+    return f"study_roles:{user_id}"
+
+
+def contact_msgs_cache_key(telegram_id) -> str:
+    return f"contact_msgs:{telegram_id}"
+
+
+def survey_url_cache_key(ping_id, forwarding_code) -> str:
+    return f"survey_url:{ping_id}:{forwarding_code}"
+
+
+def participant_dashboard_cache_key(telegram_id, otp: str) -> str:
+    # The OTP is a credential, so only its hash goes into the key
+    return f"participant_dashboard:{telegram_id}:{hashlib.sha256(otp.encode()).hexdigest()}"
+
+
+def _request_cache() -> dict:
+    if "request_cache" not in g:
+        g.request_cache = {}
+    return g.request_cache
+
+
+def get_cached_json(key: str, loader, ttl: int):
+    """
+    Return the value for `key` from the request-local cache, then Redis, then `loader()`.
+    Values must be JSON-serialisable; a loader result of None is returned but not stored in Redis.
+    Redis errors fall through to the loader.
+    """
+    local = _request_cache()
+    if key in local:
+        return local[key]
+
+    value = None
+    try:
+        raw = redis_client.get(key)
+        if raw is not None:
+            value = json.loads(raw)
+    except Exception as e:
+        current_app.logger.warning(f"Cache read failed for {key}: {e}")
+
+    if value is None:
+        value = loader()
+        if value is not None:  # loaders return None for results that should not be cached
+            try:
+                redis_client.set(key, json.dumps(value), ex=ttl)
+            except Exception as e:
+                current_app.logger.warning(f"Cache write failed for {key}: {e}")
+
+    local[key] = value
+    return value
+
+
+def invalidate_after_commit(session: Session, *keys: str) -> None:
+    """
+    Delete cache keys once the session's current transaction commits.
+    Deleting before the commit would let a concurrent request re-cache the old rows;
+    on rollback the keys are left alone.
+    """
+    session.info.setdefault(PENDING_INVALIDATIONS, set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _delete_invalidated_keys(session):
+    keys = session.info.pop(PENDING_INVALIDATIONS, None)
+    if not keys:
+        return
+    if has_app_context():
+        local = g.get("request_cache")
+        if local:
+            for key in keys:
+                local.pop(key, None)
+    try:
+        redis_client.delete(*keys)
+    except Exception as e:
+        if has_app_context():
+            current_app.logger.error(f"Failed to invalidate cache keys {sorted(keys)}: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidated_keys(session):
+    session.info.pop(PENDING_INVALIDATIONS, None)
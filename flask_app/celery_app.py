@@ -1,12 +1,24 @@
 # celery_app.py
 
 from celery import Celery
+from celery.signals import worker_process_shutdown
 from app import create_app
 from celery_factory import make_celery
 from config import CurrentConfig
+from logger_setup import shutdown_logging
+from metrics import init_worker_metrics
 
 # Create the Flask app using the current configuration
 app = create_app(CurrentConfig)
 
 # Create and configure the Celery app
-celery = make_celery(app)
\ No newline at end of file
+celery = make_celery(app)
+
+# Expose the pool processes' metrics from the worker's main process
+init_worker_metrics(app)
+
+
+@worker_process_shutdown.connect(weak=False)
+def _flush_logs(**kwargs):
+    # Pool processes leave through os._exit, so atexit never flushes the log queue
+    shutdown_logging()
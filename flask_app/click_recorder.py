@@ -0,0 +1,138 @@
+# click_recorder.py
+
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from flask import current_app
+from redis.exceptions import ResponseError
+
+from extensions import db, redis_client
+from query_budget import query_budget, unbudgeted
+from crud import (
+    record_ping_clicks,
+    refresh_pr_completed,
+    increment_study_stats_for_pings,
+)
+
+CLICK_STREAM = "clicks:stream"
+CLICK_GROUP = "click-flushers"
+
+
+def record_click(ping_id: int, clicked_ts: datetime = None) -> bool:
+    """
+    Queue a ping click on the Redis stream so the redirect does not wait on Postgres.
+    If Redis is unavailable the click is written to the database synchronously instead.
+
+    Returns:
+        bool: True if the click was queued, False if it was written synchronously.
+    """
+    clicked_ts = clicked_ts or datetime.now(timezone.utc)
+    try:
+        redis_client.xadd(CLICK_STREAM, {"ping_id": ping_id, "ts": clicked_ts.isoformat()})
+        return True
+    except Exception as e:
+        current_app.logger.warning(f"Could not queue click for ping={ping_id}; writing it synchronously.")
+        current_app.logger.exception(e)
+
+    # The fallback is not what the callers' query budgets are sized for, so it gets its own:
+    # the pings select, the study stats upsert, and the pr_completed refresh with its flush
+    with unbudgeted(), query_budget(4, name="click_fallback"):
+        try:
+            apply_clicks(db.session, {ping_id: [clicked_ts]})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return False
+
+
+def apply_clicks(session, clicks) -> int:
+    """
+    Write a batch of clicks to their pings, count first clicks in the study stats and
+    refresh pr_completed of the affected enrollments (uncommitted).
+
+    Args:
+        session (Session): The database session.
+        clicks (Dict[int, List[datetime]]): Click timestamps keyed by ping ID.
+
+    Returns:
+        int: The number of pings clicked for the first time.
+    """
+    first_clicked = record_ping_clicks(session, clicks)
+    if first_clicked:
+        increment_study_stats_for_pings(session, first_clicked, "clicked")
+        session.flush()
+        refresh_pr_completed(session, {ping.enrollment_id for ping in first_clicked})
+    return len(first_clicked)
+
+
+def ensure_click_group():
+    try:
+        redis_client.xgroup_create(CLICK_STREAM, CLICK_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def parse_click_entries(entries):
+    """
+    Group stream entries into {ping_id: [clicked_ts, ...]}; malformed entries are logged and dropped.
+    """
+    clicks = defaultdict(list)
+    for entry_id, fields in entries:
+        try:
+            fields = {
+                (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                for k, v in fields.items()
+            }
+            clicks[int(fields["ping_id"])].append(datetime.fromisoformat(fields["ts"]))
+        except Exception:
+            current_app.logger.error(f"Dropping malformed click entry {entry_id}: {fields}")
+    return clicks
+
+
+def flush_clicks(consumer: str, batch_size: int, claim_idle_ms: int, max_batches: int = 20) -> int:
+    """
+    Drain the click stream into Postgres, one transaction per batch.
+
+    Entries are acknowledged and deleted only after their batch commits. Entries left pending
+    by a worker that died mid-batch are reclaimed once idle for `claim_idle_ms`.
+
+    Returns:
+        int: The number of click events flushed.
+    """
+    ensure_click_group()
+    session = db.session
+    n_events = 0
+
+    # Entries another consumer read but never acknowledged
+    _, claimed, *_ = redis_client.xautoclaim(
+        CLICK_STREAM, CLICK_GROUP, consumer, min_idle_time=claim_idle_ms, start_id="0-0", count=batch_size
+    )
+    batches = [claimed] if claimed else []
+
+    for _ in range(max_batches):
+        if not batches:
+            response = redis_client.xreadgroup(CLICK_GROUP, consumer, {CLICK_STREAM: ">"}, count=batch_size)
+            if not response:
+                break
+            batches.append(response[0][1])
+
+        entries = batches.pop()
+        if not entries:
+            break
+
+        try:
+            n_first = apply_clicks(session, parse_click_entries(entries))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+        entry_ids = [entry_id for entry_id, _ in entries]
+        redis_client.xack(CLICK_STREAM, CLICK_GROUP, *entry_ids)
+        redis_client.xdel(CLICK_STREAM, *entry_ids)
+        n_events += len(entries)
+        current_app.logger.debug(f"Flushed {len(entries)} clicks ({n_first} first clicks).")
+
+    return n_events
@@ -17,16 +17,45 @@ class BaseConfig:
     MAIL_USE_TLS = True
     MAIL_USE_SSL = False
     MAIL_SUPPORT_RECIPIENT = os.environ['MAIL_SUPPORT_RECIPIENT']
+    MAILTRAP_SEND_URL = os.getenv("MAILTRAP_SEND_URL", "https://send.api.mailtrap.io/api/send")
+    SUPPORT_EMAIL_BATCH_SIZE = 50
+    SUPPORT_EMAIL_RETRY_BACKOFF_SECONDS = 30
     
     JWT_SECRET_KEY= os.environ['JWT_SECRET_KEY']
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_BLACKLIST_ENABLED = True
     JWT_BLACKLIST_TOKEN_CHECKS = ["access", "refresh"]
+    JWT_BLOCKLIST_CACHE_TTL_SECONDS = 30  # upper bound on how long a logged-out token can still be accepted
+    JWT_BLOCKLIST_CACHE_SIZE = 10000
+    
+    # Password hashing (werkzeug method string; existing hashes are upgraded on next login)
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))  # concurrent hashes per process
+    PASSWORD_HASH_MAX_PENDING = 8  # hashes allowed to wait before answering 503
+    PASSWORD_HASH_TIMEOUT_SECONDS = 10
+    LOGIN_MAX_FAILURES_PER_IP = 50
+    LOGIN_MAX_FAILURES_PER_EMAIL_IP = 10  # per account from one IP, so others cannot lock the account out
+    LOGIN_FAILURE_WINDOW_SECONDS = 15 * 60
     
     TELEGRAM_SECRET_KEY = os.environ['TELEGRAM_SECRET_KEY']
     TELEGRAM_BOT_NAME = "SurveyPingBot"
     MY_TELEGRAM_ID = os.environ['MY_TELEGRAM_ID']
-    BOT_USER_AGENTS = ['TelegramBot']
+    # Link preview fetchers; rejected on USER_AGENT_BLOCKED_ENDPOINTS before any DB access
+    BOT_USER_AGENTS = [
+        'TelegramBot', 'Slackbot', 'facebookexternalhit', 'Twitterbot',
+        'WhatsApp', 'Discordbot', 'LinkedInBot', 'SkypeUriPreview',
+    ]
+    USER_AGENT_BLOCKED_ENDPOINTS = {'forwarder.ping_forwarder'}
+    
+    # Per-IP sliding-window limits for unauthenticated endpoints: [(max requests, window seconds), ...]
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMITS = {
+        'particpant_facing.study_signup': [(10, 60), (50, 3600)],
+        'forwarder.ping_forwarder': [(30, 60)],
+        'auth.login': [(20, 60), (200, 3600)],
+        'auth.register': [(5, 3600)],
+        'support.submit_feedback': [(5, 600)],
+    }
     
     REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
     REDIS_DB = 0
@@ -36,18 +65,58 @@ class BaseConfig:
     BOT_ACCOUNT_PASSWORD = os.environ['BOT_ACCOUNT_PASSWORD']
     
     SQLALCHEMY_DATABASE_URI = os.environ['SQLALCHEMY_DATABASE_URI']
-    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'options': '-csearch_path=public'}}
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'connect_args': {'options': '-csearch_path=public'},
+        # Size to the concurrency per process (threads, or greenlets under gevent)
+        'pool_size': int(os.getenv("DB_POOL_SIZE", 5)),
+        'max_overflow': int(os.getenv("DB_MAX_OVERFLOW", 10)),
+    }
+    # Opt-in per-request query counts/timings (Server-Timing header and log lines, see sql_profiler.py)
+    SQL_PROFILER_ENABLED = os.getenv("SQL_PROFILER_ENABLED", "0") == "1"
+    SQL_PROFILER_REPEAT_THRESHOLD = 5  # same statement this many times in one request is flagged as N+1
+    # Exceeding a @query_budget raises instead of warning (always on when app.testing)
+    QUERY_BUDGET_RAISE = os.getenv("QUERY_BUDGET_RAISE", "0") == "1"
     
     CELERY_BEAT_SCHEDULE = {
         'check_and_send_pings': {
             'task': 'tasks.check_and_send_pings',
             'schedule': crontab(minute='*/1'),  # Every minute
         },
+        'rollup_expired_pings': {
+            'task': 'tasks.rollup_expired_pings_task',
+            'schedule': crontab(minute='*/1'),  # Every minute
+        },
+        'flush_click_stream': {
+            'task': 'tasks.flush_click_stream_task',
+            'schedule': timedelta(seconds=5),
+        },
+        'flush_support_email_queue': {
+            'task': 'tasks.flush_support_email_queue_task',
+            'schedule': timedelta(seconds=10),
+        },
+        'prune_exports': {
+            'task': 'tasks.prune_exports_task',
+            'schedule': crontab(minute=0),  # Every hour
+        },
     }
+    CLICK_FLUSH_BATCH_SIZE = 500
+    CLICK_CLAIM_IDLE_MS = 60000  # reclaim clicks left unacknowledged by a dead worker after this long
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 9100))  # Celery worker's /metrics
 
     
+    EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+    EXPORT_RETENTION_HOURS = 24  # columnar export files are deleted after this long
+    
     TELEGRAM_LINK_CODE_EXPIRY_DAYS = 1
+    ENROLLMENT_IMPORT_MAX_ROWS = 100000
+    ENROLLMENT_IMPORT_MAX_LINK_CODE_EXPIRY_DAYS = 365
+    PING_RESCHEDULE_CHUNK_ENROLLMENTS = 500
     ENROLLMENT_DASHBOARD_OTP_EXPIRY_MINS = 60
+    PARTICIPANT_DASHBOARD_RECENT_PINGS = 20
+    PARTICIPANT_DASHBOARD_CACHE_TTL_SECONDS = 30
+    
+    STUDY_ROLES_CACHE_TTL_SECONDS = 300
+    CONTACT_MSGS_CACHE_TTL_SECONDS = 3600
     
     ROLE_PERMISSIONS = {
         "owner": {"share", "edit", "view"},
@@ -56,9 +125,19 @@ class BaseConfig:
     }
     
     PING_DEFAULT_URL_TEXT = "Click here to take the survey."
+    SURVEY_URL_CACHE_TTL = timedelta(days=7)  # how long the survey URL of a ping without an expiry stays cached
     PING_EXPIRED_MESSAGE = "This ping has expired. Please be sure to take the survey as soon as possible after receiving."
     PING_ALREADY_CLICKED_MESSAGE = "This ping link has already been clicked. Thank you for taking the survey!"
     RECAPTCHA_SECRET_KEY = os.environ['RECAPTCHA_SECRET_KEY']
+    
+    # Outbound HTTP (upstream URLs can point at a local stand-in for load tests)
+    TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+    RECAPTCHA_VERIFY_URL = os.getenv("RECAPTCHA_VERIFY_URL", "https://www.google.com/recaptcha/api/siteverify")
+    RECAPTCHA_MIN_SCORE = 0.5
+    RECAPTCHA_TOKEN_TTL_SECONDS = 120  # reCAPTCHA tokens are valid for two minutes; a used one is remembered this long
+    HTTP_POOL_SIZE = 20
+    HTTP_CONNECT_TIMEOUT = 3.05
+    HTTP_READ_TIMEOUT = 10
 
 class DevelopmentConfig(BaseConfig):
     
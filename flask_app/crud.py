@@ -1,12 +1,18 @@
 # crud.py
 
+import csv
+import io
 from typing import Optional, List, Any, Dict
-from sqlalchemy import select, func
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, text, update, cast, Float, literal_column, exists, bindparam, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timezone, timedelta
 from sqlalchemy.sql import or_, and_, not_
 from flask import current_app
 
+from utils import generate_non_confusable_code
+from cache import invalidate_after_commit, study_roles_cache_key, contact_msgs_cache_key, survey_url_cache_key
 from models import (
     User,
     Study,
@@ -14,7 +20,9 @@ from models import (
     Enrollment,
     Ping,
     PingTemplate,
-    Support
+    Support,
+    StudyStat,
+    StudyStatSweep
 )
 
 # ======================= Helper Functions =======================
@@ -34,6 +42,20 @@ def include_deleted_records(query, model, include_deleted: bool):
         query = query.where(model.deleted_at.is_(None))
     return query
 
+def invalidate_survey_urls(session: Session, pings) -> None:
+    """
+    Drop the cached survey URLs of the given pings once the session commits, so the
+    forwarder's fast path stops serving them.
+
+    Args:
+        session (Session): The database session.
+        pings: Pings, or (id, forwarding_code) rows.
+    """
+    keys = [survey_url_cache_key(ping.id, ping.forwarding_code) for ping in pings]
+    if keys:
+        invalidate_after_commit(session, *keys)
+
+
 # ======================= USERS =======================
 def get_user_by_id(
     session: Session, 
@@ -199,6 +221,7 @@ def soft_delete_user(session: Session, user_id: int) -> bool:
     for study in studies:
         user_study = get_user_study(session, user_id, study.id, include_deleted=True)
         user_study.deleted_at = datetime.now(timezone.utc)
+    invalidate_after_commit(session, study_roles_cache_key(user_id))
 
     return True
 
@@ -322,6 +345,8 @@ def update_study(
     for field in ["public_name", "internal_name", "contact_message"]:
         if field in kwargs:
             setattr(study, field, kwargs[field])
+    if "public_name" in kwargs or "contact_message" in kwargs:
+        invalidate_contact_msgs_for_study(session, study_id)
     return study
 
 
@@ -348,6 +373,9 @@ def soft_delete_study(
     if not study:
         return False
 
+    invalidate_contact_msgs_for_study(session, study_id)
+    invalidate_survey_urls(session, pings)
+    decrement_study_stats_for_deleted_pings(session, pings)
     study.deleted_at = datetime.now(timezone.utc)
     for enrollment in enrollments:
         enrollment.deleted_at = datetime.now(timezone.utc)
@@ -423,6 +451,7 @@ def add_user_study(
         role=role
     )
     session.add(user_study)
+    invalidate_after_commit(session, study_roles_cache_key(user_id))
     return user_study
 
 def get_user_studies_for_study(
@@ -535,6 +564,7 @@ def update_user_study_role(
         return None
 
     user_study.role = new_role
+    invalidate_after_commit(session, study_roles_cache_key(user_id))
     return user_study
 
 def soft_delete_user_study(
@@ -553,6 +583,7 @@ def soft_delete_user_study(
         return False
 
     user_study.deleted_at = datetime.now(timezone.utc)
+    invalidate_after_commit(session, study_roles_cache_key(user_id))
     return True
 
 
@@ -593,6 +624,296 @@ def create_enrollment(
     return enrollment
 
 
+def generate_link_code() -> str:
+    return generate_non_confusable_code(length=6, lowercase=True, uppercase=False, digits=True)
+
+
+def upsert_enrollment_with_link_code(
+    session: Session,
+    study_id: int,
+    tz: str,
+    study_pid: str,
+    signup_ts: datetime,
+    link_code_expire_ts: datetime,
+    max_attempts: int = 10
+):
+    """
+    Enroll a study_pid with a fresh telegram link code, or return its existing enrollment
+    (with the link code expiry extended), in one INSERT ... ON CONFLICT (study_id, study_pid)
+    statement (uncommitted).
+
+    Each attempt runs inside a savepoint; a telegram link code collision
+    (uq_enrollments_telegram_link_code) is retried with a new code.
+
+    Args:
+        session (Session): The database session.
+        study_id (int): The ID of the study.
+        tz (str): Timezone of the participant.
+        study_pid (str): Participant ID assigned by the study.
+        signup_ts (datetime): Signup timestamp.
+        link_code_expire_ts (datetime): When the link code expires.
+        max_attempts (int): How many codes to try before giving up.
+
+    Returns:
+        Row: id, tz, telegram_link_code, telegram_link_code_used and `inserted`
+        (False if the study_pid was already enrolled).
+    """
+    table = Enrollment.__table__
+    for _ in range(max_attempts):
+        stmt = pg_insert(table).values(
+            study_id=study_id,
+            tz=tz,
+            enrolled=False,  # set to True once the telegram ID is linked
+            study_pid=study_pid,
+            signup_ts=signup_ts,
+            pr_completed=0.0,
+            telegram_link_code=generate_link_code(),
+            telegram_link_code_expire_ts=link_code_expire_ts,
+            telegram_link_code_used=False,
+            dashboard_otp_used=False,
+            created_at=func.now(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.study_id, table.c.study_pid],
+            index_where=table.c.deleted_at.is_(None),
+            # Extend the existing code's expiry; the update also makes RETURNING yield the existing row
+            set_={"telegram_link_code_expire_ts": func.greatest(
+                table.c.telegram_link_code_expire_ts, stmt.excluded.telegram_link_code_expire_ts
+            )},
+        ).returning(
+            table.c.id,
+            table.c.tz,
+            table.c.telegram_link_code,
+            table.c.telegram_link_code_used,
+            literal_column("xmax = 0").label("inserted"),
+        )
+        try:
+            with session.begin_nested():
+                return session.execute(stmt).one()
+        except IntegrityError as e:
+            if "uq_enrollments_telegram_link_code" not in str(e.orig):
+                raise
+            current_app.logger.debug("Telegram link code collision, retrying with a new code.")
+    raise RuntimeError(f"Could not generate a unique telegram link code in {max_attempts} attempts.")
+
+
+def generate_unique_link_codes(
+    session: Session,
+    n: int,
+    chunk_size: int = 10000
+) -> List[str]:
+    """
+    Generate `n` telegram link codes that are unique among themselves and in the enrollments table.
+    Candidates are checked against the database in chunks rather than one SELECT per code.
+
+    Args:
+        session (Session): The database session.
+        n (int): The number of codes to generate.
+        chunk_size (int): The number of codes checked per query.
+
+    Returns:
+        List[str]: The unique codes.
+    """
+    codes = set()
+    while len(codes) < n:
+        candidates = set()
+        while len(candidates) < n - len(codes):
+            code = generate_link_code()
+            if code not in codes:
+                candidates.add(code)
+
+        candidate_list = list(candidates)
+        for i in range(0, len(candidate_list), chunk_size):
+            chunk = candidate_list[i:i + chunk_size]
+            stmt = select(Enrollment.telegram_link_code).where(Enrollment.telegram_link_code.in_(chunk))
+            candidates.difference_update(session.execute(stmt).scalars().all())
+        codes.update(candidates)
+
+    return list(codes)
+
+
+def bulk_create_enrollments(
+    session: Session,
+    study_id: int,
+    participants: List[Dict[str, str]],
+    link_code_expire_ts: datetime,
+    chunk_size: int = 10000,
+    max_attempts: int = 10
+) -> List[Dict[str, Any]]:
+    """
+    Enroll each participant with a fresh telegram link code, keeping the existing enrollment
+    of any study_pid already in the study (uncommitted), so re-running an import is safe and
+    creates no duplicates. On Postgres rows are COPYed into a temporary table and moved with
+    one INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING; rows that lost their link code
+    to a concurrent insert get new codes and are inserted again, like signup's retry. Other
+    dialects skip the study_pids already enrolled and insert the rest with one executemany.
+
+    Args:
+        session (Session): The database session.
+        study_id (int): The ID of the study.
+        participants (List[Dict[str, str]]): Rows with 'study_pid' and 'tz'.
+        link_code_expire_ts (datetime): Expiry of the generated link codes.
+        chunk_size (int): The number of study_pids looked up per query.
+        max_attempts (int): How many rounds of link code collisions to retry before giving up.
+
+    Returns:
+        List[Dict[str, Any]]: One row per distinct study_pid, in file order (study_pid, tz,
+        telegram_link_code, telegram_link_code_expire_ts, status). status is 'created',
+        'existing', or 'linked' for an existing enrollment whose code was already used; like
+        signup, a used code is not handed out again, so its telegram_link_code is None.
+    """
+    # First occurrence of each study_pid wins
+    first_rows = {}
+    for p in participants:
+        first_rows.setdefault(p["study_pid"], p)
+    participants = list(first_rows.values())
+    if not participants:
+        return []
+
+    now = datetime.now(timezone.utc)
+    codes = generate_unique_link_codes(session, len(participants))
+    connection = session.connection()
+
+    if connection.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for line_num, (p, code) in enumerate(zip(participants, codes)):
+            writer.writerow([line_num, p["study_pid"], p["tz"], code])
+        buffer.seek(0)
+
+        connection.execute(text(
+            "CREATE TEMP TABLE enrollment_import "
+            "(line_num int, study_pid text, tz text, telegram_link_code text)"
+        ))
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert("COPY enrollment_import FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+        # RETURNING yields only the rows actually inserted. A row is skipped either because its
+        # study_pid is already enrolled or because a concurrent insert took its link code
+        params = {"study_id": study_id, "now": now, "expire_ts": link_code_expire_ts}
+        created = set()
+        for _ in range(max_attempts):
+            result = connection.execute(text("""
+                INSERT INTO enrollments (
+                    study_id, tz, study_pid, enrolled, signup_ts, pr_completed,
+                    telegram_link_code, telegram_link_code_expire_ts, telegram_link_code_used,
+                    dashboard_otp_used, created_at
+                )
+                SELECT :study_id, i.tz, i.study_pid, false, :now, 0.0,
+                       i.telegram_link_code, :expire_ts, false, false, :now
+                FROM enrollment_import i
+                ORDER BY i.line_num
+                ON CONFLICT DO NOTHING
+                RETURNING study_pid
+            """), params)
+            created.update(result.scalars().all())
+
+            # What is left after removing the enrolled study_pids are link code collisions
+            connection.execute(text("""
+                DELETE FROM enrollment_import i
+                USING enrollments e
+                WHERE e.study_id = :study_id AND e.study_pid = i.study_pid AND e.deleted_at IS NULL
+            """), params)
+            collided = connection.execute(text("SELECT line_num FROM enrollment_import")).scalars().all()
+            if not collided:
+                break
+            current_app.logger.debug(f"{len(collided)} telegram link code collisions, retrying with new codes.")
+            connection.execute(
+                text("UPDATE enrollment_import SET telegram_link_code = :code WHERE line_num = :line_num"),
+                [
+                    {"code": code, "line_num": line_num}
+                    for line_num, code in zip(collided, generate_unique_link_codes(session, len(collided)))
+                ]
+            )
+        else:
+            raise RuntimeError(f"Could not generate unique telegram link codes in {max_attempts} attempts.")
+        connection.execute(text("DROP TABLE enrollment_import"))
+    else:
+        existing = set()
+        study_pids = [p["study_pid"] for p in participants]
+        for i in range(0, len(study_pids), chunk_size):
+            stmt = select(Enrollment.study_pid).where(
+                Enrollment.study_id == study_id,
+                Enrollment.study_pid.in_(study_pids[i:i + chunk_size]),
+                Enrollment.deleted_at.is_(None)
+            )
+            existing.update(session.execute(stmt).scalars().all())
+
+        rows = [
+            {
+                "study_id": study_id,
+                "tz": p["tz"],
+                "study_pid": p["study_pid"],
+                "enrolled": False,
+                "signup_ts": now,
+                "pr_completed": 0.0,
+                "telegram_link_code": code,
+                "telegram_link_code_expire_ts": link_code_expire_ts,
+                "telegram_link_code_used": False,
+                "dashboard_otp_used": False,
+                "created_at": now,
+            }
+            for p, code in zip(participants, codes)
+            if p["study_pid"] not in existing
+        ]
+        if rows:
+            session.execute(Enrollment.__table__.insert(), rows)
+        created = {row["study_pid"] for row in rows}
+
+    enrollments = {}
+    study_pids = [p["study_pid"] for p in participants]
+    for i in range(0, len(study_pids), chunk_size):
+        stmt = select(
+            Enrollment.study_pid,
+            Enrollment.tz,
+            Enrollment.telegram_link_code,
+            Enrollment.telegram_link_code_expire_ts,
+            Enrollment.telegram_link_code_used,
+        ).where(
+            Enrollment.study_id == study_id,
+            Enrollment.study_pid.in_(study_pids[i:i + chunk_size]),
+            Enrollment.deleted_at.is_(None)
+        )
+        for row in session.execute(stmt).mappings():
+            enrollments[row["study_pid"]] = row
+
+    output = []
+    for study_pid in study_pids:
+        row = enrollments[study_pid]
+        if study_pid in created:
+            status = "created"
+        elif row["telegram_link_code_used"]:
+            status = "linked"
+        else:
+            status = "existing"
+        output.append({
+            "study_pid": study_pid,
+            "tz": row["tz"],
+            "telegram_link_code": None if status == "linked" else row["telegram_link_code"],
+            "telegram_link_code_expire_ts": None if status == "linked" else row["telegram_link_code_expire_ts"],
+            "status": status,
+        })
+    return output
+
+
+def enrollment_has_pings(session: Session, enrollment_id: int) -> bool:
+    """
+    Check whether an enrollment already has (non-deleted) pings.
+
+    Args:
+        session (Session): The database session.
+        enrollment_id (int): The ID of the enrollment.
+
+    Returns:
+        bool: True if any pings exist.
+    """
+    stmt = select(exists().where(Ping.enrollment_id == enrollment_id, Ping.deleted_at.is_(None)))
+    return session.execute(stmt).scalar()
+
+
 def get_enrollment_by_id(
     session: Session, 
     enrollment_id: int,
@@ -669,6 +990,56 @@ def get_enrollments_by_telegram_id(
     return result.scalars().all()
 
 
+def get_contact_msgs_for_telegram_id(
+    session: Session,
+    telegram_id: int
+) -> List[Dict[str, Any]]:
+    """
+    Fetch the public name and contact message of every study a Telegram user is enrolled in,
+    in one joined query.
+
+    Args:
+        session (Session): The database session.
+        telegram_id (int): The participant's Telegram ID.
+
+    Returns:
+        List[Dict[str, Any]]: Dicts with study_id, public_name and contact_message, ordered by study.
+    """
+    stmt = (
+        select(Study.id, Study.public_name, Study.contact_message)
+        .join(Enrollment, Enrollment.study_id == Study.id)
+        .where(
+            Enrollment.telegram_id == str(telegram_id),
+            Enrollment.deleted_at.is_(None),
+            Study.deleted_at.is_(None),
+        )
+        .distinct()
+        .order_by(Study.id.asc())
+    )
+    return [
+        {"study_id": row.id, "public_name": row.public_name, "contact_message": row.contact_message}
+        for row in session.execute(stmt)
+    ]
+
+
+def invalidate_contact_msgs_for_study(session: Session, study_id: int) -> None:
+    """
+    Drop the cached contact messages of every participant in a study once the session commits.
+
+    Args:
+        session (Session): The database session.
+        study_id (int): The ID of the study whose name or contact message changed.
+    """
+    stmt = (
+        select(Enrollment.telegram_id)
+        .where(Enrollment.study_id == study_id, Enrollment.telegram_id.is_not(None))
+        .distinct()
+    )
+    keys = [contact_msgs_cache_key(telegram_id) for telegram_id in session.execute(stmt).scalars()]
+    if keys:
+        invalidate_after_commit(session, *keys)
+
+
 def get_enrollment_by_telegram_link_code(
     session: Session, 
     telegram_link_code: str,
@@ -714,6 +1085,12 @@ def update_enrollment(
     if not enrollment:
         return None
 
+    if "telegram_id" in kwargs:
+        invalidate_after_commit(
+            session,
+            contact_msgs_cache_key(enrollment.telegram_id),
+            contact_msgs_cache_key(kwargs["telegram_id"]),
+        )
     for field in ["telegram_id", "tz", "study_pid", "enrolled", "signup_ts", "pr_completed"]:
         if field in kwargs:
             setattr(enrollment, field, kwargs[field])
@@ -736,9 +1113,13 @@ def soft_delete_enrollment(session: Session, enrollment_id: int) -> bool:
     if not enrollment:
         return False
 
+    decrement_study_stats_for_deleted_pings(session, pings)
     enrollment.deleted_at = datetime.now(timezone.utc)
     for ping in pings:
         ping.deleted_at = datetime.now(timezone.utc)
+    invalidate_survey_urls(session, pings)
+    if enrollment.telegram_id:
+        invalidate_after_commit(session, contact_msgs_cache_key(enrollment.telegram_id))
         
     return True
 
@@ -853,6 +1234,16 @@ def update_ping_template(
     if not pt:
         return None
 
+    # The template's name and URL are rendered into the cached survey URLs of its live pings
+    if any(field in kwargs and kwargs[field] != getattr(pt, field) for field in ["name", "url"]):
+        stmt = select(Ping.id, Ping.forwarding_code).where(
+            Ping.ping_template_id == template_id,
+            Ping.sent_ts.is_not(None),
+            or_(Ping.expire_ts.is_(None), Ping.expire_ts > func.now()),
+            Ping.deleted_at.is_(None),
+        )
+        invalidate_survey_urls(session, session.execute(stmt).all())
+
     for field in ["name", "message", "url", "url_text", "reminder_latency", "expire_latency", "schedule"]:
         if field in kwargs:
             setattr(pt, field, kwargs[field])
@@ -878,10 +1269,12 @@ def soft_delete_ping_template(
     if not pt:
         return False
 
+    decrement_study_stats_for_deleted_pings(session, pings)
     pt.deleted_at = datetime.now(timezone.utc)
     
     for ping in pings:
         ping.deleted_at = datetime.now(timezone.utc)
+    invalidate_survey_urls(session, pings)
         
     return True
 
@@ -964,6 +1357,37 @@ def get_pings_to_send(
     return session.execute(stmt).scalars().all()
 
 
+def get_pings_for_dispatch(
+    session: Session,
+    ping_ids: List[int]
+) -> List[Ping]:
+    """
+    Fetch pings by ID together with their enrollment, study and ping template, so constructing
+    and sending their messages does not lazy-load those rows once per ping.
+
+    Args:
+        session (Session): The database session.
+        ping_ids (List[int]): The IDs of the pings.
+
+    Returns:
+        List[Ping]: The Ping objects, ordered by ID.
+    """
+    if not ping_ids:
+        return []
+
+    stmt = (
+        select(Ping)
+        .where(Ping.id.in_(ping_ids))
+        .options(
+            joinedload(Ping.enrollment),
+            joinedload(Ping.study),
+            joinedload(Ping.ping_template),
+        )
+        .order_by(Ping.id)
+    )
+    return session.execute(stmt).scalars().all()
+
+
 def get_pings_for_reminder(
     session: Session,
     now: datetime=datetime.now(timezone.utc)
@@ -1121,7 +1545,9 @@ def soft_delete_ping(
     if not ping:
         return False
 
+    decrement_study_stats_for_deleted_pings(session, [ping])
     ping.deleted_at = datetime.now(timezone.utc)
+    invalidate_survey_urls(session, [ping])
     return True
 
 
@@ -1149,11 +1575,770 @@ def soft_delete_all_pings_for_enrollment(
     pings = session.execute(stmt).scalars().all()
     if not pings:
         return True
+    decrement_study_stats_for_deleted_pings(session, pings)
     for ping in pings:
         ping.deleted_at = datetime.now(timezone.utc)
+    invalidate_survey_urls(session, pings)
     return True
 
 
+def record_ping_clicks(
+    session: Session,
+    clicks: Dict[int, List[datetime]]
+) -> List[Ping]:
+    """
+    Apply a batch of click events to their pings (uncommitted).
+    All pings are loaded and locked with one SELECT; first_clicked_ts is only set if empty and
+    last_clicked_ts only moves forward, so replaying a batch is harmless.
+
+    Args:
+        session (Session): The database session.
+        clicks (Dict[int, List[datetime]]): Click timestamps keyed by ping ID.
+
+    Returns:
+        List[Ping]: The pings clicked for the first time in this batch.
+    """
+    if not clicks:
+        return []
+
+    stmt = (
+        select(Ping)
+        .where(Ping.id.in_(list(clicks.keys())))
+        .order_by(Ping.id)
+        .with_for_update()
+    )
+    first_clicked = []
+    for ping in session.execute(stmt).scalars():
+        timestamps = clicks[ping.id]
+        earliest, latest = min(timestamps), max(timestamps)
+        if ping.first_clicked_ts is None:
+            ping.first_clicked_ts = earliest
+            first_clicked.append(ping)
+        if ping.last_clicked_ts is None or ping.last_clicked_ts < latest:
+            ping.last_clicked_ts = latest
+    return first_clicked
+
+
+def refresh_pr_completed(
+    session: Session,
+    enrollment_ids: List[int]
+) -> int:
+    """
+    Recompute pr_completed (clicked / sent pings) for a set of enrollments in one UPDATE (uncommitted).
+
+    Args:
+        session (Session): The database session.
+        enrollment_ids (List[int]): The enrollments to refresh.
+
+    Returns:
+        int: The number of enrollments updated.
+    """
+    if not enrollment_ids:
+        return 0
+
+    n_sent = func.count(Ping.sent_ts)
+    n_completed = func.count(Ping.first_clicked_ts).filter(Ping.sent_ts.isnot(None))
+    rates = (
+        select(
+            Ping.enrollment_id,
+            (cast(n_completed, Float) / func.nullif(n_sent, 0)).label("pr_completed"),
+        )
+        .where(
+            Ping.enrollment_id.in_(list(enrollment_ids)),
+            Ping.deleted_at.is_(None),
+        )
+        .group_by(Ping.enrollment_id)
+        .subquery()
+    )
+    stmt = (
+        update(Enrollment)
+        .where(Enrollment.id == rates.c.enrollment_id)
+        .values(pr_completed=func.coalesce(rates.c.pr_completed, 0.0))
+        .execution_options(synchronize_session=False)
+    )
+    return session.execute(stmt).rowcount
+
+
+def change_enrollment_timezone(
+    session: Session,
+    enrollment: Enrollment,
+    new_tz: str,
+    now: Optional[datetime] = None
+) -> int:
+    """
+    Move an enrollment to a new time zone and shift its unsent, upcoming pings so each keeps
+    its local wall-clock time, in a single UPDATE (uncommitted).
+
+    scheduled_ts becomes (scheduled_ts AT TIME ZONE old_tz) AT TIME ZONE new_tz, and
+    expire_ts / reminder_ts move by the same amount so latencies are preserved. Postgres
+    resolves local times that fall in a DST gap by moving them forward by the gap, and
+    ambiguous fall-back times to standard time. Pings whose shifted time would already be
+    past keep their original time instead of being sent immediately.
+
+    Args:
+        session (Session): The database session.
+        enrollment (Enrollment): The enrollment to update.
+        new_tz (str): IANA time zone name (validated by the caller).
+        now (Optional[datetime]): Only pings scheduled after this are shifted.
+
+    Returns:
+        int: The number of pings shifted.
+    """
+    now = now or datetime.now(timezone.utc)
+    old_tz = enrollment.tz
+    enrollment.tz = new_tz
+    if old_tz == new_tz:
+        return 0
+
+    shifted_ts = func.timezone(new_tz, func.timezone(old_tz, Ping.scheduled_ts))
+    delta = shifted_ts - Ping.scheduled_ts
+    stmt = (
+        update(Ping)
+        .where(
+            Ping.enrollment_id == enrollment.id,
+            Ping.sent_ts.is_(None),
+            Ping.scheduled_ts > now,
+            Ping.deleted_at.is_(None),
+            shifted_ts > now,
+        )
+        .values(
+            scheduled_ts=shifted_ts,
+            expire_ts=Ping.expire_ts + delta,
+            reminder_ts=Ping.reminder_ts + delta,
+            updated_at=func.now(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return session.execute(stmt).rowcount
+
+
+# ======================= PARTICIPANT DASHBOARD =======================
+# Everything the participant dashboard shows, in one statement: the enrollments unlocked by
+# an OTP (found through ix_enrollments_dashboard_otp), their studies, ping counts and the most
+# recent sent pings as JSON. Times are formatted in the participant's time zone.
+PARTICIPANT_DASHBOARD_SQL = """
+SELECT e.study_id, e.study_pid, e.tz, e.enrolled,
+       to_char(e.signup_ts AT TIME ZONE e.tz, 'YYYY-MM-DD') AS signup_ts,
+       e.dashboard_otp_expire_ts,
+       s.public_name, s.contact_message,
+       counts.n_sent, counts.n_completed,
+       recent.pings AS recent_pings
+FROM enrollments e
+JOIN studies s ON s.id = e.study_id AND s.deleted_at IS NULL
+CROSS JOIN LATERAL (
+    SELECT count(*) FILTER (WHERE p.sent_ts IS NOT NULL) AS n_sent,
+           count(*) FILTER (WHERE p.first_clicked_ts IS NOT NULL) AS n_completed
+    FROM pings p
+    WHERE p.enrollment_id = e.id AND p.deleted_at IS NULL
+) counts
+CROSS JOIN LATERAL (
+    SELECT COALESCE(json_agg(json_build_object(
+               'sent_ts', to_char(r.sent_ts AT TIME ZONE e.tz, 'YYYY-MM-DD HH24:MI'),
+               'expire_ts', to_char(r.expire_ts AT TIME ZONE e.tz, 'YYYY-MM-DD HH24:MI'),
+               'completed_ts', to_char(r.first_clicked_ts AT TIME ZONE e.tz, 'YYYY-MM-DD HH24:MI'),
+               'status', CASE
+                   WHEN r.first_clicked_ts IS NOT NULL THEN 'completed'
+                   WHEN r.expire_ts <= :now THEN 'expired'
+                   ELSE 'open'
+               END
+           ) ORDER BY r.sent_ts DESC), '[]'::json) AS pings
+    FROM (
+        SELECT p.sent_ts, p.expire_ts, p.first_clicked_ts
+        FROM pings p
+        WHERE p.enrollment_id = e.id AND p.deleted_at IS NULL AND p.sent_ts IS NOT NULL
+        ORDER BY p.sent_ts DESC
+        LIMIT :n_recent_pings
+    ) r
+) recent
+WHERE e.dashboard_otp = :otp
+  AND e.telegram_id = :telegram_id
+  AND e.dashboard_otp_expire_ts > :now
+  AND e.deleted_at IS NULL
+ORDER BY e.id
+"""
+
+
+def get_participant_dashboard(
+    session: Session,
+    telegram_id: int,
+    otp: str,
+    now: Optional[datetime] = None,
+    n_recent_pings: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    Fetch the dashboard of a participant whose OTP is valid, in one query.
+
+    Args:
+        session (Session): The database session.
+        telegram_id (int): The participant's Telegram ID.
+        otp (str): The dashboard one-time password.
+        now (Optional[datetime]): The time OTP expiry is checked against.
+        n_recent_pings (int): How many of the latest sent pings to return per enrollment.
+
+    Returns:
+        List[Dict[str, Any]]: One dict per enrollment (empty if the OTP is invalid or expired).
+    """
+    params = {
+        "telegram_id": str(telegram_id),
+        "otp": otp,
+        "now": now or datetime.now(timezone.utc),
+        "n_recent_pings": n_recent_pings,
+    }
+    return [dict(row) for row in session.execute(text(PARTICIPANT_DASHBOARD_SQL), params).mappings()]
+
+
+# ======================= PING RESCHEDULE =======================
+# Plans new times for the unsent, upcoming pings of one ping template entirely in SQL.
+# A ping is matched to a schedule entry on its own day (day_num = begin_day_num): first to an
+# entry whose window still contains its scheduled time, otherwise to the entry with the same
+# rank among that day's entries (by begin_time) as the ping has among the enrollment's pings of
+# that day (by scheduled_ts). Pings with no entry on their day are removed. A ping whose time is
+# still inside its window keeps it, so only expire_ts and reminder_ts follow latency edits; any
+# other ping gets a random time in its new window derived from md5(forwarding_code || schedule),
+# so a dry run and the real run produce the same times.
+RESCHEDULE_PLAN_SQL = """
+WITH entries AS (
+    SELECT s.idx,
+           (s.entry->>'begin_day_num')::int AS begin_day_num,
+           (s.entry->>'begin_time')::time AS begin_time,
+           (s.entry->>'end_day_num')::int AS end_day_num,
+           (s.entry->>'end_time')::time AS end_time
+    FROM ping_templates pt,
+         jsonb_array_elements(COALESCE(pt.schedule, '[]'::jsonb)) WITH ORDINALITY AS s(entry, idx)
+    WHERE pt.id = :template_id
+),
+schedule AS (
+    SELECT en.*,
+           row_number() OVER (PARTITION BY en.begin_day_num ORDER BY en.begin_time, en.idx) AS day_rank
+    FROM entries en
+),
+ranked AS (
+    SELECT p.id, p.enrollment_id, p.forwarding_code, p.day_num, p.sent_ts,
+           p.scheduled_ts, p.expire_ts, p.reminder_ts,
+           row_number() OVER (PARTITION BY p.enrollment_id, p.day_num ORDER BY p.scheduled_ts, p.id) AS day_rank
+    FROM pings p
+    WHERE p.ping_template_id = :template_id
+      AND p.deleted_at IS NULL
+      AND p.enrollment_id BETWEEN :enrollment_id_min AND :enrollment_id_max
+),
+windows AS (
+    SELECT r.*, m.begin_day_num, m.window_start, m.window_end, COALESCE(m.in_window, false) AS in_window
+    FROM ranked r
+    JOIN enrollments e ON e.id = r.enrollment_id AND e.deleted_at IS NULL
+    LEFT JOIN LATERAL (
+        SELECT s.begin_day_num, w.window_start, w.window_end,
+               r.scheduled_ts BETWEEN w.window_start AND w.window_end AS in_window
+        FROM schedule s
+        CROSS JOIN LATERAL (
+            SELECT (((e.signup_ts AT TIME ZONE e.tz)::date + s.begin_day_num) + s.begin_time) AT TIME ZONE e.tz AS window_start,
+                   (((e.signup_ts AT TIME ZONE e.tz)::date + s.end_day_num) + s.end_time) AT TIME ZONE e.tz AS window_end
+        ) w
+        WHERE s.begin_day_num = r.day_num
+          AND (r.scheduled_ts BETWEEN w.window_start AND w.window_end OR s.day_rank = r.day_rank)
+        ORDER BY (r.scheduled_ts BETWEEN w.window_start AND w.window_end) DESC, s.idx
+        LIMIT 1
+    ) m ON true
+    WHERE r.sent_ts IS NULL
+      AND r.scheduled_ts > :now
+),
+timed AS (
+    SELECT w.id, w.enrollment_id, w.day_num, w.scheduled_ts, w.expire_ts, w.reminder_ts,
+           w.begin_day_num AS new_day_num,
+           CASE
+               WHEN w.in_window THEN w.scheduled_ts
+               ELSE date_trunc('second', w.window_start + (w.window_end - w.window_start)
+                   * (('x' || substr(md5(w.forwarding_code || pt.schedule::text), 1, 8))::bit(32)::bigint / 4294967295.0))
+           END AS new_scheduled_ts,
+           pt.expire_latency,
+           pt.reminder_latency
+    FROM windows w
+    JOIN ping_templates pt ON pt.id = :template_id
+),
+planned AS (
+    SELECT t.id, t.enrollment_id, t.day_num, t.scheduled_ts, t.expire_ts, t.reminder_ts,
+           t.new_day_num, t.new_scheduled_ts,
+           t.new_scheduled_ts + t.expire_latency AS new_expire_ts,
+           t.new_scheduled_ts + t.reminder_latency AS new_reminder_ts,
+           CASE
+               WHEN t.new_day_num IS NULL THEN 'remove'
+               WHEN t.new_scheduled_ts <= :now THEN 'skip'
+               WHEN t.new_scheduled_ts = t.scheduled_ts
+                    AND t.new_day_num = t.day_num
+                    AND (t.new_scheduled_ts + t.expire_latency) IS NOT DISTINCT FROM t.expire_ts
+                    AND (t.new_scheduled_ts + t.reminder_latency) IS NOT DISTINCT FROM t.reminder_ts
+                   THEN 'unchanged'
+               ELSE 'move'
+           END AS action
+    FROM timed t
+)
+"""
+
+RESCHEDULE_ACTIONS = ["move", "remove", "skip", "unchanged"]
+MAX_ENROLLMENT_ID = 2 ** 31 - 1
+
+
+def _reschedule_params(template_id, now, enrollment_id_min, enrollment_id_max):
+    return {
+        "template_id": template_id,
+        "now": now,
+        "enrollment_id_min": enrollment_id_min if enrollment_id_min is not None else 0,
+        "enrollment_id_max": enrollment_id_max if enrollment_id_max is not None else MAX_ENROLLMENT_ID,
+    }
+
+
+def preview_ping_reschedule(
+    session: Session,
+    template_id: int,
+    now: Optional[datetime] = None,
+    sample_size: int = 50
+) -> Dict[str, Any]:
+    """
+    Dry run of reschedule_pings_for_template: what would change, without writing anything.
+    Sees uncommitted template edits made in the same session, so proposed changes can be
+    previewed by flushing them and rolling back afterwards.
+
+    Args:
+        session (Session): The database session.
+        template_id (int): The ID of the ping template.
+        now (Optional[datetime]): Only pings scheduled after this are considered.
+        sample_size (int): Maximum number of changed pings to return in the diff.
+
+    Returns:
+        Dict[str, Any]: Counts per action ('move', 'remove', 'skip', 'unchanged') and a
+        sample of old vs new times for pings that would move or be removed.
+    """
+    now = now or datetime.now(timezone.utc)
+    params = _reschedule_params(template_id, now, None, None)
+
+    counts = {action: 0 for action in RESCHEDULE_ACTIONS}
+    rows = session.execute(
+        text(RESCHEDULE_PLAN_SQL + "SELECT action, count(*) FROM planned GROUP BY action"),
+        params
+    ).all()
+    for action, n in rows:
+        counts[action] = n
+
+    sample = session.execute(
+        text(
+            RESCHEDULE_PLAN_SQL
+            + "SELECT * FROM planned WHERE action IN ('move', 'remove') ORDER BY id LIMIT :sample_size"
+        ),
+        {**params, "sample_size": sample_size}
+    ).mappings().all()
+
+    def iso(ts):
+        return ts.isoformat() if ts else None
+
+    return {
+        "counts": counts,
+        "sample": [
+            {
+                "ping_id": row["id"],
+                "enrollment_id": row["enrollment_id"],
+                "action": row["action"],
+                "day_num": row["day_num"],
+                "new_day_num": row["new_day_num"],
+                "scheduled_ts": iso(row["scheduled_ts"]),
+                "new_scheduled_ts": iso(row["new_scheduled_ts"]),
+                "expire_ts": iso(row["expire_ts"]),
+                "new_expire_ts": iso(row["new_expire_ts"]),
+                "reminder_ts": iso(row["reminder_ts"]),
+                "new_reminder_ts": iso(row["new_reminder_ts"]),
+            }
+            for row in sample
+        ],
+    }
+
+
+def get_enrollment_ids_to_reschedule(
+    session: Session,
+    template_id: int,
+    now: datetime
+) -> List[int]:
+    """
+    IDs of enrollments with unsent, upcoming pings of a template, in ascending order.
+    Used to split a reschedule into chunks of enrollments.
+    """
+    stmt = (
+        select(Ping.enrollment_id)
+        .where(
+            Ping.ping_template_id == template_id,
+            Ping.sent_ts.is_(None),
+            Ping.scheduled_ts > now,
+            Ping.deleted_at.is_(None),
+        )
+        .distinct()
+        .order_by(Ping.enrollment_id.asc())
+    )
+    return session.execute(stmt).scalars().all()
+
+
+def reschedule_pings_for_template(
+    session: Session,
+    template_id: int,
+    now: Optional[datetime] = None,
+    enrollment_id_min: Optional[int] = None,
+    enrollment_id_max: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Recompute scheduled_ts, expire_ts, reminder_ts and day_num of the unsent, upcoming pings
+    of a template from its current schedule and latencies, in a single UPDATE (uncommitted).
+
+    Pings are matched to schedule entries by day and window (see RESCHEDULE_PLAN_SQL). A ping
+    still inside its window keeps its time and only has expire_ts and reminder_ts recomputed.
+    Pings with no schedule entry on their day are soft-deleted. Pings whose new time has already
+    passed are left alone rather than sent immediately. New schedule entries do not create
+    pings for existing enrollments.
+
+    Args:
+        session (Session): The database session.
+        template_id (int): The ID of the ping template.
+        now (Optional[datetime]): Only pings scheduled after this are touched.
+        enrollment_id_min (Optional[int]): Restrict to enrollments with id >= this (for chunking).
+        enrollment_id_max (Optional[int]): Restrict to enrollments with id <= this (for chunking).
+
+    Returns:
+        Dict[str, int]: The number of pings moved and removed.
+    """
+    now = now or datetime.now(timezone.utc)
+    params = _reschedule_params(template_id, now, enrollment_id_min, enrollment_id_max)
+
+    stmt = text(RESCHEDULE_PLAN_SQL + """
+UPDATE pings
+SET scheduled_ts = CASE WHEN planned.action = 'move' THEN planned.new_scheduled_ts ELSE pings.scheduled_ts END,
+    expire_ts = CASE WHEN planned.action = 'move' THEN planned.new_expire_ts ELSE pings.expire_ts END,
+    reminder_ts = CASE WHEN planned.action = 'move' THEN planned.new_reminder_ts ELSE pings.reminder_ts END,
+    day_num = CASE WHEN planned.action = 'move' THEN planned.new_day_num ELSE pings.day_num END,
+    deleted_at = CASE WHEN planned.action = 'remove' THEN :now ELSE pings.deleted_at END,
+    updated_at = now()
+FROM planned
+WHERE pings.id = planned.id
+  AND planned.action IN ('move', 'remove')
+  AND pings.sent_ts IS NULL
+RETURNING planned.action, pings.id, pings.forwarding_code
+""")
+    counts = {"move": 0, "remove": 0}
+    rows = session.execute(stmt, params).all()
+    for row in rows:
+        counts[row.action] += 1
+    # Survey URLs can embed the ping's times, and removed pings must stop redirecting
+    invalidate_survey_urls(session, rows)
+    return counts
+
+
+# ======================= STUDY STATS =======================
+STUDY_STAT_COLUMNS = {
+    "sent": "sent_count",
+    "clicked": "clicked_count",
+    "expired": "expired_count",
+}
+
+# The study_stat_sweeps row of the expired pings rollup (tasks.rollup_expired_pings_task)
+EXPIRED_PINGS_SWEEP = "expired_pings"
+
+
+def study_stat_day(ts: datetime):
+    """
+    Return the rollup bucket (UTC calendar date) for a ping's scheduled timestamp.
+    """
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc).date()
+
+
+def increment_study_stats_for_pings(
+    session: Session,
+    pings: List[Ping],
+    status: str
+) -> int:
+    """
+    Increment the rollup counter for `status` once per ping (uncommitted).
+    Pings are grouped by (study, template, day) so a batch costs a single upsert.
+
+    Args:
+        session (Session): The database session.
+        pings (List[Ping]): The pings whose status changed.
+        status (str): One of 'sent', 'clicked', 'expired'.
+
+    Returns:
+        int: The number of rollup rows touched.
+    """
+    column = STUDY_STAT_COLUMNS[status]
+
+    buckets = {}
+    for ping in pings:
+        key = (ping.study_id, ping.ping_template_id, study_stat_day(ping.scheduled_ts))
+        buckets[key] = buckets.get(key, 0) + 1
+    if not buckets:
+        return 0
+
+    rows = [
+        {
+            "study_id": study_id,
+            "ping_template_id": ping_template_id,
+            "day": day,
+            "sent_count": 0,
+            "clicked_count": 0,
+            "expired_count": 0,
+            column: count,
+            "created_at": datetime.now(timezone.utc),
+        }
+        for (study_id, ping_template_id, day), count in buckets.items()
+    ]
+    stmt = pg_insert(StudyStat).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StudyStat.study_id, StudyStat.ping_template_id, StudyStat.day],
+        set_={
+            column: getattr(StudyStat, column) + getattr(stmt.excluded, column),
+            "updated_at": func.now(),
+        }
+    )
+    session.execute(stmt)
+    return len(rows)
+
+
+def decrement_study_stats_for_deleted_pings(
+    session: Session,
+    pings: List[Ping]
+) -> int:
+    """
+    Take pings that are about to be soft-deleted back out of the rollup (uncommitted), so the
+    stats keep matching rebuild_study_stats, which skips deleted pings. Call before setting
+    deleted_at; pings already deleted are skipped. Expiries are only taken back for pings
+    the expired pings sweep has already counted, and counts never go below zero.
+
+    Args:
+        session (Session): The database session.
+        pings (List[Ping]): The pings being soft-deleted.
+
+    Returns:
+        int: The number of rollup rows touched.
+    """
+    sent = [ping for ping in pings if ping.deleted_at is None and ping.sent_ts is not None]
+    if not sent:
+        return 0
+
+    sweep = session.get(StudyStatSweep, EXPIRED_PINGS_SWEEP)
+    swept_until = sweep.swept_until if sweep else None
+
+    buckets = {}
+    for ping in sent:
+        key = (ping.study_id, ping.ping_template_id, study_stat_day(ping.scheduled_ts))
+        counts = buckets.setdefault(key, {"sent_count": 0, "clicked_count": 0, "expired_count": 0})
+        counts["sent_count"] += 1
+        if ping.first_clicked_ts is not None:
+            counts["clicked_count"] += 1
+        if (
+            swept_until is not None
+            and ping.expire_ts is not None
+            and ping.expire_ts <= swept_until
+            and (ping.first_clicked_ts is None or ping.first_clicked_ts > ping.expire_ts)
+        ):
+            counts["expired_count"] += 1
+
+    # One executemany UPDATE over the (study, template, day) buckets
+    table = StudyStat.__table__
+    values = {"updated_at": func.now()}
+    for column in STUDY_STAT_COLUMNS.values():
+        n = bindparam(f"b_{column}")
+        values[column] = case((table.c[column] > n, table.c[column] - n), else_=0)
+    stmt = (
+        table.update()
+        .where(
+            table.c.study_id == bindparam("b_study_id"),
+            table.c.ping_template_id == bindparam("b_ping_template_id"),
+            table.c.day == bindparam("b_day"),
+        )
+        .values(values)
+    )
+    rows = [
+        {"b_study_id": study_id, "b_ping_template_id": ping_template_id, "b_day": day}
+        | {f"b_{column}": n for column, n in counts.items()}
+        for (study_id, ping_template_id, day), counts in buckets.items()
+    ]
+    session.execute(stmt, rows)
+    return len(rows)
+
+
+def rollup_expired_pings(
+    session: Session,
+    since: datetime,
+    until: datetime
+) -> int:
+    """
+    Add pings that expired unclicked in (since, until] to the rollup (uncommitted).
+    Done as one INSERT ... SELECT so the pings never leave the database.
+
+    Args:
+        session (Session): The database session.
+        since (datetime): Exclusive lower bound on expire_ts (the previous sweep).
+        until (datetime): Inclusive upper bound on expire_ts.
+
+    Returns:
+        int: The number of rollup rows touched.
+    """
+    day = func.date(func.timezone('UTC', Ping.scheduled_ts))
+    expired = (
+        select(
+            Ping.study_id,
+            Ping.ping_template_id,
+            day.label("day"),
+            func.count(Ping.id).label("expired_count"),
+            func.now().label("created_at"),
+        )
+        .where(
+            Ping.sent_ts.isnot(None),
+            Ping.expire_ts > since,
+            Ping.expire_ts <= until,
+            or_(Ping.first_clicked_ts.is_(None), Ping.first_clicked_ts > Ping.expire_ts),
+            Ping.deleted_at.is_(None),
+        )
+        .group_by(Ping.study_id, Ping.ping_template_id, day)
+    )
+    stmt = pg_insert(StudyStat).from_select(
+        ["study_id", "ping_template_id", "day", "expired_count", "created_at"],
+        expired
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StudyStat.study_id, StudyStat.ping_template_id, StudyStat.day],
+        set_={
+            "expired_count": StudyStat.expired_count + stmt.excluded.expired_count,
+            "updated_at": func.now(),
+        }
+    )
+    return session.execute(stmt).rowcount
+
+
+def lock_study_stat_sweep(
+    session: Session,
+    name: str
+) -> Optional[datetime]:
+    """
+    Return where the named sweep stopped, locking its row until the transaction ends so
+    overlapping runs cannot count the same window twice.
+
+    Args:
+        session (Session): The database session.
+        name (str): The sweep name.
+
+    Returns:
+        Optional[datetime]: The upper bound of the last committed sweep, or None before the first.
+    """
+    return session.execute(
+        select(StudyStatSweep.swept_until)
+        .where(StudyStatSweep.name == name)
+        .with_for_update()
+    ).scalar_one_or_none()
+
+
+def set_study_stat_sweep(
+    session: Session,
+    name: str,
+    swept_until: datetime
+) -> None:
+    """
+    Record where the named sweep stopped (uncommitted). Commit it together with the rollup.
+
+    Args:
+        session (Session): The database session.
+        name (str): The sweep name.
+        swept_until (datetime): The upper bound of the window just rolled up.
+    """
+    stmt = pg_insert(StudyStatSweep).values(name=name, swept_until=swept_until)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StudyStatSweep.name],
+        set_={"swept_until": stmt.excluded.swept_until, "updated_at": func.now()},
+    )
+    session.execute(stmt)
+
+
+def rebuild_study_stats(
+    session: Session,
+    study_id: int,
+    now: Optional[datetime] = None
+) -> int:
+    """
+    Recompute the rollup rows of a study from its pings (uncommitted).
+    Used to backfill studies that predate the rollup or to repair drift.
+
+    Args:
+        session (Session): The database session.
+        study_id (int): The ID of the study.
+        now (Optional[datetime]): Pings expiring after this are not counted as expired.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    now = now or datetime.now(timezone.utc)
+    day = func.date(func.timezone('UTC', Ping.scheduled_ts))
+    expired = and_(
+        Ping.expire_ts <= now,
+        or_(Ping.first_clicked_ts.is_(None), Ping.first_clicked_ts > Ping.expire_ts)
+    )
+    totals = (
+        select(
+            Ping.study_id,
+            Ping.ping_template_id,
+            day.label("day"),
+            func.count(Ping.sent_ts).label("sent_count"),
+            func.count(Ping.first_clicked_ts).label("clicked_count"),
+            func.count(Ping.id).filter(Ping.sent_ts.isnot(None), expired).label("expired_count"),
+            func.now().label("created_at"),
+        )
+        .where(
+            Ping.study_id == study_id,
+            Ping.deleted_at.is_(None),
+        )
+        .group_by(Ping.study_id, Ping.ping_template_id, day)
+    )
+
+    session.execute(StudyStat.__table__.delete().where(StudyStat.study_id == study_id))
+    stmt = pg_insert(StudyStat).from_select(
+        ["study_id", "ping_template_id", "day", "sent_count", "clicked_count", "expired_count", "created_at"],
+        totals
+    )
+    return session.execute(stmt).rowcount
+
+
+def get_study_stats(
+    session: Session,
+    study_id: int,
+    ping_template_id: Optional[int] = None,
+    start_day=None,
+    end_day=None
+) -> List[Any]:
+    """
+    Fetch rollup rows for a study along with the ping template name.
+
+    Args:
+        session (Session): The database session.
+        study_id (int): The ID of the study.
+        ping_template_id (Optional[int]): Restrict to a single ping template.
+        start_day (Optional[date]): First day to include.
+        end_day (Optional[date]): Last day to include.
+
+    Returns:
+        List[Row]: Rows of (StudyStat, ping template name), ordered by day.
+    """
+    stmt = (
+        select(StudyStat, PingTemplate.name)
+        .join(PingTemplate, StudyStat.ping_template_id == PingTemplate.id)
+        .where(
+            StudyStat.study_id == study_id,
+            PingTemplate.deleted_at.is_(None)
+        )
+        .order_by(StudyStat.day.asc(), StudyStat.ping_template_id.asc())
+    )
+    if ping_template_id is not None:
+        stmt = stmt.where(StudyStat.ping_template_id == ping_template_id)
+    if start_day is not None:
+        stmt = stmt.where(StudyStat.day >= start_day)
+    if end_day is not None:
+        stmt = stmt.where(StudyStat.day <= end_day)
+
+    return session.execute(stmt).all()
+
+
 # ======================= SUPPORT =======================
 def create_support_query(
     session: Session,
@@ -1212,6 +2397,28 @@ def get_support_by_id(
     return result.scalar_one_or_none()
 
 
+def get_support_queries_by_ids(
+    session: Session,
+    support_ids: List[int]
+) -> List[Support]:
+    """
+    Fetch the non-deleted Support queries with the given IDs in one query.
+
+    Args:
+        session (Session): The database session.
+        support_ids (List[int]): The IDs of the support queries.
+
+    Returns:
+        List[Support]: The matching Support objects, ordered by ID.
+    """
+    stmt = (
+        select(Support)
+        .where(Support.id.in_(support_ids), Support.deleted_at.is_(None))
+        .order_by(Support.id.asc())
+    )
+    return session.execute(stmt).scalars().all()
+
+
 def update_support_query(
     session: Session, 
     support_id: int, 
@@ -0,0 +1,354 @@
+# exports.py
+
+import csv
+import io
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from flask import current_app, Response, stream_with_context
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Ping, Enrollment, PingTemplate
+
+EXPORT_CHUNK_ROWS = 2000
+
+PING_EXPORT_COLUMNS = [
+    "ping_id",
+    "enrollment_id",
+    "study_pid",
+    "tz",
+    "ping_template_id",
+    "ping_template_name",
+    "day_num",
+    "scheduled_ts",
+    "expire_ts",
+    "reminder_ts",
+    "sent_ts",
+    "reminder_sent_ts",
+    "first_clicked_ts",
+    "last_clicked_ts",
+]
+
+ENROLLMENT_EXPORT_COLUMNS = [
+    "enrollment_id",
+    "study_pid",
+    "tz",
+    "enrolled",
+    "linked_telegram",
+    "signup_ts",
+    "pr_completed",
+]
+
+
+@lru_cache(maxsize=1024)
+def get_zoneinfo(tz: str) -> ZoneInfo:
+    """
+    Return a cached ZoneInfo so a 10M row export does not resolve the same zone 10M times.
+    """
+    return ZoneInfo(tz.strip())
+
+
+def format_local_ts(ts, tz):
+    """
+    Format a UTC timestamp as ISO 8601 in the participant's time zone (with offset), or '' if missing.
+    """
+    if ts is None:
+        return ""
+    try:
+        return ts.astimezone(get_zoneinfo(tz)).isoformat()
+    except Exception:
+        return ts.isoformat()
+
+
+def ping_export_statement(study_id: int):
+    """
+    One row per ping with the enrollment and template columns joined in, so the export has no N+1.
+    Only plain columns are selected to keep rows small and skip ORM identity tracking.
+    """
+    return (
+        select(
+            Ping.id,
+            Ping.enrollment_id,
+            Enrollment.study_pid,
+            Enrollment.tz,
+            Ping.ping_template_id,
+            PingTemplate.name,
+            Ping.day_num,
+            Ping.scheduled_ts,
+            Ping.expire_ts,
+            Ping.reminder_ts,
+            Ping.sent_ts,
+            Ping.reminder_sent_ts,
+            Ping.first_clicked_ts,
+            Ping.last_clicked_ts,
+        )
+        .join(Enrollment, Ping.enrollment_id == Enrollment.id)
+        .join(PingTemplate, Ping.ping_template_id == PingTemplate.id)
+        .where(
+            Ping.study_id == study_id,
+            Ping.deleted_at.is_(None),
+            Enrollment.deleted_at.is_(None),
+        )
+        .order_by(Ping.id.asc())
+    )
+
+
+def format_ping_row(row):
+    (ping_id, enrollment_id, study_pid, tz, template_id, template_name, day_num,
+     scheduled_ts, expire_ts, reminder_ts, sent_ts, reminder_sent_ts,
+     first_clicked_ts, last_clicked_ts) = row
+    return [
+        ping_id,
+        enrollment_id,
+        study_pid,
+        tz,
+        template_id,
+        template_name,
+        day_num,
+        format_local_ts(scheduled_ts, tz),
+        format_local_ts(expire_ts, tz),
+        format_local_ts(reminder_ts, tz),
+        format_local_ts(sent_ts, tz),
+        format_local_ts(reminder_sent_ts, tz),
+        format_local_ts(first_clicked_ts, tz),
+        format_local_ts(last_clicked_ts, tz),
+    ]
+
+
+def enrollment_export_statement(study_id: int):
+    return (
+        select(
+            Enrollment.id,
+            Enrollment.study_pid,
+            Enrollment.tz,
+            Enrollment.enrolled,
+            Enrollment.telegram_id.isnot(None),
+            Enrollment.signup_ts,
+            Enrollment.pr_completed,
+        )
+        .where(
+            Enrollment.study_id == study_id,
+            Enrollment.deleted_at.is_(None),
+        )
+        .order_by(Enrollment.id.asc())
+    )
+
+
+def format_enrollment_row(row):
+    enrollment_id, study_pid, tz, enrolled, linked_telegram, signup_ts, pr_completed = row
+    return [
+        enrollment_id,
+        study_pid,
+        tz,
+        enrolled,
+        linked_telegram,
+        format_local_ts(signup_ts, tz),
+        pr_completed,
+    ]
+
+
+def iter_csv(
+    session: Session,
+    stmt,
+    header,
+    format_row,
+    chunk_rows: int = EXPORT_CHUNK_ROWS
+):
+    """
+    Yield CSV text in chunks of `chunk_rows` rows.
+
+    The statement runs with yield_per, which uses a server-side cursor on Postgres,
+    so only one chunk of rows is held in memory at a time regardless of export size.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    n_rows = 0
+    try:
+        result = session.execute(stmt.execution_options(yield_per=chunk_rows))
+        for partition in result.partitions():
+            writer.writerows(format_row(row) for row in partition)
+            n_rows += len(partition)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue()
+    except Exception as e:
+        # Headers are already sent, so the best we can do is log and end the stream.
+        current_app.logger.error(f"CSV export failed after {n_rows} rows.")
+        current_app.logger.exception(e)
+        raise
+    else:
+        current_app.logger.info(f"CSV export streamed {n_rows} rows.")
+
+
+def csv_response(chunks, filename: str) -> Response:
+    """
+    Wrap a CSV chunk generator in a streamed (chunked) download response.
+    """
+    return Response(
+        stream_with_context(chunks),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            # Tell nginx to pass chunks through instead of buffering the whole export
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+# Arrow / Parquet exports
+COLUMNAR_EXPORT_FORMATS = {
+    "parquet": "parquet",
+    "arrow": "arrows",  # Arrow IPC stream format
+}
+
+
+def ping_arrow_schema():
+    """
+    Schema for columnar ping exports.
+    Repeated strings (pid, time zone, template name) are dictionary encoded and timestamps
+    are native UTC timestamps, so pandas / R load them without parsing.
+    """
+    import pyarrow as pa
+
+    dict_string = pa.dictionary(pa.int32(), pa.string())
+    ts = pa.timestamp("us", tz="UTC")
+    return pa.schema([
+        ("ping_id", pa.int64()),
+        ("enrollment_id", pa.int64()),
+        ("study_pid", dict_string),
+        ("tz", dict_string),
+        ("ping_template_id", pa.int64()),
+        ("ping_template_name", dict_string),
+        ("day_num", pa.int32()),
+        ("scheduled_ts", ts),
+        ("expire_ts", ts),
+        ("reminder_ts", ts),
+        ("sent_ts", ts),
+        ("reminder_sent_ts", ts),
+        ("first_clicked_ts", ts),
+        ("last_clicked_ts", ts),
+    ])
+
+
+def rows_to_record_batch(rows, schema):
+    """
+    Transpose a partition of rows into a RecordBatch matching `schema`.
+    """
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    arrays = []
+    for values, field in zip(columns, schema):
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_dir_for_study(study_id: int) -> str:
+    """
+    Directory of the local export store holding a study's files (created if missing).
+    """
+    path = os.path.join(current_app.config["EXPORT_DIR"], f"study_{study_id}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def prune_exports(max_age_seconds: float) -> int:
+    """
+    Delete export files older than `max_age_seconds` from every study's export directory.
+
+    Returns:
+        int: The number of files removed.
+    """
+    export_root = current_app.config["EXPORT_DIR"]
+    if not os.path.isdir(export_root):
+        return 0
+
+    cutoff = time.time() - max_age_seconds
+    n_removed = 0
+    for study_dir in os.scandir(export_root):
+        if not study_dir.is_dir() or not study_dir.name.startswith("study_"):
+            continue
+        for entry in os.scandir(study_dir.path):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    n_removed += 1
+            except FileNotFoundError:
+                pass  # removed concurrently, e.g. by another worker
+    return n_removed
+
+
+def write_pings_columnar(
+    session: Session,
+    study_id: int,
+    export_format: str = "parquet",
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+    path: str = None,
+    export_id: str = None
+):
+    """
+    Write all pings of a study to the export store as Parquet or an Arrow IPC stream.
+
+    Rows are read with the same server-side cursor as the CSV export and converted one
+    record batch at a time, so memory stays at one chunk. The file is written under a
+    temporary name and renamed into place once complete, so a failed export never leaves
+    a truncated file to download.
+
+    Returns:
+        dict: filename, path, n_rows and size_bytes of the written file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    extension = COLUMNAR_EXPORT_FORMATS[export_format]
+    if path is None:
+        # The uuid keeps two exports started in the same second from overwriting each other
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        filename = f"pings_{stamp}_{export_id or uuid.uuid4().hex}.{extension}"
+        path = os.path.join(export_dir_for_study(study_id), filename)
+    else:
+        filename = os.path.basename(path)
+
+    schema = ping_arrow_schema()
+    tmp_path = f"{path}.part"
+    n_rows = 0
+    try:
+        if export_format == "parquet":
+            writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+        else:
+            # The stream format allows each batch to carry its own dictionary
+            writer = pa.ipc.new_stream(tmp_path, schema)
+        try:
+            result = session.execute(ping_export_statement(study_id).execution_options(yield_per=chunk_rows))
+            for partition in result.partitions():
+                writer.write_batch(rows_to_record_batch(partition, schema))
+                n_rows += len(partition)
+        finally:
+            writer.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    current_app.logger.info(f"Wrote {n_rows} pings of study={study_id} to {path}.")
+    return {
+        "filename": filename,
+        "path": path,
+        "n_rows": n_rows,
+        "size_bytes": os.path.getsize(path),
+    }
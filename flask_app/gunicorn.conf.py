@@ -0,0 +1,40 @@
+# gunicorn.conf.py
+#
+# Serving modes (set GUNICORN_WORKER_CLASS):
+#   gthread (default) - GUNICORN_WORKERS processes x GUNICORN_THREADS threads.
+#   gevent            - GUNICORN_WORKERS processes x GUNICORN_WORKER_CONNECTIONS greenlets; a request
+#                       waiting on Telegram, reCAPTCHA, Mailtrap, Postgres or Redis yields to the others.
+#                       Sockets are monkey-patched by gunicorn and psycopg2 is made cooperative below.
+# Keep DB_POOL_SIZE + DB_MAX_OVERFLOW in line with the concurrency per process.
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", 4))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        # psycopg2 is a C extension, so monkey-patching alone leaves queries blocking the hub
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        server.log.info(f"Worker {worker.pid}: psycopg2 patched for gevent.")
+
+
+def worker_exit(server, worker):
+    # Workers leave through os._exit, so atexit never flushes the log queue
+    from logger_setup import shutdown_logging
+    shutdown_logging()
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges from the multiprocess metrics directory
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,45 @@
+# http_client.py
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+_session = None
+_session_pid = None
+_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Return this process's pooled requests Session for outbound calls (Telegram, reCAPTCHA, Mailtrap).
+    Reusing connections skips a TCP + TLS handshake per call; under the gevent worker the
+    sockets are cooperative, so a slow upstream only parks the calling greenlet.
+    """
+    global _session, _session_pid
+    if _session_pid != os.getpid():
+        with _lock:
+            if _session_pid != os.getpid():
+                pool_size = current_app.config["HTTP_POOL_SIZE"]
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def _timeout():
+    return (current_app.config["HTTP_CONNECT_TIMEOUT"], current_app.config["HTTP_READ_TIMEOUT"])
+
+
+def post(url, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", _timeout())
+    return get_http_session().post(url, **kwargs)
+
+
+def get(url, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", _timeout())
+    return get_http_session().get(url, **kwargs)
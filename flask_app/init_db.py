@@ -1,10 +1,11 @@
 import os
+import sys
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import Interval
+from sqlalchemy import Interval, text
 from config import CurrentConfig
 
 from app import create_app
@@ -42,6 +43,157 @@ def create_tables():
         except Exception as e:
             db.session.rollback()
             print(f"Error creating tables: {e}")
+
+def dedupe_link_codes():
+    """
+    Makes enrollments.telegram_link_code unique so uq_enrollments_telegram_link_code can be built.
+    The old uniqueness check skipped soft-deleted rows, so older databases can hold duplicates.
+    In each group the first live row keeps its code; used or soft-deleted rows lose theirs and
+    other live rows get a fresh one. Run before create_indexes().
+    """
+    app = create_app(CurrentConfig)
+    with app.app_context():
+        from crud import generate_link_code
+        try:
+            rows = db.session.execute(text("""
+                SELECT id, telegram_link_code, telegram_link_code_used, deleted_at
+                FROM enrollments
+                WHERE telegram_link_code IN (
+                    SELECT telegram_link_code FROM enrollments
+                    WHERE telegram_link_code IS NOT NULL
+                    GROUP BY telegram_link_code HAVING count(*) > 1
+                )
+                ORDER BY telegram_link_code, deleted_at IS NULL DESC, id
+            """)).all()
+            seen = set()
+            n_cleared = n_replaced = 0
+            for enrollment_id, code, used, deleted_at in rows:
+                if code not in seen:
+                    seen.add(code)
+                    continue
+                new_code = None
+                if not used and deleted_at is None:
+                    new_code = generate_link_code()
+                    while db.session.execute(
+                        text("SELECT 1 FROM enrollments WHERE telegram_link_code = :code"), {"code": new_code}
+                    ).first():
+                        new_code = generate_link_code()
+                    n_replaced += 1
+                else:
+                    n_cleared += 1
+                db.session.execute(
+                    text("UPDATE enrollments SET telegram_link_code = :code WHERE id = :id"),
+                    {"code": new_code, "id": enrollment_id}
+                )
+            db.session.commit()
+            print(f"Link codes: cleared {n_cleared} and replaced {n_replaced} duplicates.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error deduplicating link codes: {e}")
+            return False
+    return True
+
+def dedupe_linked_telegram_ids():
+    """
+    Leaves at most one live enrollment per (study_id, telegram_id) so
+    uq_enrollments_study_telegram_id can be built. The most recent enrollment keeps the link;
+    older duplicates are unlinked (telegram_id cleared), not deleted. Run before create_indexes().
+    """
+    app = create_app(CurrentConfig)
+    with app.app_context():
+        try:
+            result = db.session.execute(text("""
+                UPDATE enrollments e
+                SET telegram_id = NULL, updated_at = now()
+                FROM (
+                    SELECT id, row_number() OVER (PARTITION BY study_id, telegram_id ORDER BY id DESC) AS n
+                    FROM enrollments
+                    WHERE deleted_at IS NULL AND telegram_id IS NOT NULL
+                ) d
+                WHERE e.id = d.id AND d.n > 1
+            """))
+            db.session.commit()
+            print(f"Telegram links: unlinked {result.rowcount} duplicate enrollments.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error deduplicating Telegram links: {e}")
+            return False
+    return True
+
+def dedupe_study_pids():
+    """
+    Leaves at most one live enrollment per (study_id, study_pid) so uq_enrollments_study_study_pid
+    can be built; signup and import rely on it for ON CONFLICT. A linked enrollment is kept over
+    an unlinked one, then the most recent; the others are soft-deleted with their pings.
+    Run before create_indexes().
+    """
+    app = create_app(CurrentConfig)
+    with app.app_context():
+        from crud import soft_delete_enrollment
+        try:
+            duplicate_ids = db.session.execute(text("""
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (
+                        PARTITION BY study_id, study_pid
+                        ORDER BY telegram_id IS NOT NULL DESC, id DESC
+                    ) AS n
+                    FROM enrollments
+                    WHERE deleted_at IS NULL
+                ) d
+                WHERE d.n > 1
+            """)).scalars().all()
+            for enrollment_id in duplicate_ids:
+                soft_delete_enrollment(db.session, enrollment_id)
+            db.session.commit()
+            print(f"Study PIDs: soft-deleted {len(duplicate_ids)} duplicate enrollments.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error deduplicating study PIDs: {e}")
+            return False
+    return True
+
+def create_indexes():
+    """
+    Creates any indexes declared on the models that are missing from existing tables
+    (db.create_all() only creates indexes together with new tables). Each index is created
+    on its own, so one failure does not stop the rest.
+
+    Returns:
+        bool: True if every index exists afterwards.
+    """
+    app = create_app(CurrentConfig)
+    failed = []
+    with app.app_context():
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    index.create(bind=db.engine, checkfirst=True)
+                except Exception as e:
+                    failed.append(index.name)
+                    print(f"Error creating index {index.name}: {e}")
+    if failed:
+        print(f"Failed to create {len(failed)} indexes: {', '.join(failed)}")
+        return False
+    print("All indexes created successfully!")
+    return True
+
+def backfill_study_stats():
+    """
+    Rebuilds the study_stats rollup for every study from its pings.
+    Run once after creating the study_stats table on an existing database.
+    """
+    app = create_app(CurrentConfig)
+    with app.app_context():
+        from models import Study
+        from crud import rebuild_study_stats
+        try:
+            for study in Study.query.with_deleted().all():
+                n_rows = rebuild_study_stats(db.session, study.id)
+                print(f"Rebuilt {n_rows} study stats rows for study {study.id}.")
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error backfilling study stats: {e}")
             
 # def register_bot():
 #     """
@@ -75,8 +227,23 @@ if __name__ == '__main__':
     # drop_tables()
     print("Creating all tables...")
     create_tables()
+    # The unique indexes cannot be built while existing rows violate them, so dedupe first.
+    # Study PIDs go first: soft-deleting a duplicate enrollment can resolve its Telegram link too.
+    # Run this before deploying code that upserts enrollments (signup, import).
+    print("Deduplicating study PIDs...")
+    ok = dedupe_study_pids()
+    print("Deduplicating link codes...")
+    ok = dedupe_link_codes() and ok
+    print("Deduplicating Telegram links...")
+    ok = dedupe_linked_telegram_ids() and ok
+    print("Creating missing indexes...")
+    ok = create_indexes() and ok
+    # print("Backfilling study stats...")
+    # backfill_study_stats()
     # print("Registering bot account...")
     # register_bot()
+    if not ok:
+        sys.exit(1)
     
 
 '''
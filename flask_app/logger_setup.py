@@ -1,45 +1,199 @@
+import atexit
+import json
 import logging
 import os
+import queue
+import random
 import sys
+import time
+from datetime import datetime, timezone
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-def setup_logger():
-    # Define log directory based on the script name
-    # script_name = Path(sys.argv[0]).stem
-    # log_dir = Path(f'logs/{script_name}')
-    # log_dir.mkdir(parents=True, exist_ok=True)
-    
-    log_dir = Path('logs')
-    log_dir.mkdir(parents=True, exist_ok=True)
-
-    # Create a logger
-    # logger = logging.getLogger(script_name)
-    logger = logging.getLogger("app_logger")
-    logger.setLevel(logging.DEBUG)
-
-    # Check if the logger already has handlers
-    if not logger.hasHandlers():
-        # Rotating file handler
-        file_handler = RotatingFileHandler(log_dir / 'all.log', maxBytes=10*1024*1024, backupCount=5)
-        file_handler.setLevel(logging.DEBUG)
-
-        # Console handler
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(logging.DEBUG)
-
-        # Formatters
-        file_formatter = logging.Formatter(
-            "%(asctime)s - %(levelname)-8s - %(process)d - %(thread)d - %(name)-15s - [%(filename)-18s:%(lineno)4d] - %(message)s"
+# Logging is configured from the environment rather than the Flask config because the logger
+# is created at import time, before (and outside of) any app:
+#   LOG_LEVEL         minimum level, default DEBUG
+#   LOG_DIR           directory for the per-process files, default "logs"
+#   LOG_FILE_MODE     "process" writes logs/all.<pid>.log per process; "none" skips files so
+#                     stdout can be shipped to a single collector (e.g. the docker log driver)
+#   LOG_FORMAT        "text" or "json" for stdout; files are always JSON
+#   LOG_SAMPLE_RATES  e.g. "ping_batch=0.1,telegram_send=0.01"; records logged with
+#                     extra={"sample": "<name>"} are kept with that probability
+#   LOG_RETENTION_DAYS  files of processes that are gone (recycled gunicorn workers, Celery pool
+#                     children) are deleted once untouched for this long, default 7
+#
+# Gunicorn workers and Celery pool children leave through os._exit, which skips atexit, so
+# gunicorn.conf.py and celery_app.py call shutdown_logging() from their exit hooks.
+LOGGER_NAME = "app_logger"
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, with any `extra=` fields as top-level keys.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "thread": record.thread,
+            "file": record.filename,
+            "line": record.lineno,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drops records tagged with extra={"sample": name} according to the configured rate for
+    that name. Untagged records and names without a rate are always kept.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, "sample", None))
+        return rate is None or random.random() < rate
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Enqueues the record as-is. The stock QueueHandler merges msg and args on the calling
+    thread so the record can be pickled; our queue never leaves the process, so formatting
+    is left to the listener thread. Arguments must therefore not be mutated after logging.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _parse_sample_rates(raw: str) -> dict:
+    rates = {}
+    for item in raw.split(","):
+        name, sep, rate = item.partition("=")
+        if sep and name.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _prune_dead_process_logs(log_dir: Path, max_age_seconds: float):
+    # Containers sharing a log directory cannot see each other's pids, so a file is only
+    # removed once it has also gone untouched for the whole retention period
+    cutoff = time.time() - max_age_seconds
+    for path in log_dir.glob("all.*.log*"):
+        pid = path.name.split(".")[1]
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            if path.stat().st_mtime >= cutoff or _pid_alive(int(pid)):
+                continue
+            path.unlink()
+        except FileNotFoundError:
+            continue  # removed by another process starting at the same time
+
+
+def _build_handlers():
+    handlers = []
+
+    if os.getenv("LOG_FILE_MODE", "process") == "process":
+        log_dir = Path(os.getenv("LOG_DIR", "logs"))
+        log_dir.mkdir(parents=True, exist_ok=True)
+        _prune_dead_process_logs(log_dir, float(os.getenv("LOG_RETENTION_DAYS", 7)) * 86400)
+        # One file per process, so gunicorn and Celery workers never rotate each other's files
+        file_handler = RotatingFileHandler(
+            log_dir / f"all.{os.getpid()}.log", maxBytes=10 * 1024 * 1024, backupCount=5
         )
-        console_formatter = logging.Formatter("%(levelname)s - %(message)s")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        console_handler.setFormatter(JsonFormatter())
+    else:
+        console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+    handlers.append(console_handler)
+
+    return handlers
+
+
+def _start_listener():
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *_build_handlers(), respect_handler_level=True)
+    _listener.start()
+    _queue_handler.queue = log_queue
+
+
+def shutdown_logging():
+    """
+    Write out the records still queued and close the handlers. Runs at exit; processes that
+    leave through os._exit must call it themselves.
+    """
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+
+
+def _restart_after_fork():
+    # The listener thread does not survive fork; the child gets its own queue, thread and file.
+    # Closing the parent's handlers only closes the child's copies of their file descriptors.
+    if _queue_handler is not None:
+        for handler in _listener.handlers:
+            handler.close()
+        _start_listener()
+
+
+def setup_logger():
+    """
+    Return the app logger. Records are put on an in-process queue by the calling thread and
+    formatted and written by a background listener thread, so a slow disk or stdout pipe
+    never blocks a request or a ping dispatch.
+    """
+    global _queue_handler
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(os.getenv("LOG_LEVEL", "DEBUG").upper())
 
-        # Add formatters to handlers
-        file_handler.setFormatter(file_formatter)
-        console_handler.setFormatter(console_formatter)
+    # Only the first call in a process attaches the handler (root may already have handlers
+    # from Celery, so hasHandlers() is not a reliable check)
+    if _queue_handler is None:
+        _queue_handler = LazyQueueHandler(queue.SimpleQueue())
+        _queue_handler.addFilter(SamplingFilter(_parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))))
+        logger.addHandler(_queue_handler)
 
-        # Add handlers to the logger
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+        _start_listener()
+        atexit.register(shutdown_logging)
+        os.register_at_fork(after_in_child=_restart_after_fork)
 
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,68 @@
+# login_limiter.py
+
+from flask import current_app
+
+from extensions import redis_client
+
+
+def _ip_failure_key(ip: str) -> str:
+    return f"login_failures:ip:{ip}"
+
+
+def _email_failure_key(ip: str, email: str) -> str:
+    # Per account and IP, so nobody can lock an account's owner out by failing logins from elsewhere
+    return f"login_failures:email:{email.strip().lower()}:ip:{ip}"
+
+
+def _failure_keys(ip: str, email: str):
+    return _ip_failure_key(ip), _email_failure_key(ip, email)
+
+
+def login_retry_after(ip: str, email: str) -> int:
+    """
+    Return the seconds until this IP, or this email from this IP, may try again, or 0 if not
+    blocked. Checked before any password hashing so blocked attempts cost one Redis round-trip.
+    Fails open if Redis is unavailable.
+    """
+    ip_key, email_key = _failure_keys(ip, email)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(ip_key)
+        pipe.ttl(ip_key)
+        pipe.get(email_key)
+        pipe.ttl(email_key)
+        ip_failures, ip_ttl, email_failures, email_ttl = pipe.execute()
+    except Exception as e:
+        current_app.logger.warning(f"Login limiter unavailable: {e}")
+        return 0
+
+    retry_after = 0
+    if ip_failures and int(ip_failures) >= current_app.config["LOGIN_MAX_FAILURES_PER_IP"]:
+        retry_after = max(retry_after, ip_ttl)
+    if email_failures and int(email_failures) >= current_app.config["LOGIN_MAX_FAILURES_PER_EMAIL_IP"]:
+        retry_after = max(retry_after, email_ttl)
+    return max(retry_after, 0)
+
+
+def record_login_failure(ip: str, email: str) -> None:
+    """
+    Count a failed attempt against both the IP and the email from that IP for
+    LOGIN_FAILURE_WINDOW_SECONDS, counted from the first failure.
+    """
+    window = current_app.config["LOGIN_FAILURE_WINDOW_SECONDS"]
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key in _failure_keys(ip, email):
+            # SET NX EX starts the window only once (INCR keeps the TTL) and works on any Redis version
+            pipe.set(key, 0, nx=True, ex=window)
+            pipe.incr(key)
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.warning(f"Could not record failed login: {e}")
+
+
+def clear_login_failures(ip: str, email: str) -> None:
+    try:
+        redis_client.delete(_email_failure_key(ip, email))
+    except Exception as e:
+        current_app.logger.warning(f"Could not clear failed logins: {e}")
@@ -1,7 +1,10 @@
 
+from datetime import datetime, timezone
 from flask import current_app
 import zoneinfo
 
+from cache import survey_url_cache_key
+from extensions import redis_client
 from models import Ping
 
 class MessageConstructor:
@@ -212,4 +215,56 @@ class MessageConstructor:
     def construct_reminder(self):
         message = "Reminder:\n" + self.construct_message()
         self.message = message
-        return message
\ No newline at end of file
+        return message
+
+
+def cache_survey_urls(pings):
+    """
+    Render the survey URL of each ping once and cache it in Redis, keyed by ping ID and
+    forwarding code, so the forwarder can redirect without loading the ping, template,
+    enrollment or study. Entries live until the ping expires, since the forwarder's fast path
+    does not check expiry; pings without an expiry are cached for SURVEY_URL_CACHE_TTL.
+    Redis failures are logged and ignored; the forwarder falls back to building the URL.
+
+    Returns:
+        dict: The rendered survey URL keyed by ping ID.
+    """
+    now = datetime.now(timezone.utc)
+    default_ttl = current_app.config["SURVEY_URL_CACHE_TTL"]
+    survey_urls = {
+        ping.id: MessageConstructor(ping).construct_survey_url()
+        for ping in pings
+        if ping.ping_template.url
+    }
+    if not survey_urls:
+        return survey_urls
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for ping in pings:
+            if ping.id not in survey_urls:
+                continue
+            ttl = ping.expire_ts - now if ping.expire_ts is not None else default_ttl
+            if ttl.total_seconds() >= 1:
+                pipe.set(survey_url_cache_key(ping.id, ping.forwarding_code), survey_urls[ping.id], ex=ttl)
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.warning(f"Could not cache survey URLs for {len(survey_urls)} pings.")
+        current_app.logger.exception(e)
+    return survey_urls
+
+
+def get_cached_survey_url(ping_id, forwarding_code):
+    """
+    Return the cached survey URL for a ping, or None on a miss or if Redis is unavailable.
+    A hit also proves the forwarding code is valid, since the code is part of the key.
+    """
+    try:
+        survey_url = redis_client.get(survey_url_cache_key(ping_id, forwarding_code))
+    except Exception as e:
+        current_app.logger.warning(f"Could not read cached survey URL for ping={ping_id}.")
+        current_app.logger.exception(e)
+        return None
+    if survey_url is None:
+        return None
+    return survey_url.decode() if isinstance(survey_url, bytes) else survey_url
@@ -0,0 +1,132 @@
+# metrics.py
+#
+# Prometheus metrics for ping dispatch, clicks, Telegram calls and API latency.
+#
+# gunicorn and Celery run several processes, so when PROMETHEUS_MULTIPROC_DIR is set (it must
+# be set before prometheus_client is imported, i.e. in the environment) every process writes its
+# samples to mmap files in that directory and /metrics aggregates them with MultiProcessCollector.
+# The directory should be empty at startup; docker-compose mounts it as a tmpfs.
+#
+# Scrape targets: flask-backend:8000/metrics, click-redirect:8001/metrics and
+# celery-worker:WORKER_METRICS_PORT/metrics.
+
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# ======================= HTTP =======================
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by endpoint, method and status.",
+    ["endpoint", "method", "status"],
+)
+HTTP_REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request, by endpoint.",
+    ["endpoint", "method"], buckets=LATENCY_BUCKETS,
+)
+
+# ======================= PING DISPATCH =======================
+
+PINGS_DUE = Gauge(
+    "pings_due", "Pings due to send found by the last dispatch run.",
+    ["kind"], multiprocess_mode="livemostrecent",
+)
+PINGS_DISPATCHED = Counter(
+    "pings_dispatched_total", "Pings and reminders handed to Telegram, by outcome.",
+    ["kind", "outcome"],
+)
+PING_DISPATCH_LAG = Histogram(
+    "ping_dispatch_lag_seconds", "Delay between a ping's scheduled_ts and its sent_ts.",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 900),
+)
+DISPATCH_RUN_DURATION = Histogram(
+    "ping_dispatch_run_duration_seconds", "Duration of one check_and_send_pings run.",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+# ======================= TELEGRAM =======================
+
+TELEGRAM_REQUEST_LATENCY = Histogram(
+    "telegram_request_duration_seconds", "Telegram Bot API call latency.",
+    ["method"], buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_ERRORS = Counter(
+    "telegram_errors_total", "Failed Telegram Bot API calls by HTTP status ('exception' if none).",
+    ["method", "status"],
+)
+
+# ======================= CLICKS =======================
+
+CLICKS = Counter(
+    "ping_clicks_total", "Ping redirect requests by how they were served.",
+    ["source"],
+)
+CLICKS_FLUSHED = Counter(
+    "ping_clicks_flushed_total", "Clicks written to the database by flush_click_stream_task.",
+)
+
+
+def _registry():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _record_request(response):
+    start = g.pop("metrics_start", None)
+    # Unmatched URLs share one label so scanners cannot blow up the label cardinality
+    endpoint = request.endpoint or "unmatched"
+    if start is not None:
+        HTTP_REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - start)
+    HTTP_REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    return response
+
+
+def init_metrics(app):
+    """
+    Time every request and expose /metrics (not proxied by nginx, like /health).
+    Call before other before_request hooks so rejected requests are timed too.
+    """
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule("/metrics", "metrics", metrics_response, methods=["GET"])
+
+
+def init_worker_metrics(app):
+    """
+    Serve /metrics from the Celery main process for all of its pool processes.
+    """
+    from celery.signals import worker_init, worker_process_shutdown
+
+    @worker_init.connect(weak=False)
+    def _serve_metrics(**kwargs):
+        start_http_server(app.config["WORKER_METRICS_PORT"], registry=_registry())
+
+    @worker_process_shutdown.connect(weak=False)
+    def _mark_dead(pid=None, **kwargs):
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            multiprocess.mark_process_dead(pid or os.getpid())
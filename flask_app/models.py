@@ -1,9 +1,9 @@
 import os
 from datetime import datetime, timezone
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import hash_password, verify_password
 
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import Interval
+from sqlalchemy import Interval, text
 from sqlalchemy.orm import Query
 from sqlalchemy.sql import func
 from extensions import db
@@ -14,6 +14,23 @@ from extensions import db
 # ------------------------------------------------
 class Enrollment(db.Model):
     __tablename__ = 'enrollments'
+    __table_args__ = (
+        db.Index('ix_enrollments_dashboard_otp', 'dashboard_otp'),
+        db.Index('ix_enrollments_telegram_id', 'telegram_id'),
+        db.Index('uq_enrollments_telegram_link_code', 'telegram_link_code', unique=True),
+        # A study_pid can be enrolled in a study only once
+        db.Index(
+            'uq_enrollments_study_study_pid', 'study_id', 'study_pid',
+            unique=True,
+            postgresql_where=text('deleted_at IS NULL'),
+        ),
+        # A Telegram account can be linked to a study only once
+        db.Index(
+            'uq_enrollments_study_telegram_id', 'study_id', 'telegram_id',
+            unique=True,
+            postgresql_where=text('deleted_at IS NULL AND telegram_id IS NOT NULL'),
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     
@@ -117,12 +134,12 @@ class User(db.Model):
     )
 
     def set_password(self, password):
-        """Hash and set the user's password."""
-        self.password = generate_password_hash(password)
+        """Hash and set the user's password (on the bounded hashing pool)."""
+        self.password = hash_password(password)
         
     def check_password(self, password):
-        """Check if the provided password matches the stored hash."""
-        return check_password_hash(self.password, password)
+        """Check if the provided password matches the stored hash (on the bounded hashing pool)."""
+        return verify_password(self.password, password)
     
     def to_dict(self):
         return {
@@ -211,6 +228,9 @@ class PingTemplate(db.Model):
 # ------------------------------------------------
 class Ping(db.Model):
     __tablename__ = 'pings'
+    __table_args__ = (
+        db.Index('ix_pings_enrollment_id_sent_ts', 'enrollment_id', 'sent_ts'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     study_id = db.Column(db.Integer, db.ForeignKey('studies.id'), nullable=False)
@@ -257,6 +277,51 @@ class Ping(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
 
+# ------------------------------------------------
+# Study Stats Table (rollup of ping outcomes)
+# ------------------------------------------------
+class StudyStat(db.Model):
+    """
+    One row per study x ping template x day (UTC date of scheduled_ts).
+    Counts are incremented as pings are sent, clicked or expire, so reads never touch the pings table.
+    """
+    __tablename__ = 'study_stats'
+    __table_args__ = (
+        db.UniqueConstraint('study_id', 'ping_template_id', 'day', name='uq_study_stats_study_template_day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    study_id = db.Column(db.Integer, db.ForeignKey('studies.id'), nullable=False)
+    ping_template_id = db.Column(db.Integer, db.ForeignKey('ping_templates.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    sent_count = db.Column(db.Integer, default=0, nullable=False)
+    clicked_count = db.Column(db.Integer, default=0, nullable=False)
+    expired_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime(timezone=True), default=func.now(), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), onupdate=func.now())
+
+    def to_dict(self):
+        return {
+            'study_id': self.study_id,
+            'ping_template_id': self.ping_template_id,
+            'day': self.day.isoformat() if self.day else None,
+            'sent_count': self.sent_count,
+            'clicked_count': self.clicked_count,
+            'expired_count': self.expired_count,
+        }
+
+
+class StudyStatSweep(db.Model):
+    """
+    How far a periodic rollup into study_stats has got. Written in the same transaction as
+    the rollup, so a window is counted exactly once even if the task fails after the upsert.
+    """
+    __tablename__ = 'study_stat_sweeps'
+
+    name = db.Column(db.String(64), primary_key=True)
+    swept_until = db.Column(db.DateTime(timezone=True), nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False)
+
 # ------------------------------------------------
 # Support Queries Table
 # ------------------------------------------------
@@ -0,0 +1,127 @@
+# password_hashing.py
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusy(Exception):
+    """
+    Raised when too many hashes are already queued, or a hash did not finish within the
+    timeout; callers should answer 503.
+    """
+
+
+class PasswordHasher:
+    """
+    Runs password KDFs on a small bounded thread pool.
+
+    hashlib's scrypt and pbkdf2 release the GIL, so with threaded gunicorn workers other
+    requests keep running while a hash is computed. The pool caps how many hashes run at
+    once per process and `max_pending` caps how many may wait, so a burst of logins
+    queues (or is rejected) instead of taking every CPU.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, timeout: float):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive fork, so each worker process builds its own pool
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="password-hash"
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Run `fn` on the pool and wait up to `timeout` seconds for it.
+        Raises HashingBusy if no slot is free or the wait times out.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        # The slot is released when the hash finishes, not when we stop waiting for it, so a
+        # timed-out hash still counts against the cap while it is queued or running
+        release = lambda _result: self._slots.release()
+        try:
+            gevent_pool = _gevent_threadpool()
+            if gevent_pool is not None:
+                result = gevent_pool.spawn(fn, *args, **kwargs)
+                result.rawlink(release)
+            else:
+                result = self._get_executor().submit(fn, *args, **kwargs)
+                result.add_done_callback(release)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        if gevent_pool is not None:
+            from gevent import Timeout
+            try:
+                return result.get(timeout=self.timeout)
+            except Timeout:
+                raise HashingBusy()
+        try:
+            return result.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HashingBusy()
+
+
+def _gevent_threadpool():
+    """
+    Under the gevent worker, threading is monkey-patched into greenlets, which would run the
+    KDF on the event loop; gevent's hub threadpool uses real OS threads instead.
+    """
+    try:
+        from gevent import monkey, get_hub
+    except ImportError:
+        return None
+    if monkey.is_module_patched("threading"):
+        return get_hub().threadpool
+    return None
+
+
+def get_password_hasher() -> PasswordHasher:
+    hasher = current_app.extensions.get("password_hasher")
+    if hasher is None:
+        hasher = PasswordHasher(
+            max_workers=current_app.config["PASSWORD_HASH_WORKERS"],
+            max_pending=current_app.config["PASSWORD_HASH_MAX_PENDING"],
+            timeout=current_app.config["PASSWORD_HASH_TIMEOUT_SECONDS"],
+        )
+        current_app.extensions["password_hasher"] = hasher
+    return hasher
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash a password with the configured PASSWORD_HASH_METHOD on the hashing pool.
+    """
+    method = current_app.config["PASSWORD_HASH_METHOD"]
+    return get_password_hasher().run(generate_password_hash, password, method=method)
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    """
+    Check a password against a stored hash on the hashing pool.
+    """
+    return get_password_hasher().run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash: str) -> bool:
+    """
+    True if the hash was made with different parameters than PASSWORD_HASH_METHOD
+    (e.g. after the scrypt cost is raised), so it should be upgraded on next login.
+    """
+    return pwhash.split("$", 1)[0] != current_app.config["PASSWORD_HASH_METHOD"]
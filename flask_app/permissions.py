@@ -1,11 +1,12 @@
 # permissions.py
 
 from flask import current_app
-from typing import List, Literal
+from typing import Dict, List, Literal
 from flask_jwt_extended import get_jwt_identity
 from sqlalchemy import select
 from extensions import db
 from models import UserStudy, Study, User
+from cache import get_cached_json, study_roles_cache_key
 
 roles = {
     'developer': 0,
@@ -36,9 +37,10 @@ def get_studies_for_user(user_id: int, minimum_role: str = "owner") -> List[Stud
     """
     accepted_roles = [r for r in roles if roles[r] <= roles[minimum_role]]
 
-    # First, find all UserStudy entries for this user with an accepted role
+    # Load the studies in the same query as the links (no lazy load per link)
     stmt = (
-        select(UserStudy)
+        select(Study)
+        .join(UserStudy, Study.id == UserStudy.study_id)
         .where(
             UserStudy.user_id == user_id,
             UserStudy.role.in_(accepted_roles),
@@ -46,10 +48,30 @@ def get_studies_for_user(user_id: int, minimum_role: str = "owner") -> List[Stud
         )
     )
     results = db.session.execute(stmt)
-    user_studies = results.scalars().all()
+    return results.scalars().all()
 
-    # Return the associated Study objects
-    return [us.study for us in user_studies]
+def get_study_roles(user_id: int) -> Dict[int, str]:
+    """
+    Return the user's {study_id: role} map for active study links.
+    Cached for the request and in Redis; crud invalidates it when a link is added, changed or removed.
+    """
+    def load():
+        stmt = (
+            select(UserStudy.study_id, UserStudy.role)
+            .where(
+                UserStudy.user_id == user_id,
+                UserStudy.deleted_at.is_(None)
+            )
+        )
+        # JSON object keys are strings
+        return {str(study_id): role for study_id, role in db.session.execute(stmt).all()}
+
+    study_roles = get_cached_json(
+        study_roles_cache_key(user_id),
+        load,
+        ttl=current_app.config["STUDY_ROLES_CACHE_TTL_SECONDS"]
+    )
+    return {int(study_id): role for study_id, role in study_roles.items()}
 
 def get_current_user() -> User:
     """
@@ -75,27 +97,13 @@ def user_has_study_permission(
     Check if a user has at least `minimum_role` on a given study. 
     Return the Study object if yes, else None.
     """
-    accepted_roles = [r for r in roles if roles[r] <= roles[minimum_role]]
-
-    # Query for UserStudy entry with an accepted role
-    stmt = (
-        select(UserStudy)
-        .where(
-            UserStudy.user_id == user_id,
-            UserStudy.study_id == study_id,
-            UserStudy.role.in_(accepted_roles),
-            UserStudy.deleted_at.is_(None)
-        )
-    )
-
-    result = db.session.execute(stmt)
-    user_study = result.scalar_one_or_none()
+    role = get_study_roles(user_id).get(int(study_id))
+    if role is None or not check_permission(role, minimum_role):
+        return None
 
-    # Return the associated Study if found
-    if user_study:
-        study = user_study.study
+    # Served from the identity map if the study was already loaded in this request
+    study = db.session.get(Study, study_id)
+    if study:
         # Attach the user's role as a temporary attribute on the study
-        study._user_role = user_study.role
-        return study
-    
-    return None
\ No newline at end of file
+        study._user_role = role
+    return study
@@ -0,0 +1,100 @@
+# query_budget.py
+#
+# Guard against N+1 regressions: wrap a route, Celery task or block in `query_budget(n)` and
+# every SQL statement it runs is counted through SQLAlchemy engine events. Going over the
+# budget raises QueryBudgetExceeded when the app is in testing mode (or QUERY_BUDGET_RAISE is
+# set) and logs a warning otherwise.
+#
+#     @studies_bp.route('/studies/<int:study_id>/things', methods=['GET'])
+#     @query_budget(5)
+#     @jwt_required()
+#     def get_things(study_id): ...
+#
+# Budgets nest; a statement counts against every budget that is open in the current thread
+# (or greenlet, under gevent). Statements run inside `unbudgeted()` count against none, for
+# degraded paths such as writing a click synchronously when Redis is down; open a budget of
+# their own inside it so they stay bounded.
+
+import logging
+from contextlib import ContextDecorator, contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("app_logger")
+
+_active_budgets = ContextVar("active_query_budgets", default=())
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised in testing mode when a handler runs more SQL statements than its budget allows.
+    """
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for budget in _active_budgets.get():
+        budget.count += 1
+
+
+def _ensure_listener():
+    # Listening on the Engine class covers the engine Flask-SQLAlchemy creates lazily
+    if not event.contains(Engine, "before_cursor_execute", _count_statement):
+        event.listen(Engine, "before_cursor_execute", _count_statement)
+
+
+@contextmanager
+def unbudgeted():
+    """
+    Suspend the open budgets for the statements run inside the block.
+    """
+    token = _active_budgets.set(())
+    try:
+        yield
+    finally:
+        _active_budgets.reset(token)
+
+
+class query_budget(ContextDecorator):
+    """
+    Allow at most `max_queries` SQL statements (an executemany batch counts once).
+    `name` defaults to the decorated function's dotted path.
+    """
+
+    def __init__(self, max_queries: int, name: str = None):
+        self.max_queries = max_queries
+        self.name = name
+        self.count = 0
+        self._token = None
+
+    def __call__(self, func):
+        if self.name is None:
+            self.name = f"{func.__module__}.{func.__qualname__}"
+        return super().__call__(func)
+
+    def _recreate_cm(self):
+        # A fresh counter per call, so concurrent requests do not share one
+        return query_budget(self.max_queries, self.name)
+
+    def __enter__(self):
+        _ensure_listener()
+        self.count = 0
+        self._token = _active_budgets.set(_active_budgets.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active_budgets.reset(self._token)
+        if exc_type is None and self.count > self.max_queries:
+            self._exceeded()
+        return False
+
+    def _exceeded(self):
+        message = f"Query budget exceeded in {self.name}: {self.count} statements, budget {self.max_queries}."
+        if has_app_context() and (current_app.testing or current_app.config.get("QUERY_BUDGET_RAISE")):
+            raise QueryBudgetExceeded(message)
+        logger.warning(
+            message,
+            extra={"budget_name": self.name, "queries": self.count, "budget": self.max_queries},
+        )
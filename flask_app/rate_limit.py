@@ -0,0 +1,121 @@
+# rate_limit.py
+
+import math
+import os
+import time
+
+from flask import current_app, jsonify, request
+
+from extensions import redis_client
+
+RATE_LIMIT_STATS = "rate_limit:stats"
+
+# Sliding-window log, checked and updated atomically for every policy of an endpoint.
+# KEYS[1] = stats hash, KEYS[2..] = one sorted set of request times per policy.
+# ARGV[1] = now (ms), ARGV[2] = unique member, ARGV[3] = endpoint,
+# then window (ms) and limit for each policy.
+# Returns 0 if allowed, else the milliseconds until the oldest blocking request leaves its window.
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local retry_after = 0
+for j = 2, #KEYS do
+    local window = tonumber(ARGV[2 * j])
+    local limit = tonumber(ARGV[2 * j + 1])
+    redis.call('ZREMRANGEBYSCORE', KEYS[j], '-inf', now - window)
+    if redis.call('ZCARD', KEYS[j]) >= limit then
+        local oldest = redis.call('ZRANGE', KEYS[j], 0, 0, 'WITHSCORES')
+        retry_after = math.max(retry_after, tonumber(oldest[2]) + window - now, 1)
+    end
+end
+if retry_after > 0 then
+    redis.call('HINCRBY', KEYS[1], ARGV[3] .. ':limited', 1)
+    return retry_after
+end
+for j = 2, #KEYS do
+    redis.call('ZADD', KEYS[j], now, ARGV[2])
+    redis.call('PEXPIRE', KEYS[j], tonumber(ARGV[2 * j]))
+end
+redis.call('HINCRBY', KEYS[1], ARGV[3] .. ':allowed', 1)
+return 0
+"""
+
+
+def _get_script():
+    script = current_app.extensions.get("rate_limit_script")
+    if script is None:
+        script = redis_client.register_script(SLIDING_WINDOW_LUA)
+        current_app.extensions["rate_limit_script"] = script
+    return script
+
+
+def check_rate_limit(endpoint: str, client: str, policies) -> int:
+    """
+    Count a request from `client` against every (limit, window_seconds) policy of `endpoint`.
+
+    Returns:
+        int: 0 if the request is allowed, else the seconds until it would be.
+    """
+    now_ms = int(time.time() * 1000)
+    keys = [RATE_LIMIT_STATS]
+    args = [now_ms, f"{now_ms}-{os.urandom(4).hex()}", endpoint]
+    for limit, window_seconds in policies:
+        keys.append(f"rate_limit:{endpoint}:{window_seconds}:{client}")
+        args.extend([window_seconds * 1000, limit])
+    retry_after_ms = _get_script()(keys=keys, args=args)
+    return math.ceil(retry_after_ms / 1000)
+
+
+def _is_blocked_user_agent() -> bool:
+    user_agent = request.headers.get('User-Agent') or ''
+    return any(bot_string in user_agent for bot_string in current_app.config["BOT_USER_AGENTS"])
+
+
+def enforce_rate_limits():
+    """
+    before_request hook for the unauthenticated endpoints in RATE_LIMITS; runs before the view,
+    so rejected requests never reach Postgres. Fails open if Redis is unavailable.
+    """
+    endpoint = request.endpoint
+    if not current_app.config["RATE_LIMIT_ENABLED"] or endpoint is None:
+        return None
+
+    if endpoint in current_app.config["USER_AGENT_BLOCKED_ENDPOINTS"] and _is_blocked_user_agent():
+        # Link preview bots fetch ping links before (or instead of) the participant
+        try:
+            redis_client.hincrby(RATE_LIMIT_STATS, f"{endpoint}:user_agent_blocked", 1)
+        except Exception:
+            pass
+        return jsonify({"error": "Forbidden"}), 403
+
+    policies = current_app.config["RATE_LIMITS"].get(endpoint)
+    if not policies:
+        return None
+
+    client = request.remote_addr or "unknown"
+    try:
+        retry_after = check_rate_limit(endpoint, client, policies)
+    except Exception as e:
+        current_app.logger.warning(f"Rate limiter unavailable: {e}")
+        return None
+
+    if retry_after:
+        current_app.logger.warning(f"Rate limited {endpoint} for ip={client} for {retry_after}s")
+        response = jsonify({"error": "Too many requests. Please try again later."})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+    return None
+
+
+def get_rate_limit_counters() -> dict:
+    """
+    Return {endpoint: {"allowed": n, "limited": n, "user_agent_blocked": n}} since the stats were last reset.
+    """
+    counters = {}
+    for field, value in redis_client.hgetall(RATE_LIMIT_STATS).items():
+        endpoint, outcome = field.decode().rsplit(":", 1)
+        counters.setdefault(endpoint, {"allowed": 0, "limited": 0, "user_agent_blocked": 0})[outcome] = int(value)
+    return counters
+
+
+def init_rate_limiting(app):
+    app.before_request(enforce_rate_limits)
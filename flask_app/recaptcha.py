@@ -0,0 +1,51 @@
+# recaptcha.py
+
+import hashlib
+
+from flask import current_app
+
+import http_client
+from extensions import redis_client
+
+
+def verify_recaptcha(token: str) -> bool:
+    """
+    Check a reCAPTCHA token with RECAPTCHA_VERIFY_URL over the pooled HTTP session.
+
+    Tokens are single-use: the first request to present a token claims it in Redis for the
+    token's lifetime, and any later request with the same token is rejected without calling
+    the verifier, so one solved challenge cannot be replayed to submit more tickets. A pass is
+    never cached. Network errors release the claim so the client can retry.
+    """
+    key = f"recaptcha:{hashlib.sha256(token.encode()).hexdigest()}"
+    claimed = True
+    try:
+        claimed = redis_client.set(key, "used", nx=True, ex=current_app.config['RECAPTCHA_TOKEN_TTL_SECONDS'])
+    except Exception as e:
+        # The verifier still rejects duplicates upstream
+        current_app.logger.warning(f"reCAPTCHA replay check unavailable: {e}")
+    if not claimed:
+        current_app.logger.warning("reCAPTCHA token reused.")
+        return False
+
+    try:
+        response = http_client.post(
+            current_app.config['RECAPTCHA_VERIFY_URL'],
+            data={
+                'secret': current_app.config['RECAPTCHA_SECRET_KEY'],
+                'response': token,
+            },
+        )
+        response.raise_for_status()
+        result = response.json()
+    except Exception:
+        try:
+            redis_client.delete(key)
+        except Exception:
+            pass
+        raise
+
+    passed = bool(result.get('success')) and result.get('score', 0) >= current_app.config['RECAPTCHA_MIN_SCORE']
+    if not passed:
+        current_app.logger.warning(f"reCAPTCHA failed: {result}")
+    return passed
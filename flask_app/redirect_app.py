@@ -0,0 +1,44 @@
+# redirect_app.py
+#
+# Minimal app that only serves the ping click redirect (/api/ping/<ping_id>).
+# It skips JWT, CORS, flasgger, Celery and the researcher blueprints, so it starts quickly,
+# uses little memory per worker and can be scaled separately from the main API.
+#
+# Run with: gunicorn -c gunicorn.conf.py -b 0.0.0.0:8001 redirect_app:app
+
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from config import CurrentConfig
+from extensions import db, redis_client
+from logger_setup import setup_logger
+
+
+def create_redirect_app(config=CurrentConfig):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+    app.logger = setup_logger()
+
+    # Only the extensions the forwarder uses: Redis for the URL cache and click stream,
+    # Postgres for cache misses and the synchronous click fallback
+    db.init_app(app)
+    redis_client.init_app(app)
+
+    from blueprints.forwarder import forwarder_bp
+    app.register_blueprint(forwarder_bp, url_prefix='/api')
+
+    from metrics import init_metrics
+    init_metrics(app)
+
+    from rate_limit import init_rate_limiting
+    init_rate_limiting(app)
+
+    @app.route('/health', methods=['GET'])
+    def health():
+        return {'status': 'healthy'}, 200
+
+    return app
+
+
+app = create_redirect_app()
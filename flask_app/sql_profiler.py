@@ -0,0 +1,119 @@
+# sql_profiler.py
+#
+# Opt-in (SQL_PROFILER_ENABLED=1) per-request SQL profiling. Every statement a request runs is
+# counted and timed from SQLAlchemy engine events; the totals go into a Server-Timing header
+# (visible in the browser's network panel) and a structured log line. A statement run at least
+# SQL_PROFILER_REPEAT_THRESHOLD times in one request, i.e. the same SQL with different bound
+# parameters, is logged as a likely N+1 together with the route that ran it.
+
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class SqlProfile:
+    """
+    Queries run during one request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.statement_durations = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+        self.statement_durations[statement] += duration
+
+    def repeated(self, threshold: int):
+        return [(stmt, n) for stmt, n in self.statements.most_common() if n >= threshold]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "sql_profile" in g:
+        conn.info.setdefault("sql_profiler_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("sql_profiler_start")
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    if has_request_context() and "sql_profile" in g:
+        g.sql_profile.record(statement, duration)
+
+
+def _handle_error(context):
+    # after_cursor_execute does not fire for failed statements
+    starts = context.connection.info.get("sql_profiler_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def _start_profile():
+    g.sql_profile = SqlProfile()
+
+
+def _finish_profile(response):
+    profile = g.pop("sql_profile", None)
+    if profile is None:
+        return response
+
+    elapsed = time.perf_counter() - profile.started
+    response.headers.add(
+        "Server-Timing", f'db;dur={profile.duration * 1000:.1f};desc="{profile.count} queries"'
+    )
+    response.headers.add("Server-Timing", f"app;dur={elapsed * 1000:.1f}")
+
+    route = request.url_rule.rule if request.url_rule else request.path
+    log = current_app.logger
+    log.info(
+        "SQL profile %s %s: %d queries, %.1f ms of %.1f ms",
+        request.method, route, profile.count, profile.duration * 1000, elapsed * 1000,
+        extra={
+            "route": route,
+            "endpoint": request.endpoint,
+            "method": request.method,
+            "status": response.status_code,
+            "queries": profile.count,
+            "db_ms": round(profile.duration * 1000, 1),
+            "request_ms": round(elapsed * 1000, 1),
+        },
+    )
+    for statement, n in profile.repeated(current_app.config["SQL_PROFILER_REPEAT_THRESHOLD"]):
+        log.warning(
+            "Possible N+1 in %s %s: same statement ran %d times",
+            request.method, route, n,
+            extra={
+                "route": route,
+                "endpoint": request.endpoint,
+                "repeats": n,
+                "repeat_ms": round(profile.statement_durations[statement] * 1000, 1),
+                "statement": " ".join(statement.split())[:1000],
+            },
+        )
+    return response
+
+
+def init_sql_profiler(app):
+    """
+    Profile SQL per request if SQL_PROFILER_ENABLED is set; otherwise do nothing, so the
+    engine events are not even registered in normal operation.
+    """
+    if not app.config["SQL_PROFILER_ENABLED"]:
+        return
+    # Listening on the Engine class covers the engine Flask-SQLAlchemy creates lazily
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.logger.info("SQL profiler enabled.")
@@ -0,0 +1,167 @@
+# support_mailer.py
+#
+# Support tickets are saved by the web request and emailed to the support team from Celery:
+# the route pushes the ticket id onto a Redis list, a beat task drains the list in batches
+# and sends each batch over the pooled HTTP session, and tickets that fail are retried
+# with backoff by send_support_emails_task.
+#
+# A batch is moved (LMOVE) from the pending list to a processing list, and each id is removed
+# from there only once its email is sent or handed to the retry task. If the flush fails
+# partway, the rest of the batch goes back on the pending list instead of being lost.
+
+from typing import Callable, List, Optional
+
+from flask import current_app
+
+import http_client
+from crud import get_support_queries_by_ids
+from extensions import redis_client
+
+SUPPORT_EMAIL_QUEUE = "support_emails:pending"
+SUPPORT_EMAIL_PROCESSING = "support_emails:processing"
+
+
+def queue_support_email(support_id: int) -> None:
+    """
+    Schedule the email for a saved support ticket. Falls back to enqueuing a Celery task
+    directly if Redis is unavailable.
+    """
+    try:
+        redis_client.rpush(SUPPORT_EMAIL_QUEUE, support_id)
+    except Exception as e:
+        current_app.logger.warning(f"Support email queue unavailable, sending support={support_id} directly: {e}")
+        current_app.celery.send_task("tasks.send_support_emails_task", args=[[support_id]])
+
+
+def claim_support_email_batch(batch_size: int) -> List[int]:
+    """
+    Move up to `batch_size` ticket ids from the pending list to the processing list.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for _ in range(batch_size):
+        pipe.lmove(SUPPORT_EMAIL_QUEUE, SUPPORT_EMAIL_PROCESSING, "LEFT", "RIGHT")
+    return [int(support_id) for support_id in pipe.execute() if support_id is not None]
+
+
+def ack_support_emails(support_ids: List[int]) -> None:
+    """
+    Remove tickets from the processing list once they are sent or handed to the retry task.
+    """
+    if not support_ids:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for support_id in support_ids:
+        pipe.lrem(SUPPORT_EMAIL_PROCESSING, 1, support_id)
+    pipe.execute()
+
+
+def requeue_support_emails(support_ids: List[int]) -> None:
+    """
+    Put claimed tickets back at the head of the pending list.
+    """
+    if not support_ids:
+        return
+    pipe = redis_client.pipeline(transaction=True)
+    for support_id in support_ids:
+        pipe.lrem(SUPPORT_EMAIL_PROCESSING, 1, support_id)
+    pipe.lpush(SUPPORT_EMAIL_QUEUE, *reversed(support_ids))
+    pipe.execute()
+
+
+def build_support_email(support) -> dict:
+    """
+    Build the Mailtrap send API payload for a support ticket.
+    """
+    message = support.messages[0]['message'] if support.messages else ''
+    subject = f"New '{support.query_type}' query from {support.email}"
+    if support.is_urgent:
+        subject = f"URGENT: {subject}"
+    body = f"From: {support.email}"
+    body += f"\n\n"
+    body += f"Query Type: {support.query_type}"
+    body += f"\n\n"
+    body += f"Is urgent: {support.is_urgent}"
+    body += f"\n\n"
+    body += f"Message: {message}"
+    return {
+        "from": {"email": "support@emapingbot.com", "name": "Support request"},
+        "to": [{"email": current_app.config['MAIL_SUPPORT_RECIPIENT']}],
+        "subject": subject,
+        "text": body,
+        "category": support.query_type,
+    }
+
+
+def send_support_emails(
+    session,
+    support_ids: List[int],
+    on_sent: Optional[Callable[[int], None]] = None
+) -> List[int]:
+    """
+    Email the support team about each ticket over one pooled connection.
+
+    Args:
+        session (Session): The database session.
+        support_ids (List[int]): IDs of the tickets to send.
+        on_sent (Optional[Callable[[int], None]]): Called with each ticket id once its email is sent.
+
+    Returns:
+        List[int]: IDs of the tickets that could not be sent and should be retried.
+    """
+    failed = []
+    headers = {"Authorization": f"Bearer {current_app.config['MAILTRAP_API_TOKEN']}"}
+    for support in get_support_queries_by_ids(session, support_ids):
+        try:
+            response = http_client.post(
+                current_app.config['MAILTRAP_SEND_URL'],
+                json=build_support_email(support),
+                headers=headers,
+            )
+            response.raise_for_status()
+        except Exception as e:
+            current_app.logger.error(f"Error sending email for support={support.id} - {support.email}: {e}")
+            failed.append(support.id)
+        else:
+            current_app.logger.info(f"Email sent for support={support.id} - {support.email}.")
+            if on_sent is not None:
+                on_sent(support.id)
+    return failed
+
+
+def flush_support_email_queue(
+    session,
+    batch_size: int,
+    schedule_retry: Callable[[List[int], int], None]
+) -> int:
+    """
+    Send one batch of queued support emails.
+
+    Args:
+        session (Session): The database session.
+        batch_size (int): Maximum number of tickets to send.
+        schedule_retry (Callable[[List[int], int], None]): Hands the ids of failed tickets to
+            the retry task, with the countdown (SUPPORT_EMAIL_RETRY_BACKOFF_SECONDS) before it runs.
+
+    Returns:
+        int: The number of tickets taken from the queue.
+    """
+    support_ids = claim_support_email_batch(batch_size)
+    if not support_ids:
+        return 0
+
+    done = set()
+
+    def ack(support_id):
+        ack_support_emails([support_id])
+        done.add(support_id)
+
+    try:
+        failed = send_support_emails(session, support_ids, on_sent=ack)
+        if failed:
+            schedule_retry(failed, current_app.config["SUPPORT_EMAIL_RETRY_BACKOFF_SECONDS"])
+    except Exception:
+        requeue_support_emails([support_id for support_id in support_ids if support_id not in done])
+        raise
+    # Failed tickets are with the retry task now; ids without a ticket row are dropped
+    ack_support_emails([support_id for support_id in support_ids if support_id not in done])
+    return len(support_ids)
@@ -1,14 +1,35 @@
-from datetime import datetime, timezone
+import os
+import socket
+from datetime import datetime, timezone, timedelta
 from extensions import db
 from celery_app import celery
 from models import Ping, Enrollment
 from telegram_messenger import TelegramMessenger
 from flask import current_app
-from message_constructor import MessageConstructor
-from crud import get_pings_to_send, get_pings_for_reminder, get_pings_by_enrollment_id
+from message_constructor import MessageConstructor, cache_survey_urls
+from click_recorder import flush_clicks
+from support_mailer import flush_support_email_queue, send_support_emails
+from exports import prune_exports, write_pings_columnar
+from metrics import PINGS_DUE, PINGS_DISPATCHED, PING_DISPATCH_LAG, DISPATCH_RUN_DURATION, CLICKS_FLUSHED
+from query_budget import query_budget
+from crud import (
+    get_pings_to_send, 
+    get_pings_for_reminder, 
+    get_pings_for_dispatch,
+    refresh_pr_completed,
+    increment_study_stats_for_pings,
+    rollup_expired_pings,
+    EXPIRED_PINGS_SWEEP,
+    lock_study_stat_sweep,
+    set_study_stat_sweep,
+    get_enrollment_ids_to_reschedule,
+    reschedule_pings_for_template,
+)
 from flask import jsonify
 
 @celery.task
+@DISPATCH_RUN_DURATION.time()
+@query_budget(12)  # 8 for pings and 4 for reminders, whatever the batch size
 def check_and_send_pings():
     with current_app.app_context():
         # Acquire a session from Flask-SQLAlchemy
@@ -18,29 +39,35 @@ def check_and_send_pings():
         try:
             # 1) Send new pings
             pings_to_send = get_pings_to_send(session, now)
+            ping_ids = [ping.id for ping in pings_to_send]
             for ping in pings_to_send:
                 ping.sent_ts = now
             session.commit()  # commit the updates
+            PINGS_DUE.labels("ping").set(len(ping_ids))
 
-            if len(pings_to_send) == 0:
+            if len(ping_ids) == 0:
                 return
 
-            current_app.logger.info(f"Found {len(pings_to_send)} pings to send.")
-            current_app.logger.debug(
-                f"Found {len(pings_to_send)} pings to send: {[ping.id for ping in pings_to_send]}"
-            )
+            current_app.logger.info("Found %d pings to send.", len(ping_ids))
+            current_app.logger.debug("Ping IDs to send: %s", ping_ids, extra={"sample": "ping_batch"})
+
+            # The commit expired the pings; reload them with everything the messages need in one query
+            pings_to_send = get_pings_for_dispatch(session, ping_ids)
+            enrollment_ids = {ping.enrollment_id for ping in pings_to_send}
 
             # Initialize Telegram Messenger
             bot_token = current_app.config["TELEGRAM_SECRET_KEY"]
             telegram_messenger = TelegramMessenger(bot_token)
 
             # Send the pings
+            sent_pings = []
             for ping in pings_to_send:
                 enrollment = ping.enrollment
                 telegram_id = enrollment.telegram_id
 
                 if not telegram_id:
-                    current_app.logger.warning(f"No telegram_id for enrollment {enrollment.id}")
+                    current_app.logger.warning("No telegram_id for enrollment %s", enrollment.id)
+                    PINGS_DISPATCHED.labels("ping", "no_telegram_id").inc()
                     continue
 
                 msg_constructor = MessageConstructor(ping)
@@ -49,25 +76,33 @@ def check_and_send_pings():
                 success = telegram_messenger.send_ping(telegram_id, message)
 
                 if success:
-                    current_app.logger.info(f"Ping {ping.id} sent to telegram_id {telegram_id}")
+                    current_app.logger.info("Ping %s sent to telegram_id %s", ping.id, telegram_id)
+                    sent_pings.append(ping)
+                    PINGS_DISPATCHED.labels("ping", "sent").inc()
+                    # Measured at delivery rather than from sent_ts, so it includes the wait behind
+                    # earlier pings in the same batch
+                    PING_DISPATCH_LAG.observe((datetime.now(timezone.utc) - ping.scheduled_ts).total_seconds())
                 else:
-                    current_app.logger.error(f"Failed to send ping {ping.id} to telegram_id {telegram_id}")
+                    current_app.logger.error("Failed to send ping %s to telegram_id %s", ping.id, telegram_id)
+                    PINGS_DISPATCHED.labels("ping", "failed").inc()
+                    # Committed with the stats below; committing here would expire the whole batch
                     ping.sent_ts = None
-                    session.commit()  # commit this individual reset
 
-            # 2) Update probability completed for enrollments
-            try:
-                for ping in pings_to_send:
-                    all_pings = get_pings_by_enrollment_id(session, ping.enrollment_id)
-                    already_sent_pings = [p for p in all_pings if p.sent_ts is not None]
-                    completed_sent_pings = [p for p in already_sent_pings if p.first_clicked_ts is not None]
+            # Render survey URLs now so clicks can be redirected straight from Redis
+            cache_survey_urls(sent_pings)
 
-                    if already_sent_pings:
-                        pr_completed = len(completed_sent_pings) / len(already_sent_pings)
-                    else:
-                        pr_completed = 0.0
+            # Count the delivered pings in the study stats rollup
+            try:
+                with session.begin_nested():
+                    increment_study_stats_for_pings(session, sent_pings, "sent")
+            except Exception as e:
+                current_app.logger.error("Failed to update study stats for sent pings.")
+                current_app.logger.exception(e)
+            session.commit()  # commit the stats and the resets of failed pings
 
-                    ping.enrollment.pr_completed = pr_completed
+            # 2) Update probability completed for enrollments
+            try:
+                refresh_pr_completed(session, enrollment_ids)
                 session.commit()  # commit after updating all enrollments
             except Exception as e:
                 current_app.logger.error("Failed to update pr_completed in batch of enrollments.")
@@ -97,17 +132,19 @@ def check_and_send_reminders(session, telegram_messenger, now):
     This uses the same session passed in by the parent task.
     """
     pings_for_reminder = get_pings_for_reminder(session, now)
+    ping_ids = [ping.id for ping in pings_for_reminder]
     for ping in pings_for_reminder:
         ping.reminder_sent_ts = now
     session.commit()  # commit the reminder timestamps
+    PINGS_DUE.labels("reminder").set(len(ping_ids))
 
-    if len(pings_for_reminder) == 0:
+    if len(ping_ids) == 0:
         return
 
-    current_app.logger.info(f"Found {len(pings_for_reminder)} pings to send reminders for.")
-    current_app.logger.debug(
-        f"Found {len(pings_for_reminder)} pings to send reminders for: {[ping.id for ping in pings_for_reminder]}"
-    )
+    current_app.logger.info("Found %d pings to send reminders for.", len(ping_ids))
+    current_app.logger.debug("Reminder ping IDs to send: %s", ping_ids, extra={"sample": "ping_batch"})
+
+    pings_for_reminder = get_pings_for_dispatch(session, ping_ids)
 
     # Send the reminders
     for ping in pings_for_reminder:
@@ -115,7 +152,8 @@ def check_and_send_reminders(session, telegram_messenger, now):
         telegram_id = enrollment.telegram_id
 
         if not telegram_id:
-            current_app.logger.warning(f"No telegram_id for enrollment {enrollment.id}")
+            current_app.logger.warning("No telegram_id for enrollment %s", enrollment.id)
+            PINGS_DISPATCHED.labels("reminder", "no_telegram_id").inc()
             continue
 
         msg_constructor = MessageConstructor(ping)
@@ -124,8 +162,193 @@ def check_and_send_reminders(session, telegram_messenger, now):
         success = telegram_messenger.send_ping(telegram_id, message)
 
         if success:
-            current_app.logger.info(f"Reminder for ping {ping.id} sent to telegram_id {telegram_id}")
+            current_app.logger.info("Reminder for ping %s sent to telegram_id %s", ping.id, telegram_id)
+            PINGS_DISPATCHED.labels("reminder", "sent").inc()
         else:
-            current_app.logger.error(f"Failed to send reminder for ping {ping.id} to telegram_id {telegram_id}")
+            current_app.logger.error("Failed to send reminder for ping %s to telegram_id %s", ping.id, telegram_id)
+            PINGS_DISPATCHED.labels("reminder", "failed").inc()
             ping.reminder_sent_ts = None
-            session.commit()
\ No newline at end of file
+
+    session.commit()  # commit the resets of failed reminders
+
+@celery.task
+def rollup_expired_pings_task():
+    """
+    Add pings that expired without a click since the previous sweep to the study stats rollup.
+    The sweep trails real time by a minute so late-recorded clicks are not counted as expiries.
+    """
+    with current_app.app_context():
+        session = db.session
+        sweep_name = EXPIRED_PINGS_SWEEP
+        until = datetime.now(timezone.utc) - timedelta(minutes=1)
+
+        try:
+            since = lock_study_stat_sweep(session, sweep_name)
+            if since is None:
+                # First run: history is covered by rebuild_study_stats, so start from now
+                set_study_stat_sweep(session, sweep_name, until)
+                session.commit()
+                return
+            if since >= until:
+                return
+
+            # The watermark commits with the rollup, so a failed run repeats the window exactly once
+            n_rows = rollup_expired_pings(session, since=since, until=until)
+            set_study_stat_sweep(session, sweep_name, until)
+            session.commit()
+            if n_rows:
+                current_app.logger.info(f"Rolled up expired pings into {n_rows} study stats rows.")
+        except Exception as e:
+            current_app.logger.error("An error occurred in rollup_expired_pings_task.")
+            current_app.logger.exception(e)
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+@celery.task
+def reschedule_ping_template_task(template_id):
+    """
+    Move the unsent, upcoming pings of a ping template onto its current schedule.
+    Runs one set-based UPDATE per chunk of enrollments and commits each chunk, so row locks
+    are held briefly and the sender keeps running. Re-running is safe: times are deterministic.
+    """
+    with current_app.app_context():
+        session = db.session
+        now = datetime.now(timezone.utc)
+        chunk_size = current_app.config["PING_RESCHEDULE_CHUNK_ENROLLMENTS"]
+        totals = {"move": 0, "remove": 0}
+
+        try:
+            enrollment_ids = get_enrollment_ids_to_reschedule(session, template_id, now)
+            for i in range(0, len(enrollment_ids), chunk_size):
+                chunk = enrollment_ids[i:i + chunk_size]
+                counts = reschedule_pings_for_template(
+                    session,
+                    template_id,
+                    now=now,
+                    enrollment_id_min=chunk[0],
+                    enrollment_id_max=chunk[-1],
+                )
+                session.commit()
+                for action, n in counts.items():
+                    totals[action] += n
+
+            current_app.logger.info(
+                f"Rescheduled ping template={template_id} across {len(enrollment_ids)} enrollments: "
+                f"{totals['move']} pings moved, {totals['remove']} removed."
+            )
+            return totals
+        except Exception as e:
+            current_app.logger.error(f"An error occurred rescheduling ping template={template_id}.")
+            current_app.logger.exception(e)
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+@celery.task
+def flush_click_stream_task():
+    """
+    Write clicks queued by the ping forwarder to Postgres in batches.
+    """
+    with current_app.app_context():
+        consumer = f"{socket.gethostname()}-{os.getpid()}"
+        try:
+            n_events = flush_clicks(
+                consumer,
+                batch_size=current_app.config["CLICK_FLUSH_BATCH_SIZE"],
+                claim_idle_ms=current_app.config["CLICK_CLAIM_IDLE_MS"],
+            )
+            if n_events:
+                CLICKS_FLUSHED.inc(n_events)
+                current_app.logger.info(f"Flushed {n_events} ping clicks to the database.")
+        except Exception as e:
+            current_app.logger.error("An error occurred in flush_click_stream_task.")
+            current_app.logger.exception(e)
+            raise
+        finally:
+            db.session.close()
+
+
+@celery.task
+def flush_support_email_queue_task():
+    """
+    Send the support emails queued by /api/support in batches.
+    Tickets that fail are handed to send_support_emails_task to retry with backoff.
+    """
+    with current_app.app_context():
+        session = db.session
+        try:
+            flush_support_email_queue(
+                session,
+                batch_size=current_app.config["SUPPORT_EMAIL_BATCH_SIZE"],
+                schedule_retry=lambda failed, countdown: send_support_emails_task.apply_async(
+                    args=[failed], countdown=countdown
+                ),
+            )
+        except Exception as e:
+            current_app.logger.error("An error occurred in flush_support_email_queue_task.")
+            current_app.logger.exception(e)
+            raise
+        finally:
+            session.close()
+
+
+@celery.task(bind=True, max_retries=5)
+def send_support_emails_task(self, support_ids):
+    """
+    Send support emails for the given tickets, retrying the ones that fail with exponential backoff.
+    """
+    with current_app.app_context():
+        session = db.session
+        try:
+            failed = send_support_emails(session, support_ids)
+        finally:
+            session.close()
+
+        if not failed:
+            return
+        if self.request.retries >= self.max_retries:
+            current_app.logger.error(f"Giving up on support emails for support ids={failed}.")
+            return
+        backoff = current_app.config["SUPPORT_EMAIL_RETRY_BACKOFF_SECONDS"]
+        raise self.retry(args=[failed], countdown=backoff * 2 ** self.request.retries)
+
+
+@celery.task
+def write_ping_export_task(study_id, export_format, export_id):
+    """
+    Write a study's pings to the export store as a columnar file, for create_ping_export.
+    The returned summary is what the export status route reads from the result backend.
+    """
+    with current_app.app_context():
+        session = db.session
+        try:
+            export = write_pings_columnar(session, study_id, export_format=export_format, export_id=export_id)
+            return {
+                "study_id": study_id,
+                "filename": export["filename"],
+                "n_rows": export["n_rows"],
+                "size_bytes": export["size_bytes"],
+            }
+        except Exception as e:
+            current_app.logger.error(f"Error writing {export_format} export={export_id} for study={study_id}.")
+            current_app.logger.exception(e)
+            raise
+        finally:
+            session.close()
+
+
+@celery.task
+def prune_exports_task():
+    """
+    Delete columnar export files older than EXPORT_RETENTION_HOURS from the export store.
+    """
+    with current_app.app_context():
+        max_age = current_app.config["EXPORT_RETENTION_HOURS"] * 3600
+        n_removed = prune_exports(max_age)
+        if n_removed:
+            current_app.logger.info(f"Pruned {n_removed} export files older than {max_age}s.")
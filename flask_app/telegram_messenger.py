@@ -9,6 +9,8 @@ from flask import request, jsonify, Blueprint, current_app
 from extensions import db
 from models import Ping, PingTemplate, Study, Enrollment
 import requests
+import http_client
+from metrics import TELEGRAM_REQUEST_LATENCY, TELEGRAM_ERRORS
 from crud import update_enrollment, get_enrollments_by_telegram_id
 
 logger = setup_logger()
@@ -26,7 +28,7 @@ class TelegramMessenger:
         :param message: str - The text message to send.
         :return: bool - True if the message was sent successfully, False otherwise.
         """
-        url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        url = f"{current_app.config['TELEGRAM_API_BASE_URL']}/bot{self.bot_token}/sendMessage"
         data = {
             "chat_id": telegram_id,
             "text": message,
@@ -36,21 +38,26 @@ class TelegramMessenger:
         }
 
         try:
-            # Make a synchronous HTTP POST request
-            response = requests.post(url, json=data, timeout=10)
+            # POST over the process's pooled session (cooperative under the gevent worker);
+            # timed whether it answers or fails, so timeouts show up in the latency histogram
+            with TELEGRAM_REQUEST_LATENCY.labels("sendMessage").time():
+                response = http_client.post(url, json=data)
             if response.status_code == 200:
                 # Telegram responds with JSON like {"ok": true, "result": {...}}
                 # You could also check response.json()["ok"] for further validation
-                logger.info(f"Successfully sent message to telegramID={telegram_id}")
+                # The caller logs each delivered ping at INFO, so this one is debug and sampled
+                logger.debug("Successfully sent message to telegramID=%s", telegram_id, extra={"sample": "telegram_send"})
                 return True
             else:
+                TELEGRAM_ERRORS.labels("sendMessage", response.status_code).inc()
                 logger.error(
-                    f"Failed to send message to telegramID={telegram_id}. "
-                    f"Status Code: {response.status_code}, Response: {response.text}"
+                    "Failed to send message to telegramID=%s. Status Code: %s, Response: %s",
+                    telegram_id, response.status_code, response.text,
                 )
                 return False
 
         except requests.RequestException as e:
+            TELEGRAM_ERRORS.labels("sendMessage", "exception").inc()
             logger.error(f"Failed to send message to telegramID={telegram_id}")
             logger.exception(e)
             
@@ -0,0 +1,56 @@
+"""
+Compare export time and file size of the CSV, Parquet and Arrow ping exports for one study.
+
+Usage (from flask_app/, against a database with data):
+    python tests/bench_export.py <study_id>
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import CurrentConfig
+from extensions import db
+from exports import (
+    PING_EXPORT_COLUMNS,
+    ping_export_statement,
+    format_ping_row,
+    iter_csv,
+    write_pings_columnar,
+)
+
+
+def bench_csv(study_id, path):
+    start = time.perf_counter()
+    with open(path, "w", newline="") as f:
+        for chunk in iter_csv(db.session, ping_export_statement(study_id), PING_EXPORT_COLUMNS, format_ping_row):
+            f.write(chunk)
+    return time.perf_counter() - start, os.path.getsize(path)
+
+
+def bench_columnar(study_id, export_format, path):
+    start = time.perf_counter()
+    export = write_pings_columnar(db.session, study_id, export_format=export_format, path=path)
+    return time.perf_counter() - start, export["size_bytes"]
+
+
+if __name__ == "__main__":
+    study_id = int(sys.argv[1])
+    app = create_app(CurrentConfig)
+    with app.app_context(), tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "csv": bench_csv(study_id, os.path.join(tmp, "pings.csv")),
+            "parquet": bench_columnar(study_id, "parquet", os.path.join(tmp, "pings.parquet")),
+            "arrow": bench_columnar(study_id, "arrow", os.path.join(tmp, "pings.arrows")),
+        }
+
+    csv_seconds, csv_bytes = results["csv"]
+    print(f"{'format':<10}{'seconds':>10}{'MB':>10}{'size vs csv':>14}{'time vs csv':>14}")
+    for name, (seconds, size) in results.items():
+        print(
+            f"{name:<10}{seconds:>10.2f}{size / 1e6:>10.2f}"
+            f"{size / csv_bytes:>14.2f}{seconds / csv_seconds:>14.2f}"
+        )
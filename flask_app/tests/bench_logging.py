@@ -0,0 +1,107 @@
+"""
+Measure the logging overhead per dispatched ping, comparing the old synchronous setup
+(RotatingFileHandler + stdout on the calling thread, f-string messages, full ping ID list
+at DEBUG) with logger_setup's queued JSON pipeline.
+
+Replays the log calls check_and_send_pings and TelegramMessenger make for each batch and
+each ping, without the database or Telegram. "caller" is the time spent on the dispatching
+thread; "drained" also waits for the listener thread to write everything out.
+
+Stdout goes to /dev/null unless --stdout is given, so the numbers reflect the handlers
+rather than the terminal.
+
+Usage:
+    python flask_app/tests/bench_logging.py [--batches 200] [--batch-size 500] \
+        [--level DEBUG] [--sample-rates ping_batch=0.1,telegram_send=0.01] [--stdout]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def legacy_logger(log_dir, level):
+    logger = logging.getLogger("bench_legacy")
+    logger.setLevel(level)
+    logger.propagate = False
+    file_handler = RotatingFileHandler(os.path.join(log_dir, "all.log"), maxBytes=10 * 1024 * 1024, backupCount=5)
+    file_handler.setFormatter(logging.Formatter(
+        "%(asctime)s - %(levelname)-8s - %(process)d - %(thread)d - %(name)-15s - [%(filename)-18s:%(lineno)4d] - %(message)s"
+    ))
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    return logger
+
+
+def dispatch_legacy(logger, batches, batch_size):
+    for b in range(batches):
+        ping_ids = range(b * batch_size, (b + 1) * batch_size)
+        logger.info(f"Found {batch_size} pings to send.")
+        logger.debug(f"Found {batch_size} pings to send: {[ping_id for ping_id in ping_ids]}")
+        for ping_id in ping_ids:
+            telegram_id = 100000 + ping_id
+            logger.info(f"Successfully sent message to telegramID={telegram_id}")
+            logger.info(f"Ping {ping_id} sent to telegram_id {telegram_id}")
+
+
+def dispatch_queued(logger, batches, batch_size):
+    for b in range(batches):
+        ping_ids = range(b * batch_size, (b + 1) * batch_size)
+        logger.info("Found %d pings to send.", batch_size)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Ping IDs to send: %s", list(ping_ids), extra={"sample": "ping_batch"})
+        for ping_id in ping_ids:
+            telegram_id = 100000 + ping_id
+            logger.debug("Successfully sent message to telegramID=%s", telegram_id, extra={"sample": "telegram_send"})
+            logger.info("Ping %s sent to telegram_id %s", ping_id, telegram_id)
+
+
+def report(name, n_pings, caller, drained):
+    print(
+        f"{name:<8} caller {caller / n_pings * 1e6:7.2f} us/ping   "
+        f"drained {drained / n_pings * 1e6:7.2f} us/ping   ({n_pings} pings)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--level", default="DEBUG")
+    parser.add_argument("--sample-rates", default="ping_batch=0.1,telegram_send=0.01")
+    parser.add_argument("--stdout", action="store_true", help="write console output to the real stdout")
+    args = parser.parse_args()
+
+    if not args.stdout:
+        sys.stdout = open(os.devnull, "w")
+    n_pings = args.batches * args.batch_size
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        logger = legacy_logger(log_dir, args.level)
+        start = time.perf_counter()
+        dispatch_legacy(logger, args.batches, args.batch_size)
+        legacy = time.perf_counter() - start
+
+        os.environ.update(LOG_DIR=log_dir, LOG_LEVEL=args.level, LOG_SAMPLE_RATES=args.sample_rates)
+        import logger_setup
+        logger = logger_setup.setup_logger()
+        start = time.perf_counter()
+        dispatch_queued(logger, args.batches, args.batch_size)
+        caller = time.perf_counter() - start
+        logger_setup.shutdown_logging()  # blocks until the queue is drained
+        drained = time.perf_counter() - start
+
+    sys.stdout = sys.__stdout__
+    report("legacy", n_pings, legacy, legacy)
+    report("queued", n_pings, caller, drained)
+
+
+if __name__ == "__main__":
+    main()
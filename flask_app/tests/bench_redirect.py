@@ -0,0 +1,75 @@
+"""
+Compare requests/sec and latency of the ping click redirect served by the main API
+(flask-backend, create_app) and by the standalone redirect service (redirect_app).
+
+Every request records a click, so point this at a test study.
+
+Usage:
+    python flask_app/tests/bench_redirect.py <ping_id> <forwarding_code> \
+        [--requests 5000] [--concurrency 50] \
+        [--baseline http://localhost:8000] [--candidate http://localhost:8001]
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+_local = threading.local()
+
+
+def get_session():
+    # One keep-alive session per thread, like a browser's connection pool
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def hit(url):
+    start = time.perf_counter()
+    resp = get_session().get(url, allow_redirects=False)
+    return time.perf_counter() - start, resp.status_code
+
+
+def bench(base_url, ping_id, code, n_requests, concurrency):
+    url = f"{base_url}/api/ping/{ping_id}?code={code}"
+    hit(url)  # warm up (also fills the survey URL cache)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: hit(url), range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    n_errors = sum(1 for _, status in results if status != 307)
+    return {
+        "rps": n_requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": n_errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ping_id")
+    parser.add_argument("code")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--baseline", default="http://localhost:8000")
+    parser.add_argument("--candidate", default="http://localhost:8001")
+    args = parser.parse_args()
+
+    results = {
+        "create_app": bench(args.baseline, args.ping_id, args.code, args.requests, args.concurrency),
+        "redirect_app": bench(args.candidate, args.ping_id, args.code, args.requests, args.concurrency),
+    }
+
+    print(f"{'server':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['rps']:>10.0f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>8}")
+    speedup = results["redirect_app"]["rps"] / results["create_app"]["rps"]
+    print(f"\nredirect_app serves {speedup:.2f}x the requests/sec of create_app")
@@ -0,0 +1,31 @@
+"""
+Shared setup for the pytest checks in this directory. They run against SQLite and fakeredis,
+so neither Postgres nor Redis is needed.
+"""
+import os
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm.attributes import set_committed_value
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from extensions import db
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@event.listens_for(db.Model, "load", propagate=True)
+@event.listens_for(db.Model, "refresh", propagate=True)
+def _utc_on_load(target, context, attrs=None):
+    # SQLite drops the timezone that Postgres returns for DateTime(timezone=True) columns
+    for column in target.__table__.columns:
+        value = target.__dict__.get(column.key)
+        if isinstance(column.type, DateTime) and column.type.timezone and isinstance(value, datetime) and value.tzinfo is None:
+            set_committed_value(target, column.key, value.replace(tzinfo=timezone.utc))
@@ -0,0 +1,138 @@
+"""
+Measure how requests that wait on a slow upstream affect everyone else.
+
+Runs --slow-concurrency clients in a loop against /api/support (which waits on reCAPTCHA,
+pointed at tests/slow_upstream.py), and meanwhile measures latency of fast endpoints:
+/health, GET /api/studies (researcher, with --token) and the participant click redirect
+(with --ping-id and --code). Each phase runs for --duration seconds; the fast endpoints are
+measured once without and once with the slow load.
+
+Run it against the same server in each serving mode and compare, e.g.:
+    GUNICORN_WORKER_CLASS=gthread   (default)
+    GUNICORN_WORKER_CLASS=gevent
+
+Usage:
+    python flask_app/tests/load_test_slow_upstream.py [--base-url http://localhost:8000] \
+        [--token <researcher JWT>] [--ping-id <id> --code <forwarding_code>] \
+        [--slow-concurrency 50] [--fast-concurrency 10] [--duration 20]
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+_local = threading.local()
+
+
+def get_session():
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def timed(method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        resp = get_session().request(method, url, timeout=60, allow_redirects=False, **kwargs)
+        status = resp.status_code
+    except requests.RequestException:
+        status = None
+    return time.perf_counter() - start, status
+
+
+def run_for(duration, fn):
+    """Call fn() repeatedly until `duration` has passed; return its results."""
+    results = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        results.append(fn())
+    return results
+
+
+def summarize(results, ok_statuses):
+    if not results:
+        return None
+    latencies = sorted(r[0] for r in results)
+    return {
+        "n": len(results),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000,
+        "errors": sum(1 for _, status in results if status not in ok_statuses),
+    }
+
+
+def measure_fast(endpoints, concurrency, duration):
+    summary = {}
+    for name, (method, url, kwargs, ok_statuses) in endpoints.items():
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [
+                pool.submit(run_for, duration / len(endpoints), lambda: timed(method, url, **kwargs))
+                for _ in range(concurrency)
+            ]
+            results = [r for f in futures for r in f.result()]
+        summary[name] = summarize(results, ok_statuses)
+    return summary
+
+
+def print_summary(title, summary):
+    print(f"\n{title}")
+    print(f"{'endpoint':<22}{'n':>8}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for name, r in summary.items():
+        print(f"{name:<22}{r['n']:>8}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token")
+    parser.add_argument("--ping-id")
+    parser.add_argument("--code")
+    parser.add_argument("--slow-concurrency", type=int, default=50)
+    parser.add_argument("--fast-concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+
+    endpoints = {"health": ("GET", f"{args.base_url}/health", {}, {200})}
+    if args.token:
+        endpoints["researcher studies"] = (
+            "GET", f"{args.base_url}/api/studies",
+            {"headers": {"Authorization": f"Bearer {args.token}"}}, {200},
+        )
+    if args.ping_id and args.code:
+        endpoints["participant redirect"] = (
+            "GET", f"{args.base_url}/api/ping/{args.ping_id}?code={args.code}", {}, {307},
+        )
+
+    print_summary("Without slow load", measure_fast(endpoints, args.fast_concurrency, args.duration))
+
+    stop = threading.Event()
+    slow_results = []
+
+    def slow_client():
+        while not stop.is_set():
+            slow_results.append(timed(
+                "POST", f"{args.base_url}/api/support",
+                json={"email": "load@test.invalid", "type": "load test", "message": "x", "recaptcha": "x"},
+            ))
+
+    slow_threads = [threading.Thread(target=slow_client, daemon=True) for _ in range(args.slow_concurrency)]
+    for t in slow_threads:
+        t.start()
+    time.sleep(2)  # let the slow requests pile up
+
+    print_summary(
+        f"With {args.slow_concurrency} clients waiting on the slow upstream",
+        measure_fast(endpoints, args.fast_concurrency, args.duration),
+    )
+    stop.set()
+    for t in slow_threads:
+        t.join()
+
+    # support answers 400 once the stand-in rejects the reCAPTCHA
+    slow = summarize(slow_results, {400})
+    if slow:
+        print(f"\nslow /api/support: n={slow['n']} p50={slow['p50_ms']:.0f} ms errors={slow['errors']}")
@@ -0,0 +1,72 @@
+"""
+Stand-in for Telegram / reCAPTCHA / the Mailtrap send API that answers every request after
+a fixed delay, for testing the API against a slow upstream without calling the real services.
+
+reCAPTCHA checks are answered with success=false unless --recaptcha-pass is given, so by
+default /api/support stops after the verification call (nothing is saved or emailed).
+GET /sent returns the number of emails received so far.
+
+Usage:
+    python flask_app/tests/slow_upstream.py [--port 9000] [--delay 2.0] [--recaptcha-pass]
+
+Then start flask-backend and the Celery worker with:
+    TELEGRAM_API_BASE_URL=http://<host>:9000
+    RECAPTCHA_VERIFY_URL=http://<host>:9000/recaptcha
+    MAILTRAP_SEND_URL=http://<host>:9000/api/send
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    delay = 2.0
+    recaptcha_pass = False
+    emails_sent = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        self.respond({"sent": SlowHandler.emails_sent})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.delay)
+        if self.path.startswith("/recaptcha"):
+            if self.recaptcha_pass:
+                body = {"success": True, "score": 0.9}
+            else:
+                body = {"success": False, "score": 0.0, "error-codes": ["load-test"]}
+        elif self.path.startswith("/api/send"):
+            with SlowHandler.lock:
+                SlowHandler.emails_sent += 1
+            body = {"success": True, "message_ids": ["load-test"]}
+        else:
+            body = {"ok": True, "result": {}}
+        self.respond(body)
+
+    def respond(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--delay", type=float, default=2.0)
+    parser.add_argument("--recaptcha-pass", action="store_true")
+    args = parser.parse_args()
+
+    SlowHandler.delay = args.delay
+    SlowHandler.recaptcha_pass = args.recaptcha_pass
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), SlowHandler)
+    print(f"Slow upstream on :{args.port}, delay {args.delay}s")
+    server.serve_forever()
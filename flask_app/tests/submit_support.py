@@ -0,0 +1,54 @@
+"""
+Check that /api/support returns without waiting on the mail provider and that the
+queued emails are delivered by Celery.
+
+Start tests/slow_upstream.py with --recaptcha-pass (e.g. --delay 3) and point flask-backend
+and the Celery worker/beat at it (see that file). Tickets are saved to the database, so use
+a test account's JWT.
+
+Usage:
+    python flask_app/tests/submit_support.py <researcher JWT> [--tickets 20] \
+        [--base-url http://localhost:8000] [--upstream http://localhost:9000] [--wait 60]
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("token")
+    parser.add_argument("--tickets", type=int, default=20)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--upstream", default="http://localhost:9000")
+    parser.add_argument("--wait", type=float, default=60)
+    args = parser.parse_args()
+
+    session = requests.Session()
+    headers = {"Authorization": f"Bearer {args.token}"}
+    sent_before = session.get(f"{args.upstream}/sent").json()["sent"]
+
+    latencies = []
+    for i in range(args.tickets):
+        start = time.perf_counter()
+        resp = session.post(
+            f"{args.base_url}/api/support",
+            json={"type": "load test", "message": f"ticket {i}", "recaptcha": f"token-{time.time()}-{i}"},
+            headers=headers,
+        )
+        latencies.append(time.perf_counter() - start)
+        assert resp.status_code == 201, resp.text
+
+    print(f"Submitted {args.tickets} tickets: p50 {statistics.median(latencies) * 1000:.0f} ms, "
+          f"max {max(latencies) * 1000:.0f} ms (each includes one reCAPTCHA round-trip)")
+
+    deadline = time.time() + args.wait
+    delivered = 0
+    while time.time() < deadline:
+        delivered = session.get(f"{args.upstream}/sent").json()["sent"] - sent_before
+        if delivered >= args.tickets:
+            break
+        time.sleep(1)
+    print(f"{delivered}/{args.tickets} emails delivered to the stand-in")
@@ -0,0 +1,132 @@
+"""
+Checks for the columnar ping exports: the POST queues a background task and answers 202,
+the status route reports the finished file, and a failed write leaves nothing behind.
+
+Usage:
+    cd flask_app && python -m pytest -q tests/test_exports.py
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+import exports
+from extensions import db, redis_client
+from models import Enrollment, Ping, PingTemplate, Study, User, UserStudy
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    REDIS_URL = "redis://localhost:6379/0"
+    JWT_SECRET_KEY = "test-secret-of-at-least-32-bytes!"
+    STUDY_ROLES_CACHE_TTL_SECONDS = 60
+
+
+class FakeCelery:
+    """
+    Records queued tasks and serves results set by the test, in place of app.celery.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.results = {}
+
+    def send_task(self, name, args=None, task_id=None):
+        self.sent.append((name, args, task_id))
+        return SimpleNamespace(id=task_id)
+
+    def AsyncResult(self, task_id):
+        return self.results.get(task_id, SimpleNamespace(state="PENDING", result=None))
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    app.config["EXPORT_DIR"] = str(tmp_path)
+    db.init_app(app)
+    redis_client.provider_class = fakeredis.FakeRedis
+    redis_client.init_app(app)
+    JWTManager(app)
+    app.celery = FakeCelery()
+
+    from blueprints.pings import pings_bp
+    app.register_blueprint(pings_bp, url_prefix="/api")
+
+    with app.app_context():
+        redis_client.flushall()  # FakeRedis instances share one server by default
+        db.create_all()
+        now = datetime.now(timezone.utc)
+        user = User(email="viewer@example.com", password="x")
+        study = Study(public_name="Study", internal_name="study", code="study-code")
+        template = PingTemplate(study=study, name="Morning", message="Hi", url="https://example.com/survey")
+        enrollment = Enrollment(study=study, study_pid="p1", tz="UTC", signup_ts=now)
+        db.session.add_all([
+            user,
+            UserStudy(user=user, study=study, role="viewer"),
+            Ping(study=study, ping_template=template, enrollment=enrollment, day_num=1,
+                 scheduled_ts=now, expire_ts=now + timedelta(hours=1)),
+        ])
+        db.session.commit()
+        app.user_id, app.study_id = user.id, study.id
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def auth_headers(app):
+    return {"Authorization": f"Bearer {create_access_token(identity=str(app.user_id))}"}
+
+
+def test_create_export_queues_a_task_and_answers_202(app, tmp_path):
+    client = app.test_client()
+    response = client.post(f"/api/studies/{app.study_id}/pings/export?format=arrow", headers=auth_headers(app))
+
+    assert response.status_code == 202
+    export_id = response.json["export_id"]
+    assert app.celery.sent == [("tasks.write_ping_export_task", [app.study_id, "arrow", export_id], export_id)]
+    assert response.headers["Location"] == response.json["status_url"]
+    assert list(tmp_path.iterdir()) == []
+
+    status = client.get(response.json["status_url"], headers=auth_headers(app))
+    assert status.status_code == 200
+    assert status.json["status"] == "pending"
+
+
+def test_export_status_reports_the_finished_file(app):
+    client = app.test_client()
+    response = client.post(f"/api/studies/{app.study_id}/pings/export", headers=auth_headers(app))
+    export_id = response.json["export_id"]
+    app.celery.results[export_id] = SimpleNamespace(state="SUCCESS", result={
+        "study_id": app.study_id, "filename": f"pings_{export_id}.parquet", "n_rows": 1, "size_bytes": 10,
+    })
+
+    status = client.get(response.json["status_url"], headers=auth_headers(app))
+    assert status.json["status"] == "ready"
+    assert status.json["download_url"].endswith(f"/exports/pings_{export_id}.parquet")
+
+    # An export of another study is not found through this one
+    app.celery.results[export_id].result["study_id"] = app.study_id + 1
+    assert client.get(response.json["status_url"], headers=auth_headers(app)).status_code == 404
+
+
+def test_failed_columnar_write_leaves_no_file(app, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+
+    def broken(rows, schema):
+        raise RuntimeError("conversion failed")
+
+    monkeypatch.setattr(exports, "rows_to_record_batch", broken)
+    with pytest.raises(RuntimeError):
+        exports.write_pings_columnar(db.session, app.study_id, export_format="parquet", export_id="abc")
+    assert os.listdir(exports.export_dir_for_study(app.study_id)) == []
+
+    monkeypatch.undo()
+    export = exports.write_pings_columnar(db.session, app.study_id, export_format="parquet", export_id="abc")
+    assert export["n_rows"] == 1
+    assert os.listdir(exports.export_dir_for_study(app.study_id)) == [export["filename"]]
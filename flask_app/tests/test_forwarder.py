@@ -0,0 +1,116 @@
+"""
+Checks for the ping redirect (blueprints/forwarder.py) against SQLite and fakeredis:
+expired pings get the expiry message on both the database and the cached path, and edits
+that change or remove a ping's survey URL drop its cache entry.
+
+Usage:
+    cd flask_app && python -m pytest -q tests/test_forwarder.py
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+import pytest
+from flask import Flask
+
+from extensions import db, redis_client
+from cache import survey_url_cache_key
+from message_constructor import cache_survey_urls
+from crud import soft_delete_ping, update_ping_template
+from models import Enrollment, Ping, PingTemplate, Study
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    REDIS_URL = "redis://localhost:6379/0"
+    PING_EXPIRED_MESSAGE = "This ping has expired."
+    SURVEY_URL_CACHE_TTL = timedelta(days=7)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    db.init_app(app)
+    redis_client.provider_class = fakeredis.FakeRedis
+    redis_client.init_app(app)
+
+    from blueprints.forwarder import forwarder_bp
+    app.register_blueprint(forwarder_bp, url_prefix="/api")
+
+    with app.app_context():
+        redis_client.flushall()  # FakeRedis instances share one server by default
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def add_ping(expire_ts, scheduled_ts=None):
+    now = datetime.now(timezone.utc)
+    study = Study(public_name="Study", internal_name="study", code=f"code-{now.timestamp()}")
+    template = PingTemplate(study=study, name="Morning", message="Hi", url="https://example.com/survey")
+    enrollment = Enrollment(study=study, study_pid="p1", tz="UTC", signup_ts=now)
+    ping = Ping(
+        study=study, ping_template=template, enrollment=enrollment, day_num=1,
+        scheduled_ts=scheduled_ts or now, sent_ts=now, expire_ts=expire_ts,
+    )
+    db.session.add(ping)
+    db.session.commit()
+    return ping
+
+
+def click(app, ping):
+    return app.test_client().get(f"/api/ping/{ping.id}?code={ping.forwarding_code}")
+
+
+def test_live_ping_redirects_and_is_cached(app):
+    ping = add_ping(expire_ts=datetime.now(timezone.utc) + timedelta(hours=1))
+    response = click(app, ping)
+    assert response.status_code == 307
+    assert response.headers["Location"].startswith("https://example.com/survey")
+
+    ttl = redis_client.ttl(survey_url_cache_key(ping.id, ping.forwarding_code))
+    assert 0 < ttl <= 3600  # no longer than the ping is live
+
+
+def test_expired_ping_shows_expiry_message(app):
+    ping = add_ping(expire_ts=datetime.now(timezone.utc) - timedelta(minutes=5))
+    response = click(app, ping)
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == TestConfig.PING_EXPIRED_MESSAGE
+    assert redis_client.get(survey_url_cache_key(ping.id, ping.forwarding_code)) is None
+
+
+def test_expired_ping_is_not_served_from_cache(app):
+    ping = add_ping(expire_ts=datetime.now(timezone.utc) + timedelta(seconds=1.5))
+    cache_survey_urls([ping])
+    assert redis_client.get(survey_url_cache_key(ping.id, ping.forwarding_code)) is not None
+
+    # The cache entry lapses with the ping, so the click after expiry goes to the database path
+    time.sleep(1.6)
+    response = click(app, ping)
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == TestConfig.PING_EXPIRED_MESSAGE
+
+
+def test_soft_deleted_ping_stops_redirecting(app):
+    ping = add_ping(expire_ts=datetime.now(timezone.utc) + timedelta(hours=1))
+    assert click(app, ping).status_code == 307
+
+    soft_delete_ping(db.session, ping.id)
+    db.session.commit()
+    assert redis_client.get(survey_url_cache_key(ping.id, ping.forwarding_code)) is None
+    assert click(app, ping).status_code == 404
+
+
+def test_template_url_edit_drops_cached_urls(app):
+    ping = add_ping(expire_ts=datetime.now(timezone.utc) + timedelta(hours=1))
+    assert click(app, ping).status_code == 307
+
+    update_ping_template(db.session, ping.ping_template_id, url="https://example.com/new-survey")
+    db.session.commit()
+    response = click(app, ping)
+    assert response.status_code == 307
+    assert response.headers["Location"].startswith("https://example.com/new-survey")
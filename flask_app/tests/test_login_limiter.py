@@ -0,0 +1,62 @@
+"""
+Checks for the failed-login limiter against fakeredis.
+
+Usage:
+    cd flask_app && python -m pytest -q tests/test_login_limiter.py
+"""
+import fakeredis
+import pytest
+from flask import Flask
+
+from extensions import redis_client
+from login_limiter import clear_login_failures, login_retry_after, record_login_failure
+
+
+class TestConfig:
+    TESTING = True
+    REDIS_URL = "redis://localhost:6379/0"
+    LOGIN_MAX_FAILURES_PER_IP = 50
+    LOGIN_MAX_FAILURES_PER_EMAIL_IP = 10
+    LOGIN_FAILURE_WINDOW_SECONDS = 900
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    redis_client.provider_class = fakeredis.FakeRedis
+    redis_client.init_app(app)
+    with app.app_context():
+        redis_client.flushall()  # FakeRedis instances share one server by default
+        yield app
+
+
+def test_failures_block_the_account_only_from_that_ip(app):
+    for _ in range(TestConfig.LOGIN_MAX_FAILURES_PER_EMAIL_IP):
+        assert login_retry_after("10.0.0.1", "owner@example.com") == 0
+        record_login_failure("10.0.0.1", "Owner@example.com ")
+
+    retry_after = login_retry_after("10.0.0.1", "owner@example.com")
+    assert 0 < retry_after <= TestConfig.LOGIN_FAILURE_WINDOW_SECONDS
+    # The account's owner, elsewhere, can still log in
+    assert login_retry_after("10.0.0.2", "owner@example.com") == 0
+
+    clear_login_failures("10.0.0.1", "owner@example.com")
+    assert login_retry_after("10.0.0.1", "owner@example.com") == 0
+
+
+def test_failures_across_accounts_block_the_ip(app):
+    for i in range(TestConfig.LOGIN_MAX_FAILURES_PER_IP):
+        record_login_failure("10.0.0.1", f"user{i}@example.com")
+
+    assert login_retry_after("10.0.0.1", "someone@example.com") > 0
+    assert login_retry_after("10.0.0.2", "someone@example.com") == 0
+
+
+def test_window_starts_at_the_first_failure(app):
+    record_login_failure("10.0.0.1", "owner@example.com")
+    redis_client.expire("login_failures:ip:10.0.0.1", 5)
+    record_login_failure("10.0.0.1", "owner@example.com")
+
+    assert int(redis_client.get("login_failures:ip:10.0.0.1")) == 2
+    assert 0 < redis_client.ttl("login_failures:ip:10.0.0.1") <= 5
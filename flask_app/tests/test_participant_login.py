@@ -0,0 +1,67 @@
+"""
+Checks that issuing a new dashboard OTP drops the dashboard cached for the replaced one.
+
+Usage:
+    cd flask_app && python -m pytest -q tests/test_participant_login.py
+"""
+import json
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+import pytest
+from flask import Flask
+
+from cache import participant_dashboard_cache_key
+from extensions import db, redis_client
+from models import Enrollment, Study
+from telegram_messenger import TelegramMessenger
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    REDIS_URL = "redis://localhost:6379/0"
+    BOT_SECRET_KEY = "bot-secret"
+    TELEGRAM_SECRET_KEY = "telegram-secret"
+    FRONTEND_BASE_URL = "http://frontend.test"
+    ENROLLMENT_DASHBOARD_OTP_EXPIRY_MINS = 60
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(TelegramMessenger, "send_ping", lambda self, telegram_id, message: True)
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    db.init_app(app)
+    redis_client.provider_class = fakeredis.FakeRedis
+    redis_client.init_app(app)
+
+    from blueprints.bot import bot_bp
+    app.register_blueprint(bot_bp, url_prefix="/api")
+
+    with app.app_context():
+        redis_client.flushall()  # FakeRedis instances share one server by default
+        db.create_all()
+        now = datetime.now(timezone.utc)
+        study = Study(public_name="Study", internal_name="study", code="study-code")
+        db.session.add(Enrollment(
+            study=study, study_pid="p1", tz="UTC", signup_ts=now, telegram_id="42",
+            dashboard_otp="old-otp", dashboard_otp_expire_ts=now + timedelta(minutes=30),
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_new_otp_invalidates_the_cached_dashboard_of_the_old_one(app):
+    old_key = participant_dashboard_cache_key("42", "old-otp")
+    redis_client.set(old_key, json.dumps({"otp_expires_at": 0, "enrollments": []}))
+
+    response = app.test_client().post(
+        "/api/participant_login", json={"telegram_id": 42}, headers={"X-Bot-Secret-Key": "bot-secret"}
+    )
+
+    assert response.status_code == 200
+    assert redis_client.get(old_key) is None
+    assert db.session.execute(db.select(Enrollment.dashboard_otp)).scalar_one() != "old-otp"
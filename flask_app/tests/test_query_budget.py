@@ -0,0 +1,137 @@
+"""
+Checks for query_budget: the ping redirect's declared budget against SQLite and fakeredis,
+and the testing-mode behaviour of an exceeded budget.
+
+Usage:
+    cd flask_app && python -m pytest -q tests/test_query_budget.py
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from extensions import db, redis_client
+from models import Enrollment, Ping, PingTemplate, Study
+from query_budget import QueryBudgetExceeded, query_budget, unbudgeted
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    REDIS_URL = "redis://localhost:6379/0"
+    PING_EXPIRED_MESSAGE = "This ping has expired."
+    SURVEY_URL_CACHE_TTL = timedelta(hours=1)
+
+
+class DownRedis(fakeredis.FakeRedis):
+    """
+    FakeRedis whose stream writes fail, to take the synchronous click fallback.
+    """
+
+    def xadd(self, *args, **kwargs):
+        raise ConnectionError("Redis is down.")
+
+
+def make_app(redis_class):
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    db.init_app(app)
+    redis_client.provider_class = redis_class
+    redis_client.init_app(app)
+
+    from blueprints.forwarder import forwarder_bp
+    app.register_blueprint(forwarder_bp, url_prefix="/api")
+    return app
+
+
+def add_ping(now):
+    study = Study(public_name="Study", internal_name="study", code="study-code")
+    template = PingTemplate(study=study, name="Morning", message="Hi", url="https://example.com/survey")
+    enrollment = Enrollment(study=study, study_pid="p1", tz="UTC", signup_ts=now)
+    ping = Ping(
+        study=study, ping_template=template, enrollment=enrollment, day_num=1,
+        scheduled_ts=now, sent_ts=now, expire_ts=now + timedelta(hours=1),
+    )
+    db.session.add(ping)
+    db.session.commit()
+    return ping.id, ping.forwarding_code
+
+
+@pytest.fixture(params=[fakeredis.FakeRedis, DownRedis], ids=["redis", "redis_down"])
+def client(request):
+    app = make_app(request.param)
+    with app.app_context():
+        redis_client.flushall()  # FakeRedis instances share one server by default
+        db.create_all()
+        app.ping_id, app.forwarding_code = add_ping(datetime.now(timezone.utc))
+        db.session.remove()
+        yield app.test_client(), app
+        db.drop_all()
+
+
+def test_ping_redirect_within_budget(client):
+    # The budget raises in testing mode, so a 307 means the redirect stayed within it,
+    # including when Redis is down and the click is written synchronously
+    test_client, app = client
+    url = f"/api/ping/{app.ping_id}?code={app.forwarding_code}"
+
+    response = test_client.get(url)
+    assert response.status_code == 307
+    assert response.headers["Location"].startswith("https://example.com/survey")
+
+    # The click was recorded either way
+    with app.app_context():
+        queued = redis_client.xlen("clicks:stream")
+        written = db.session.get(Ping, app.ping_id).first_clicked_ts is not None
+        assert (queued, written) in {(1, False), (0, True)}
+
+
+def test_click_fallback_has_its_own_budget(monkeypatch):
+    import click_recorder
+
+    def apply_clicks(session, clicks):
+        for i in range(5):
+            session.execute(text(f"SELECT {i}"))
+
+    monkeypatch.setattr(click_recorder, "apply_clicks", apply_clicks)
+    app = make_app(DownRedis)
+    with app.app_context():
+        with pytest.raises(QueryBudgetExceeded, match="click_fallback"):
+            click_recorder.record_click(1)
+
+
+def test_exceeded_budget_raises_in_testing_mode():
+    app = make_app(fakeredis.FakeRedis)
+    with app.app_context():
+        with pytest.raises(QueryBudgetExceeded):
+            with query_budget(1, name="two_selects"):
+                db.session.execute(text("SELECT 1"))
+                db.session.execute(text("SELECT 2"))
+
+
+def test_exceeded_budget_warns_outside_testing_mode(caplog):
+    app = make_app(fakeredis.FakeRedis)
+    app.testing = False
+    with app.app_context(), caplog.at_level("WARNING", logger="app_logger"):
+        with query_budget(1, name="two_selects") as budget:
+            db.session.execute(text("SELECT 1"))
+            db.session.execute(text("SELECT 2"))
+    assert budget.count == 2
+    assert "Query budget exceeded in two_selects" in caplog.text
+
+
+def test_unbudgeted_statements_are_not_counted():
+    app = make_app(fakeredis.FakeRedis)
+    with app.app_context():
+        with query_budget(1, name="outer") as budget:
+            db.session.execute(text("SELECT 1"))
+            with unbudgeted():
+                db.session.execute(text("SELECT 2"))
+                db.session.execute(text("SELECT 3"))
+    assert budget.count == 1
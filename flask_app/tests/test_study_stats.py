@@ -0,0 +1,93 @@
+"""
+Checks that soft-deleting pings takes them back out of the study stats rollup.
+
+Usage:
+    cd flask_app && python -m pytest -q tests/test_study_stats.py
+"""
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+import pytest
+from flask import Flask
+
+from crud import (
+    EXPIRED_PINGS_SWEEP,
+    increment_study_stats_for_pings,
+    soft_delete_enrollment,
+    soft_delete_ping,
+)
+from extensions import db, redis_client
+from models import Enrollment, Ping, PingTemplate, Study, StudyStat, StudyStatSweep
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    REDIS_URL = "redis://localhost:6379/0"
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    db.init_app(app)
+    redis_client.provider_class = fakeredis.FakeRedis
+    redis_client.init_app(app)
+    with app.app_context():
+        redis_client.flushall()  # FakeRedis instances share one server by default
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def add_sent_pings(now):
+    """
+    Three pings sent an hour ago: one clicked, one expired unclicked, one still open.
+    """
+    study = Study(public_name="Study", internal_name="study", code="study-code")
+    template = PingTemplate(study=study, name="Morning", message="Hi", url="https://example.com/survey")
+    enrollment = Enrollment(study=study, study_pid="p1", tz="UTC", signup_ts=now)
+    sent = now - timedelta(hours=1)
+
+    def ping(**kwargs):
+        return Ping(study=study, ping_template=template, enrollment=enrollment, day_num=1,
+                    scheduled_ts=sent, sent_ts=sent, **kwargs)
+
+    clicked = ping(expire_ts=now + timedelta(hours=1), first_clicked_ts=sent + timedelta(minutes=5))
+    expired = ping(expire_ts=now - timedelta(minutes=30))
+    open_ = ping(expire_ts=now + timedelta(hours=1))
+    db.session.add_all([clicked, expired, open_])
+    db.session.flush()
+
+    pings = [clicked, expired, open_]
+    increment_study_stats_for_pings(db.session, pings, "sent")
+    increment_study_stats_for_pings(db.session, [clicked], "clicked")
+    increment_study_stats_for_pings(db.session, [expired], "expired")
+    db.session.add(StudyStatSweep(name=EXPIRED_PINGS_SWEEP, swept_until=now - timedelta(minutes=1)))
+    db.session.commit()
+    return enrollment, pings
+
+
+def stat_counts():
+    stat = db.session.execute(db.select(StudyStat)).scalar_one()
+    db.session.refresh(stat)
+    return stat.sent_count, stat.clicked_count, stat.expired_count
+
+
+def test_soft_deleted_pings_leave_the_study_stats(app):
+    enrollment, (clicked, expired, open_) = add_sent_pings(datetime.now(timezone.utc))
+    assert stat_counts() == (3, 1, 1)
+
+    soft_delete_ping(db.session, clicked.id)
+    db.session.commit()
+    assert stat_counts() == (2, 0, 1)
+
+    # Deleting it again changes nothing
+    soft_delete_ping(db.session, clicked.id)
+    db.session.commit()
+    assert stat_counts() == (2, 0, 1)
+
+    soft_delete_enrollment(db.session, enrollment.id)
+    db.session.commit()
+    assert stat_counts() == (0, 0, 0)
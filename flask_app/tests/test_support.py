@@ -0,0 +1,191 @@
+"""
+Checks for /api/support and the queued support emails, with a local stand-in for the
+reCAPTCHA and Mailtrap APIs in place of http_client.post.
+
+Usage:
+    cd flask_app && python -m pytest -q tests/test_support.py
+"""
+import fakeredis
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+import http_client
+import support_mailer
+from extensions import db, redis_client
+from models import Support
+from support_mailer import (
+    SUPPORT_EMAIL_PROCESSING,
+    SUPPORT_EMAIL_QUEUE,
+    flush_support_email_queue,
+)
+
+RECAPTCHA_URL = "http://upstream.test/recaptcha"
+MAILTRAP_URL = "http://upstream.test/api/send"
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    REDIS_URL = "redis://localhost:6379/0"
+    JWT_SECRET_KEY = "test-secret-of-at-least-32-bytes!"
+    RECAPTCHA_VERIFY_URL = RECAPTCHA_URL
+    RECAPTCHA_SECRET_KEY = "recaptcha-secret"
+    RECAPTCHA_MIN_SCORE = 0.5
+    RECAPTCHA_TOKEN_TTL_SECONDS = 120
+    MAILTRAP_SEND_URL = MAILTRAP_URL
+    MAILTRAP_API_TOKEN = "mailtrap-token"
+    MAIL_SUPPORT_RECIPIENT = "support@example.com"
+    SUPPORT_EMAIL_BATCH_SIZE = 50
+    SUPPORT_EMAIL_RETRY_BACKOFF_SECONDS = 30
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.body
+
+
+class FakeUpstream:
+    """
+    Answers reCAPTCHA checks with `recaptcha_pass` and records the emails sent, failing the
+    ones whose category (the ticket's query type) is in `failing_types`.
+    """
+
+    def __init__(self):
+        self.recaptcha_pass = True
+        self.failing_types = set()
+        self.emails = []
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append(url)
+        if url == RECAPTCHA_URL:
+            if self.recaptcha_pass:
+                return FakeResponse({"success": True, "score": 0.9})
+            return FakeResponse({"success": False, "score": 0.0})
+        if kwargs["json"]["category"] in self.failing_types:
+            return FakeResponse({"success": False}, status_code=500)
+        self.emails.append(kwargs["json"])
+        return FakeResponse({"success": True})
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(http_client, "post", fake.post)
+    return fake
+
+
+@pytest.fixture
+def app(upstream):
+    app = Flask(__name__)
+    app.config.from_object(TestConfig)
+    db.init_app(app)
+    redis_client.provider_class = fakeredis.FakeRedis
+    redis_client.init_app(app)
+    JWTManager(app)
+
+    from blueprints.support import support_bp
+    app.register_blueprint(support_bp, url_prefix="/api")
+
+    with app.app_context():
+        redis_client.flushall()  # FakeRedis instances share one server by default
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def submit(app, token="token-1", query_type="bug"):
+    headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+    return app.test_client().post(
+        "/api/support",
+        json={"email": "user@example.com", "type": query_type, "message": "Help", "recaptcha": token},
+        headers=headers,
+    )
+
+
+def queued(key=SUPPORT_EMAIL_QUEUE):
+    return [int(support_id) for support_id in redis_client.lrange(key, 0, -1)]
+
+
+def test_ticket_is_saved_and_queued_before_any_email(app, upstream):
+    response = submit(app)
+    assert response.status_code == 201
+
+    support_ids = [support.id for support in db.session.execute(db.select(Support)).scalars()]
+    assert len(support_ids) == 1
+    assert queued() == support_ids
+    assert upstream.calls == [RECAPTCHA_URL]
+    assert upstream.emails == []
+
+
+def test_failing_recaptcha_answers_400(app, upstream):
+    upstream.recaptcha_pass = False
+    response = submit(app)
+    assert response.status_code == 400
+    assert db.session.execute(db.select(Support)).first() is None
+    assert queued() == []
+
+
+def test_reused_recaptcha_token_is_rejected(app, upstream):
+    assert submit(app, token="solved-once").status_code == 201
+    assert submit(app, token="solved-once").status_code == 400
+    assert upstream.calls.count(RECAPTCHA_URL) == 1
+    assert len(queued()) == 1
+
+
+def test_flush_sends_queued_tickets(app, upstream):
+    for i in range(3):
+        assert submit(app, token=f"token-{i}").status_code == 201
+    retries = []
+
+    assert flush_support_email_queue(
+        db.session, batch_size=50, schedule_retry=lambda failed, countdown: retries.append(failed)
+    ) == 3
+    assert len(upstream.emails) == 3
+    assert retries == []
+    assert queued() == []
+    assert queued(SUPPORT_EMAIL_PROCESSING) == []
+
+
+def test_failed_sends_are_handed_to_the_retry_task_with_backoff(app, upstream):
+    assert submit(app, token="token-ok", query_type="bug").status_code == 201
+    assert submit(app, token="token-bad", query_type="billing").status_code == 201
+    failed_id = queued()[1]
+    upstream.failing_types = {"billing"}
+    scheduled = []
+
+    flush_support_email_queue(
+        db.session, batch_size=50, schedule_retry=lambda failed, countdown: scheduled.append((failed, countdown))
+    )
+
+    assert len(upstream.emails) == 1
+    assert scheduled == [([failed_id], TestConfig.SUPPORT_EMAIL_RETRY_BACKOFF_SECONDS)]
+    assert queued() == []
+    assert queued(SUPPORT_EMAIL_PROCESSING) == []
+
+
+def test_flush_error_puts_unsent_tickets_back(app, upstream, monkeypatch):
+    for i in range(2):
+        assert submit(app, token=f"token-{i}").status_code == 201
+    support_ids = queued()
+
+    def broken(session, ids):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(support_mailer, "get_support_queries_by_ids", broken)
+    with pytest.raises(RuntimeError):
+        flush_support_email_queue(db.session, batch_size=50, schedule_retry=lambda failed, countdown: None)
+
+    assert upstream.emails == []
+    assert queued() == support_ids
+    assert queued(SUPPORT_EMAIL_PROCESSING) == []
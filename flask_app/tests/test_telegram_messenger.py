@@ -0,0 +1,36 @@
+"""
+Checks that Telegram API latency is observed for failed calls as well as successful ones.
+
+Usage:
+    cd flask_app && python -m pytest -q tests/test_telegram_messenger.py
+"""
+import pytest
+import requests
+from flask import Flask
+from prometheus_client import REGISTRY
+
+import http_client
+from telegram_messenger import TelegramMessenger
+
+
+def observed_send_latencies():
+    return REGISTRY.get_sample_value("telegram_request_duration_seconds_count", {"method": "sendMessage"}) or 0
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["TELEGRAM_API_BASE_URL"] = "http://telegram.test"
+    with app.app_context():
+        yield app
+
+
+def test_timeouts_are_observed_in_the_latency_histogram(app, monkeypatch):
+    def timeout(url, **kwargs):
+        raise requests.Timeout("read timed out")
+
+    monkeypatch.setattr(http_client, "post", timeout)
+    before = observed_send_latencies()
+
+    assert TelegramMessenger("token").send_ping(telegram_id=1, message="Hi") is False
+    assert observed_send_latencies() == before + 1
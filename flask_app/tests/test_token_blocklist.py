@@ -0,0 +1,92 @@
+"""
+Checks for the per-worker JWT blocklist cache (token_blocklist.TokenBlocklistCache) against
+fakeredis, so no Redis server is needed.
+
+Usage:
+    cd flask_app && python -m pytest -q tests/test_token_blocklist.py
+"""
+import os
+import sys
+import time
+
+import fakeredis
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from token_blocklist import BLOCKLIST_CHANNEL, TokenBlocklistCache, blocklist_key
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """
+    FakeRedis that counts GETs, to tell cache hits from Redis round-trips.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gets = 0
+
+    def get(self, name):
+        self.gets += 1
+        return super().get(name)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def start_listening(cache, redis, n_subscribers=1):
+    # The listener clears the cache when it subscribes, so wait for it before caching anything
+    cache._ensure_listener()
+    assert wait_for(lambda: dict(redis.pubsub_numsub(BLOCKLIST_CHANNEL)).get(BLOCKLIST_CHANNEL.encode(), 0) >= n_subscribers)
+
+
+def test_repeated_lookup_skips_redis():
+    redis = CountingRedis(server=fakeredis.FakeServer())
+    cache = TokenBlocklistCache(redis, ttl=30)
+    start_listening(cache, redis)
+
+    assert cache.is_revoked("jti-1") is False
+    assert redis.gets == 1
+    assert cache.is_revoked("jti-1") is False
+    assert redis.gets == 1
+
+
+def test_revoke_evicts_from_other_workers():
+    server = fakeredis.FakeServer()
+    redis_a = fakeredis.FakeRedis(server=server)
+    redis_b = CountingRedis(server=server)
+    worker_a = TokenBlocklistCache(redis_a, ttl=30)
+    worker_b = TokenBlocklistCache(redis_b, ttl=30)
+    start_listening(worker_a, redis_a, n_subscribers=1)
+    start_listening(worker_b, redis_b, n_subscribers=2)
+
+    assert worker_b.is_revoked("jti-2") is False
+    assert "jti-2" in worker_b._good
+
+    worker_a.revoke("jti-2", 60)
+
+    # Only the pub/sub listener removes entries from worker B's cache
+    assert wait_for(lambda: "jti-2" not in worker_b._good)
+    gets = redis_b.gets
+    assert worker_b.is_revoked("jti-2") is True
+    assert redis_b.gets == gets + 1
+
+
+def test_missed_message_is_bounded_by_ttl():
+    redis = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    cache = TokenBlocklistCache(redis, ttl=0.2)
+    start_listening(cache, redis)
+
+    assert cache.is_revoked("jti-3") is False
+
+    # Revoked without a publish, as if the eviction message had been missed
+    redis.setex(blocklist_key("jti-3"), 60, "true")
+    assert cache.is_revoked("jti-3") is False
+
+    time.sleep(0.25)
+    assert cache.is_revoked("jti-3") is True
@@ -0,0 +1,122 @@
+# token_blocklist.py
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from extensions import redis_client
+
+BLOCKLIST_CHANNEL = "jwt_blocklist"
+
+logger = logging.getLogger("app_logger")
+
+
+def blocklist_key(jti: str) -> str:
+    return f"blacklisted_{jti}"
+
+
+class TokenBlocklistCache:
+    """
+    Per-process cache in front of the Redis JWT blocklist.
+
+    JTIs that Redis reports as not revoked are remembered for `ttl` seconds (LRU-bounded to
+    `maxsize` entries), so repeat requests with the same token skip the Redis GET. Logouts
+    are published on a pub/sub channel and evict the JTI from every worker's cache at once.
+    If a message is missed (e.g. while the listener reconnects) the entry still expires
+    after `ttl`, so a revoked token keeps working for at most `ttl` seconds.
+    """
+
+    def __init__(self, redis, ttl: float = 30, maxsize: int = 10000):
+        self.redis = redis
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._good = OrderedDict()  # jti -> monotonic expiry
+        self._generation = 0  # bumped on every eviction, guards against caching a stale answer
+        self._lock = threading.Lock()
+        self._listener_pid = None
+
+    def is_revoked(self, jti: str) -> bool:
+        self._ensure_listener()
+        now = time.monotonic()
+        with self._lock:
+            expiry = self._good.get(jti)
+            if expiry is not None:
+                if expiry > now:
+                    self._good.move_to_end(jti)
+                    return False
+                del self._good[jti]
+            generation = self._generation
+
+        if self.redis.get(blocklist_key(jti)) is not None:
+            return True
+
+        with self._lock:
+            # Skip caching if an eviction arrived while we were asking Redis
+            if generation == self._generation:
+                self._good[jti] = now + self.ttl
+                while len(self._good) > self.maxsize:
+                    self._good.popitem(last=False)
+        return False
+
+    def revoke(self, jti: str, expires) -> None:
+        """
+        Add a JTI to the blocklist for `expires` and tell every worker to drop it from its cache.
+        """
+        self.redis.setex(blocklist_key(jti), expires, "true")
+        self.evict(jti)
+        self.redis.publish(BLOCKLIST_CHANNEL, jti)
+
+    def evict(self, jti: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._good.pop(jti, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._good.clear()
+
+    def _ensure_listener(self) -> None:
+        # One listener thread per process; checked by pid so forked workers start their own
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+            self._good.clear()
+        threading.Thread(target=self._listen, name="jwt-blocklist-listener", daemon=True).start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(BLOCKLIST_CHANNEL)
+                # Logouts published while we were not subscribed may be cached as good
+                self.clear()
+                for message in pubsub.listen():
+                    jti = message["data"]
+                    self.evict(jti.decode() if isinstance(jti, bytes) else jti)
+            except Exception as e:
+                logger.warning(f"JWT blocklist listener disconnected, retrying: {e}")
+                time.sleep(1)
+
+
+def get_blocklist_cache() -> TokenBlocklistCache:
+    """
+    Return the app's blocklist cache, creating it on first use.
+    """
+    cache = current_app.extensions.get("jwt_blocklist_cache")
+    if cache is None:
+        cache = TokenBlocklistCache(
+            redis_client,
+            ttl=current_app.config["JWT_BLOCKLIST_CACHE_TTL_SECONDS"],
+            maxsize=current_app.config["JWT_BLOCKLIST_CACHE_SIZE"],
+        )
+        current_app.extensions["jwt_blocklist_cache"] = cache
+    return cache
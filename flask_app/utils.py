@@ -73,6 +73,18 @@ def random_time(
     
     return ping_time
 
+def is_valid_timezone(tz) -> bool:
+    """
+    Check that tz is an IANA time zone name (e.g., 'America/New_York').
+    """
+    if not tz or not isinstance(tz, str):
+        return False
+    try:
+        ZoneInfo(tz.strip())
+        return True
+    except Exception:
+        return False
+
 def convert_dt_to_local(dt_obj, participant_tz):
     """
     Convert a datetime object to the participant's local time zone.
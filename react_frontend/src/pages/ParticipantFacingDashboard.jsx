@@ -96,6 +96,7 @@ function ParticipantFacingDashboard() {
               <TableCell>Time Zone</TableCell>
               <TableCell>Enrolled?</TableCell>
               <TableCell>Signup Date</TableCell>
+              <TableCell>Surveys Completed</TableCell>
               <TableCell>Contact Message</TableCell>
             </TableRow>
           </TableHead>
@@ -107,6 +108,10 @@ function ParticipantFacingDashboard() {
                 <TableCell>{enrollment.tz}</TableCell>
                 <TableCell>{enrollment.enrolled ? 'Yes' : 'No'}</TableCell>
                 <TableCell>{enrollment.signup_ts}</TableCell>
+                <TableCell>
+                  {enrollment.n_completed} / {enrollment.n_sent}
+                  {enrollment.compliance !== null && ` (${Math.round(enrollment.compliance * 100)}%)`}
+                </TableCell>
                 <TableCell>{enrollment.contact_message}</TableCell>
               </TableRow>
             ))}